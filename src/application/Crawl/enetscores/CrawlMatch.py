@@ -4,8 +4,10 @@ import logging
 import requests
 
 import src.application.Domain.Match as Match
+import src.application.Domain.Match_Incident as Match_Incident
 import src.application.Domain.Team as Team
 import src.util.util as util
+import src.util.SQLLite as SQLLite
 from src.application.Crawl.enetscores.CrawlerIncidents import CrawlerIncidents
 from src.application.Crawl.enetscores.CrawlerLineup import CrawlerLineup
 from src.application.Crawl.enetscores.CrawlerTeam import CrawlerTeam
@@ -111,16 +113,23 @@ class CrawlerMatch(object):
         # event incidents to be crawled if:
         #   - the match is not stored in the DB
         #   - some information are missing
+        li = None
         if not self.match or (self.match and not self.match.are_incidents_managed()):
             li = CrawlerIncidents(self.match, match_attributes, self.event)
             li.get_incidents()
 
-        if not self.match:
-            # persist match
-            Match.write_new_match(match_attributes)
-        else:
-            # update match
-            Match.update_match(self.match, match_attributes)
+        # the pages of the match have been downloaded: its rows are written in a short unit of work
+        with SQLLite.get_connection().transaction():
+            if not self.match:
+                # persist match
+                match_id = Match.write_new_match(match_attributes)
+            else:
+                # update match
+                Match.update_match(self.match, match_attributes)
+                match_id = self.match.id
+
+            if li and li.incidents is not None:
+                Match_Incident.write_match_incidents(match_id, li.incidents)
 
         print("\t", home_team_name, "vs", away_team_name)
 
@@ -10,6 +10,8 @@ class CrawlerIncidents(object):
         self.match = match
         self.match_attributes = match_attributes
         self.event = event
+        # incidents crawled, by type: to be stored in Match_Incident once the match is persisted
+        self.incidents = None
 
         incident_url = "http://json.mx-api.enetscores.com/live_data/actionzones/" + self.event + "/0?_=1486979583821"
         self.json_incident_match = json.loads(requests.get(incident_url).text)
@@ -39,7 +41,14 @@ class CrawlerIncidents(object):
                 log.debug("Event ["+self.event+"] without incidents")
                 return
 
+            self.incidents = {"goal": [], "shoton": [], "shotoff": [], "foulcommit": [], "card": [], "cross": [],
+                              "corner": [], "possession": []}
             for incident in self.json_incident_match["i"]:
+                if incident["type"] in self.incidents:
+                    self.incidents[incident["type"]].append(incident)
+                elif incident["type"] == "special" and incident.get("subtype") == "possession":
+                    self.incidents["possession"].append(incident)
+
                 if incident["type"] == "goal":
                     goal += elaborate_tag(incident)
                 elif incident["type"] == "shoton":
@@ -2,6 +2,7 @@ import logging
 import requests
 
 from bs4 import BeautifulSoup
+import src.util.SQLLite as SQLLite
 from src.application.Crawl.football_data.CrawlerMatch import CrawlerMatch
 
 log = logging.getLogger(__name__)
@@ -23,22 +24,24 @@ class CrawlerLeague(object):
         Start crawling the league
         :return:
         """
-        for td in self.soup.find_all('td', {'class': 'firstColumn'}):
-            match_link = td.a.attrs['href']
-            match_name = str(td.a.string).strip()
-            print("\t|\t|\t-", match_name)
-
-            home_team_str = match_name.split(" v ")[0].strip()
-            away_team_str = match_name.split(" v ")[1].strip()
-
-            log.debug("Found the match ["+match_name+"]")
-            n_try = 1
-            while n_try < 6:
-                try:
-                    cm = CrawlerMatch(self.league, home_team_str, away_team_str, match_link)
-                    cm.start_crawl()
-                    break
-                except requests.exceptions.ReadTimeout:
-                    n_try += 1
-                except requests.exceptions.ConnectionError:
-                    n_try += 1
+        # bet-odds of the league are buffered and written at the end, in one short unit of work
+        with SQLLite.buffered_writes():
+            for td in self.soup.find_all('td', {'class': 'firstColumn'}):
+                match_link = td.a.attrs['href']
+                match_name = str(td.a.string).strip()
+                print("\t|\t|\t-", match_name)
+
+                home_team_str = match_name.split(" v ")[0].strip()
+                away_team_str = match_name.split(" v ")[1].strip()
+
+                log.debug("Found the match ["+match_name+"]")
+                n_try = 1
+                while n_try < 6:
+                    try:
+                        cm = CrawlerMatch(self.league, home_team_str, away_team_str, match_link)
+                        cm.start_crawl()
+                        break
+                    except requests.exceptions.ReadTimeout:
+                        n_try += 1
+                    except requests.exceptions.ConnectionError:
+                        n_try += 1
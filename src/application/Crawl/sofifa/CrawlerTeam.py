@@ -3,6 +3,7 @@ import requests
 import src.util.util as util
 import src.application.Domain.Team as Team
 import src.application.Domain.Player as Player
+import src.util.SQLLite as SQLLite
 from bs4 import BeautifulSoup
 from src.application.Crawl.sofifa.CrawlerPlayer import CrawlerPlayer
 
@@ -111,29 +112,31 @@ class CrawlerTeam(object):
                 self.team = Team.update(self.team)
 
         # looking for players belonging this team
-        link_players_found = self.look_for_players()
-        for player_link, player_name in link_players_found.items():
-            player_fifa_api_id = player_link[25:]
-            player = Player.read_by_fifa_api_id(player_fifa_api_id)
-
-            # crawl the player if and only if on of the following happens:
-            # 1) PLAYER DOES NOT EXIST IN THE DB
-            # 2) PLAYER ATTRIBUTES DO NOT EXIST IN THE DB
-            # 3) PLAYER ATTRIBUTES IN THE DB ARE OLD
-            # 4) FORCE PARSING OF PLAYER ATTRIBUTES
-            if \
-                    not player \
-                    or not player.get_last_player_attributes() \
-                    or util.compare_time_to_now(player.get_last_player_attributes().date, self.day_passed) \
-                    or self.force_parsing:
-                log.debug("Player to crawl ["+player_link+", "+player_name+"]")
-                cp = CrawlerPlayer(player, player_link)
-                cp.start_crawling()
-
-        # looking for build up play
-        attributes_found = self.look_for_team_attributes()
-        if len(attributes_found) > 0:
-            self.team.save_team_attributes(attributes_found)
+        # attributes of the players and of the team are buffered and written at the end, in one short unit of work
+        with SQLLite.buffered_writes():
+            link_players_found = self.look_for_players()
+            for player_link, player_name in link_players_found.items():
+                player_fifa_api_id = player_link[25:]
+                player = Player.read_by_fifa_api_id(player_fifa_api_id)
+
+                # crawl the player if and only if on of the following happens:
+                # 1) PLAYER DOES NOT EXIST IN THE DB
+                # 2) PLAYER ATTRIBUTES DO NOT EXIST IN THE DB
+                # 3) PLAYER ATTRIBUTES IN THE DB ARE OLD
+                # 4) FORCE PARSING OF PLAYER ATTRIBUTES
+                if \
+                        not player \
+                        or not player.get_last_player_attributes() \
+                        or util.compare_time_to_now(player.get_last_player_attributes().date, self.day_passed) \
+                        or self.force_parsing:
+                    log.debug("Player to crawl ["+player_link+", "+player_name+"]")
+                    cp = CrawlerPlayer(player, player_link)
+                    cp.start_crawling()
+
+            # looking for build up play
+            attributes_found = self.look_for_team_attributes()
+            if len(attributes_found) > 0:
+                self.team.save_team_attributes(attributes_found)
 
 
 def get_group_label(i):
@@ -2,11 +2,15 @@ import json
 import logging
 import src.util.SQLLite as SQLLite
 import src.util.util as util
+import src.util.Entity as Entity
 
 log = logging.getLogger(__name__)
 
 
-class BetEvent(object):
+class BetEvent(Entity.Entity):
+    __slots__ = Entity.get_slots("Bet_Event")
+    table = "Bet_Event"
+
     def __init__(self, id):
         self.id = id
 
@@ -41,8 +45,7 @@ def read_by_match_event_id_and_event_name(match_event_id, event_name=None):
     bet_events = []
     for sqllite_row in SQLLite.get_connection().select("Bet_Event", **filter):
         be = BetEvent(sqllite_row["id"])
-        for attribute, value in sqllite_row.items():
-            be.__setattr__(attribute, value)
+        be.set_columns(sqllite_row)
         bet_events.append(be)
 
     return bet_events
@@ -61,7 +64,12 @@ def write_new_bet_event(match_event_id, event_name, bet_values):
     #j = json.loads(l)
     #print(j, type(j))
 
-    SQLLite.get_connection().insert("Bet_Event", {'match_event_id':match_event_id,
-                                                  'event_name':event_name,
-                                                  'bet_value':bet_values_str,
-                                                  'date':util.get_today_date(with_hours=True)})
+    bet_event = {'match_event_id': match_event_id,
+                 'event_name': event_name,
+                 'bet_value': bet_values_str,
+                 'date': util.get_today_date(with_hours=True)}
+    write_buffer = SQLLite.get_write_buffer()
+    if write_buffer is not None:
+        write_buffer.insert("Bet_Event", bet_event)
+    else:
+        SQLLite.get_connection().insert("Bet_Event", bet_event)
@@ -0,0 +1,309 @@
+import os
+import json
+import shutil
+import logging
+import sqlite3
+import threading
+
+import numpy as np
+
+import src.util.SQLLite as SQLLite
+import src.util.PersistentCache as PersistentCache
+import src.util.util as util
+import src.application.Domain.MatchStore as MatchStore
+
+log = logging.getLogger(__name__)
+
+# Read-only copy of the matches of the past seasons (before util.get_current_season), exported once in columnar
+# files: one .npy for each column (and one for its NULL mask), memory-mapped by every process, so that the pages are
+# shared through the page cache of the OS and no Python object is built when the store is opened
+# The matches of the current season stay in SQLite (MatchStore, loading only them)
+# The export is made again when the past seasons change: its fingerprint is the DB file with the number of changes of
+# the matches of the past seasons (SQLLite.change_counters)
+#
+#   <directory>/current                 name of the export in use
+#   <directory>/<export>/index.json     seasons, fingerprint and columns of the export
+#   <directory>/<export>/<column>.npy   values of the column, rows ordered by match id
+#
+# directory of the exports; None if the historical store is disabled
+directory = None
+default_directory = "data/cache/historical"
+# incident XML strings: too long for fixed-width columns, they are read from SQLite on first access
+excluded_columns = MatchStore.incident_columns
+historical_store_version = 2
+
+# KEY: pid, VALUE: HistoricalMatchStore (False if not available)
+historical_stores = {}
+lock = threading.RLock()
+
+
+class HistoricalMatchStore(MatchStore.MatchStore):
+    """
+    MatchStore of the past seasons, over the memory-mapped arrays of an export
+    """
+    def __init__(self, connection, export_directory, index):
+        self.connection = connection
+        self.data_version = None
+        self.min_season = None
+        self.export_directory = export_directory
+        self.index = index
+        # the matches are the ones before the season
+        self.season = index["season"]
+        self.fingerprint = index["fingerprint"]
+        self.column_names = connection.getColumnFromTable("Match")
+        self.n_rows = index["n_rows"]
+        self.columns = {}
+        for column, description in index["columns"].items():
+            self.columns[column] = read_column(export_directory, column, description)
+        self.ids = self.columns["id"].values
+        self.date_epoch = load_array(os.path.join(export_directory, "date_epoch.npy"))
+        self.lazy_values = {}
+        self.finished = None
+        self.finished_from = None
+        self.finished_until = None
+        self.views = [None] * self.n_rows
+        self.version = 0
+        self.league_versions = {}
+        self.team_versions = {}
+        self.lock = threading.RLock()
+        log.debug("HistoricalMatchStore opened: " + str(self.n_rows) + " matches, " + str(len(self.columns))
+                  + " columns")
+
+    def update_rows(self, match_ids):
+        # read-only: a new export is made when the past seasons change
+        return False
+
+
+def init_historical_store(historical_directory=None):
+    """
+    Enable the historical store: the matches of the past seasons are exported (if not yet) and read from the export
+    :param historical_directory: relative to the project directory
+    :return: False if the historical store is not available
+    """
+    global directory
+
+    if historical_directory is None:
+        historical_directory = default_directory
+    if not os.path.isabs(historical_directory):
+        historical_directory = util.get_project_directory() + historical_directory
+    directory = historical_directory
+    try:
+        SQLLite.create_change_counters()
+    except sqlite3.OperationalError as e:
+        log.warning("Change counters not available: " + str(e))
+    invalidate()
+    return get_historical_store() is not None
+
+
+def get_historical_store():
+    """
+    Return the HistoricalMatchStore of the current process, exporting the past seasons if the export is missing or
+    out of date (the changes of the DB made by other processes are checked by MatchStore.get_match_store); None if the
+    historical store is disabled or not available
+    :return:
+    """
+    if directory is None:
+        return None
+    pid = os.getpid()
+    historical_store = historical_stores.get(pid)
+    if historical_store is None or (historical_store is not False
+                                    and historical_store.season != util.get_current_season()):
+        with lock:
+            historical_store = historical_stores.get(pid)
+            if historical_store is None or (historical_store is not False
+                                            and historical_store.season != util.get_current_season()):
+                historical_store = open_store()
+                historical_stores[pid] = historical_store
+    if historical_store is False:
+        return None
+    return historical_store
+
+
+def check():
+    """
+    Discard the historical store of the current process if the matches of the past seasons have changed: the next
+    access exports them again
+    :return:
+    """
+    pid = os.getpid()
+    with lock:
+        historical_store = historical_stores.get(pid)
+        if historical_store is None or historical_store is False:
+            return
+        try:
+            fingerprint = get_fingerprint(SQLLite.get_connection(), historical_store.season)
+        except sqlite3.Error as e:
+            log.warning("Historical store not checked: " + str(e))
+            return
+        if fingerprint != historical_store.fingerprint:
+            log.debug("Historical store out of date: the past seasons have changed")
+            historical_stores.pop(pid, None)
+
+
+def inherit_historical_store(parent_pid):
+    """
+    In a forked process, adopt the historical store of the parent (the mappings are inherited), with the connection of
+    this process (MatchStore.inherit_match_store)
+    :param parent_pid:
+    :return:
+    """
+    pid = os.getpid()
+    with lock:
+        historical_store = historical_stores.get(parent_pid)
+        if historical_store is not None and pid != parent_pid and pid not in historical_stores:
+            if historical_store is not False:
+                historical_store.connection = SQLLite.get_connection()
+            historical_stores[pid] = historical_store
+
+
+def invalidate():
+    """
+    Discard the historical store of the current process: the next access checks again the export against the DB
+    :return:
+    """
+    with lock:
+        historical_stores.pop(os.getpid(), None)
+
+
+def open_store():
+    connection = SQLLite.get_connection()
+    season = util.get_current_season()
+    try:
+        fingerprint = get_fingerprint(connection, season)
+        export_directory, index = read_index()
+        if index is None or index["version"] != historical_store_version or index["season"] != season \
+                or index["fingerprint"] != fingerprint:
+            export_directory, index = export(connection, season, fingerprint)
+        return HistoricalMatchStore(connection, export_directory, index)
+    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+        log.warning("Historical store not available: " + str(e))
+        return False
+
+
+def get_fingerprint(connection, season):
+    """
+    Identity of the DB file and number of changes of the matches before the season: when it changes, the export is
+    out of date
+    :param connection:
+    :param season:
+    :return:
+    """
+    return [PersistentCache.get_data_identity(connection.database_path), SQLLite.get_changes("Match", season)]
+
+
+def read_index():
+    """
+    Return <directory, index> of the export in use, <None, None> if there is none
+    :return:
+    """
+    try:
+        with open(os.path.join(directory, "current")) as current_file:
+            export_directory = os.path.join(directory, current_file.read().strip())
+        with open(os.path.join(export_directory, "index.json")) as index_file:
+            return export_directory, json.load(index_file)
+    except (OSError, ValueError):
+        return None, None
+
+
+def export(connection, season, fingerprint):
+    """
+    Write the matches before the season in a new export, then make it the one in use
+    :param connection:
+    :param season:
+    :param fingerprint:
+    :return: <directory, index> of the export
+    """
+    log.info("Exporting the matches before the season " + season + " to the historical store")
+    name = "export_" + str(os.getpid()) + "_" + str(util.get_curr_time_millis())
+    export_directory = os.path.join(directory, name)
+    os.makedirs(export_directory)
+
+    columns = [column for column in connection.getColumnFromTable("Match") if column not in excluded_columns]
+    sqllite_rows = connection.execute_select("SELECT " + ", ".join(columns) + " FROM Match WHERE season < ? "
+                                             "ORDER BY id;", [season])
+    index = {"version": historical_store_version, "season": season, "fingerprint": fingerprint,
+             "n_rows": len(sqllite_rows), "columns": {}}
+    for i, column in enumerate(columns):
+        column_values = MatchStore.build_column(column, [sqllite_row[i] for sqllite_row in sqllite_rows])
+        index["columns"][column] = write_column(export_directory, column, column_values)
+    date_index = columns.index("date")
+    date_epoch = np.fromiter((MatchStore.to_epoch(sqllite_row[date_index]) for sqllite_row in sqllite_rows),
+                             dtype=np.int64, count=len(sqllite_rows))
+    np.save(os.path.join(export_directory, "date_epoch.npy"), date_epoch)
+    with open(os.path.join(export_directory, "index.json"), "w") as index_file:
+        json.dump(index, index_file)
+
+    # the new export is in use once the pointer is replaced: the processes reading the old one keep their mapping
+    current_path = os.path.join(directory, "current")
+    with open(current_path + "." + name, "w") as current_file:
+        current_file.write(name)
+    os.replace(current_path + "." + name, current_path)
+    remove_old_exports(name)
+    return export_directory, index
+
+
+def remove_old_exports(name):
+    for old_name in os.listdir(directory):
+        # the exports still being written (by other processes) have no index yet
+        if old_name.startswith("export_") and old_name != name \
+                and os.path.exists(os.path.join(directory, old_name, "index.json")):
+            # on POSIX the files already mapped stay readable
+            shutil.rmtree(os.path.join(directory, old_name), ignore_errors=True)
+
+
+def write_column(export_directory, column, column_values):
+    """
+    Write the arrays of the column, returning its description in the index
+    :param export_directory:
+    :param column:
+    :param column_values: MatchStore.Column
+    :return:
+    """
+    description = {"kind": column_values.kind}
+    values = column_values.values
+    null = column_values.null
+    if column_values.kind == "category":
+        description["categories"] = column_values.categories
+    elif column_values.kind == "object":
+        if all(value is None or type(value) == str for value in values):
+            # fixed-width strings
+            description["kind"] = "text"
+            null = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+            values = np.array(["" if value is None else value for value in values], dtype=str)
+            if len(values) == 0:
+                values = np.zeros(0, dtype="<U1")
+        else:
+            # mixed types (dirty data): pickled, read in memory
+            description["kind"] = "object"
+    np.save(os.path.join(export_directory, column + ".npy"), values, allow_pickle=description["kind"] == "object")
+    if null is not None:
+        np.save(os.path.join(export_directory, column + ".null.npy"), null)
+    return description
+
+
+def read_column(export_directory, column, description):
+    """
+    Return the MatchStore.Column of the export: memory-mapped arrays, but the columns of mixed types
+    :param export_directory:
+    :param column:
+    :param description:
+    :return:
+    """
+    kind = description["kind"]
+    path = os.path.join(export_directory, column + ".npy")
+    if kind == "object":
+        values = np.load(path, allow_pickle=True)
+    else:
+        values = load_array(path)
+    null = None
+    if kind in ("int", "text"):
+        null = load_array(os.path.join(export_directory, column + ".null.npy"))
+    return MatchStore.Column(kind, values, null=null, categories=description.get("categories"))
+
+
+def load_array(path):
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # an empty array cannot be mapped
+        return np.load(path)
@@ -1,15 +1,20 @@
 import logging
-import operator
+import numpy as np
 import src.util.util as util
+import src.util.Entity as Entity
 import src.util.Cache as Cache
 import src.util.SQLLite as SQLLite
-import src.application.Domain.Match as Match
-from src.application.Exception.MLException import MLException
+import src.application.Domain.MatchStore as MatchStore
+import src.application.Domain.Standings as Standings
+import src.application.Domain.TrainingWindow as TrainingWindow
 
 log = logging.getLogger(__name__)
 
 
-class League(object):
+class League(Entity.Entity):
+    __slots__ = Entity.get_slots("League")
+    table = "League"
+
     def __init__(self, id):
         self.id = id
 
@@ -32,29 +37,14 @@ class League(object):
         :param home:
         :return:
         """
-
         import src.application.Domain.Team as Team
 
-        matches = self.get_matches(season=season, finished=True)
-        teams = self.get_teams(season=season)
-        ranking = {team.id: 0 for team in teams}
-        for m in matches:
-            result, winner = m.get_winner()
-            if not util.is_None(winner):
-                ranking[winner.id] += 3
-            else:
-                ranking[m.get_home_team().id] += 1
-                ranking[m.get_away_team().id] += 1
-
-        ranking_ret = []
-        for team, p in sorted(ranking.items(), key=operator.itemgetter(1))[::-1]:
-            ranking_ret.append((p, Team.read_by_id(team)))
-
-        return ranking_ret
+        return [(p, Team.read_by_id(team_id)) for p, team_id in Standings.get_ranking(self, season)]
 
     def get_training_ranking(self, season, stage_to_predict, stages_to_train, home=None):
         """
-
+        Return the ranking of the teams in the training matches, by points per match
+        Return a list of pair <Points, Team>, ordered by descending points
         :param season:
         :param stage_to_predict:
         :param stages_to_train:
@@ -63,64 +53,21 @@ class League(object):
         """
         import src.application.Domain.Team as Team
 
-        matches = self.get_training_matches(season, stage_to_predict, stages_to_train)
-        teams = self.get_teams(season=season)
-        ranking = {team.id: 0 for team in teams}
-        num_matches = {team.id: 0 for team in teams}
-        for m in matches:
-            try:
-                result, winner = m.get_winner()
-                if result == 0:
-                    winner_id = None
-                else:
-                    winner_id = winner.id
-
-                home_id = m.get_home_team().id
-                away_id = m.get_away_team().id
-            except AttributeError:
-                continue
-
-            if util.is_None(home):
-                # total ranking
-                util.increase_dict_entry(home_id, num_matches)
-                util.increase_dict_entry(away_id, num_matches)
-
-                if result != 0:
-                    util.increase_dict_entry(winner_id, ranking, 3)
-                else:
-                    util.increase_dict_entry(home_id, ranking, 1)
-                    util.increase_dict_entry(away_id, ranking, 1)
-
-            elif home:
-                # home ranking
-                util.increase_dict_entry(home_id, num_matches)
-                if result == 1:
-                    util.increase_dict_entry(winner_id, ranking, 3)
-                elif result == 0:
-                    util.increase_dict_entry(home_id, ranking, 1)
-
-            else:
-                # away ranking
-                util.increase_dict_entry(away_id, num_matches)
-                if result == 2:
-                    util.increase_dict_entry(winner_id, ranking, 3)
-                elif result == 0:
-                    util.increase_dict_entry(away_id, ranking, 1)
-
-        # divide the overall point by the number of matches done
-        norm_ranking = dict()
-        for team_id, points in ranking.items():
-            if num_matches[team_id] > 0:
-                norm_ranking[team_id] = points / num_matches[team_id]
-            else:
-                norm_ranking[team_id] = 0
-
-        # order the normalized rank
-        ranking_ret = []
-        for team, p in sorted(norm_ranking.items(), key=operator.itemgetter(1))[::-1]:
-            ranking_ret.append((p, Team.read_by_id(team)))
-
-        return ranking_ret
+        ranking = Standings.get_training_ranking(self, season, stage_to_predict, stages_to_train, home=home)
+        return [(p, Team.read_by_id(team_id)) for p, team_id in ranking.ranking]
+
+    def get_training_position(self, team, season, stage_to_predict, stages_to_train, home=None):
+        """
+        Return the position of the team in the training ranking (1 is the first)
+        :param team:
+        :param season:
+        :param stage_to_predict:
+        :param stages_to_train:
+        :param home:
+        :return:
+        """
+        ranking = Standings.get_training_ranking(self, season, stage_to_predict, stages_to_train, home=home)
+        return ranking.get_position(team.id)
 
     def get_seasons(self):
         """
@@ -132,12 +79,11 @@ class League(object):
         except KeyError:
             pass
         seasons = []
-        query = "SELECT distinct(season) FROM Match WHERE league_id='" + str(self.id) + "'"
-        for sqllite_row in SQLLite.get_connection().execute_select(query):
+        query = "SELECT distinct(season) FROM Match WHERE league_id = ?"
+        for sqllite_row in SQLLite.get_connection().execute_select(query, [str(self.id)]):
             seasons.append(sqllite_row[0])
 
-        Cache.add_element(self.id, seasons, "SEASONS_BY_LEAGUE")
-        return seasons
+        return Cache.add_element(self.id, seasons, "SEASONS_BY_LEAGUE", tags=[("LEAGUE", self.id)])
 
     def get_stages_by_season(self, season):
 
@@ -162,26 +108,26 @@ class League(object):
         :param stage:
         :return:
         """
-        matches = Match.read_matches_by_league(self.id, season)
+        match_store = MatchStore.get_match_store(season)
+        filter = {"league_id": self.id}
+        if season:
+            filter["season"] = season
+        if stage:
+            filter["stage"] = stage
+        # only stages allow to filter-out dirty data
+        rows = match_store.select(match_store.mask(**filter) & match_store.stage_mask())
 
         if ordered:
-            try:
-                matches = sorted(matches, key=lambda match: match.stage)
-            except TypeError as e:
-                log.error("Impossible to order match of the league [" + str(self.id) + "], of the season ["
-                          + season + "] by stage")
-                raise e
-
-        if not util.is_None(finished) and finished:
-            matches = [m for m in matches if m.is_finished()]
-
-        if stage:
-            matches = [m for m in matches if m.stage == stage]
+            rows = rows[np.argsort(match_store.get("stage", rows), kind="stable")]
 
         if date:
-            matches = [m for m in matches if m.date.startswith(date)]
+            rows = rows[np.fromiter((match_date.startswith(date) for match_date in match_store.get("date", rows)),
+                                    dtype=bool, count=len(rows))]
+
+        if not util.is_None(finished) and finished:
+            rows = rows[match_store.finished_mask(rows)]
 
-        return matches
+        return match_store.views_of(rows)
 
     def get_teams(self, season=None):
         """
@@ -208,42 +154,11 @@ class League(object):
         :param consider_last:
         :return:
         """
-        if util.is_None(stages_to_train):
-            # stages to train not defined --> return only stage of this season
-            return [m for m in self.get_matches(season=season, ordered=True, finished=True)
-                    if m.stage < stage_to_predict]
-        else:
-            # stages to train is defined --> return all the matches played it those number of stages
-            #   EX: stage_to_predict = 7, n_match_1_stage = 10 --> return 70 matches
-            if consider_last:
-                # start to consider matches of previous seasons --> take them in the reverse order
-                training_matches = [m for m in self.get_matches(season=season, ordered=True, finished=True)]
-                training_matches = training_matches[::-1]
-            else:
-                training_matches = [m for m in self.get_matches(season=season, ordered=True, finished=True)
-                                    if m.stage < stage_to_predict]
-
-            if len(training_matches) == 0 and season < '2006/2007':
-                raise MLException(0)
-
-            stages_training = set([(m.stage, m.season) for m in training_matches])
-            if len(stages_training) < stages_to_train:
-                # need more matches from the past season, considering the last matches
-                past_training_matches = self.get_training_matches(util.get_previous_season(season),
-                                                                  0,
-                                                                  stages_to_train - len(stages_training),
-                                                                  consider_last=True)
-                training_matches.extend(past_training_matches)
-
-            n_matches_in_stage = int(len(self.get_teams_current_season())/2)
-            if len(training_matches) / n_matches_in_stage > stages_to_train:
-                # too matches in training --> remove too far
-                if consider_last:
-                    return training_matches[:stages_to_train * n_matches_in_stage][::-1]
-                else:
-                    return training_matches[-stages_to_train * n_matches_in_stage:]
-
-            return training_matches
+        # stages to train not defined --> only stage of this season
+        # stages to train is defined --> all the matches played in those number of stages, also of the past seasons
+        #   EX: stage_to_predict = 7, n_match_1_stage = 10 --> return 70 matches
+        match_ids = TrainingWindow.get_league_window(self, season, stage_to_predict, stages_to_train, consider_last)
+        return TrainingWindow.get_matches(match_ids, season)
 
     def add_name(self, new_league_name):
         """
@@ -252,8 +167,8 @@ class League(object):
         :return:
         """
         names = self.name+"|"+new_league_name
-        update = "UPDATE League set name = '"+names+"' where id='"+str(self.id)+"'"
-        SQLLite.get_connection().execute_update(update)
+        update = "UPDATE League set name = ? where id = ?"
+        SQLLite.get_connection().execute_update(update, [names, str(self.id)])
 
 
 def read_all():
@@ -265,8 +180,7 @@ def read_all():
     league_list = []
     for p in SQLLite.read_all("League"):
         league = League(p["id"])
-        for attribute, value in p.items():
-            league.__setattr__(attribute, value)
+        league.set_columns(p)
         league_list.append(league)
     return league_list
 
@@ -282,8 +196,7 @@ def read_by_country(country_id):
     league_list = []
     for p in sqllite_rows:
         league = League(p["id"])
-        for attribute, value in p.items():
-            league.__setattr__(attribute, value)
+        league.set_columns(p)
         league_list.append(league)
     return league_list
 
@@ -301,8 +214,7 @@ def read_by_id(id):
 
     sqllite_row = SQLLite.get_connection().select("League", **{"id": id})[0]
     league = League(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        league.__setattr__(attribute, value)
+    league.set_columns(sqllite_row)
 
     Cache.add_element(league.id, league, "LEAGUE_BY_ID")
     Cache.add_element(league.country_id, league, "LEAGUE_BY_COUNTRY")
@@ -325,8 +237,7 @@ def read_by_name(name, like=False):
     leagues = []
     for p in sqllite_row:
         league = League(p["id"])
-        for attribute, value in p.items():
-            league.__setattr__(attribute, value)
+        league.set_columns(p)
         leagues.append(league)
 
     return leagues
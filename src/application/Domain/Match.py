@@ -2,11 +2,24 @@ import logging
 import src.util.SQLLite as SQLLite
 import src.util.util as util
 import src.util.Cache as Cache
+import src.util.Entity as Entity
+import src.application.Domain.Match_Lineup as Match_Lineup
+import src.application.Domain.Match_Incident as Match_Incident
 
 log = logging.getLogger(__name__)
 
+# columns read on first access: incident XML strings, coordinates of the players, bookmaker odds
+match_columns = Entity.get_columns("Match")
+lazy_groups = (tuple(column for column in Match_Incident.incident_types if column in match_columns),
+               tuple(column for column in match_columns
+                     if column.startswith(("home_player_X", "home_player_Y", "away_player_X", "away_player_Y"))),
+               tuple(column for column in match_columns if column.isupper()))
+
+
+class Match(Entity.Entity):
+    __slots__ = Entity.get_slots("Match", lazy_groups)
+    table = "Match"
 
-class Match(object):
     def __init__(self, id):
         self.id = id
 
@@ -124,12 +137,9 @@ class Match(object):
         """
         import src.application.Domain.Player as Player
         attribute = 'home_player_'
-        players = []
-        for i in range(11):
-            player = Player.read_by_api_id(self.__getattribute__(attribute+str(i+1)))
-            players.append(player)
-
-        return players
+        players_api_id = [self.__getattribute__(attribute+str(i+1)) for i in range(11)]
+        players_by_api_id = Player.read_many_by_api_ids(players_api_id)
+        return [players_by_api_id.get(player_api_id) for player_api_id in players_api_id]
 
     def get_away_team_lines_up(self):
         """
@@ -138,31 +148,38 @@ class Match(object):
         """
         import src.application.Domain.Player as Player
         attribute = 'away_player_'
-        players = []
-        for i in range(11):
-            player = Player.read_by_api_id(self.__getattribute__(attribute+str(i+1)))
-            players.append(player)
-
-        return players
+        players_api_id = [self.__getattribute__(attribute+str(i+1)) for i in range(11)]
+        players_by_api_id = Player.read_many_by_api_ids(players_api_id)
+        return [players_by_api_id.get(player_api_id) for player_api_id in players_api_id]
 
     def get_match_event(self):
         import src.application.Domain.MatchEvent as MatchEvent
         return MatchEvent.read_by_match_id(self.id)
 
 
-def read_all(column_filter='*'):
+Entity.init_lazy_columns(Match, lazy_groups)
+
+
+def read_all(column_filter=None):
     """
     Read all the matches
-    :param column_filter:
+    :param column_filter: columns to read, by default all but the lazy ones
     :return:
     """
-    match_list = []
-    for p in SQLLite.read_all("Match", column_filter=column_filter):
-        match = Match(p["id"])
-        for attribute, value in p.items():
-            match.__setattr__(attribute, value)
-        match_list.append(match)
-    return match_list
+    return list(stream_all(column_filter))
+
+
+def stream_all(column_filter=None, batch_size=None):
+    """
+    Return the generator of all the matches, read from the DB batch_size at a time
+    :param column_filter: columns to read, by default all but the lazy ones
+    :param batch_size:
+    :return:
+    """
+    if column_filter is None:
+        column_filter = Entity.get_select_columns(Match)
+    return SQLLite.stream_all("Match", column_filter=column_filter, row_factory=Entity.get_row_factory(Match),
+                              batch_size=batch_size)
 
 
 def read_by_match_id(match_id):
@@ -177,15 +194,15 @@ def read_by_match_id(match_id):
         pass
 
     try:
-        sqllite_row = SQLLite.get_connection().select("Match", **{"id": str(match_id)})[0]
+        sqllite_row = SQLLite.get_connection().select("Match", column_filter=Entity.get_select_columns(Match),
+                                                      **{"id": str(match_id)})[0]
     except IndexError:
         return None
     match = Match(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        match.__setattr__(attribute, value)
+    match.set_columns(sqllite_row)
 
-    Cache.add_element(str(match.id), match, "MATCH_BY_ID")
-    Cache.add_element(str(match.match_api_id), match, "MATCH_BY_API_ID")
+    Cache.add_element(str(match.id), match, "MATCH_BY_ID", tags=[("MATCH", match.id)])
+    Cache.add_element(str(match.match_api_id), match, "MATCH_BY_API_ID", tags=[("MATCH", match.id)])
     return match
 
 
@@ -201,15 +218,15 @@ def read_by_match_api_id(match_api_id):
         pass
 
     try:
-        sqllite_row = SQLLite.get_connection().select("Match", **{"match_api_id": str(match_api_id)})[0]
+        sqllite_row = SQLLite.get_connection().select("Match", column_filter=Entity.get_select_columns(Match),
+                                                      **{"match_api_id": str(match_api_id)})[0]
     except IndexError:
         return None
     match = Match(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        match.__setattr__(attribute, value)
+    match.set_columns(sqllite_row)
 
-    Cache.add_element(str(match.id), match, "MATCH_BY_ID")
-    Cache.add_element(str(match.match_api_id), match, "MATCH_BY_API_ID")
+    Cache.add_element(str(match.id), match, "MATCH_BY_ID", tags=[("MATCH", match.id)])
+    Cache.add_element(str(match.match_api_id), match, "MATCH_BY_API_ID", tags=[("MATCH", match.id)])
     return match
 
 
@@ -226,13 +243,12 @@ def read_by_match_date(date_str, order_by_date=False):
         columns_order = None
 
     match_list = []
-    sqllite_rows = SQLLite.get_connection().select_like("Match",
-                                                        columns_order=columns_order,
-                                                        **{"date": str(date_str)})
+    sqllite_rows = SQLLite.get_connection().select_prefix("Match", column_filter=Entity.get_select_columns(Match),
+                                                          columns_order=columns_order,
+                                                          **{"date": str(date_str)})
     for p in sqllite_rows:
         match = Match(p["id"])
-        for attribute, value in p.items():
-            match.__setattr__(attribute, value)
+        match.set_columns(p)
         match_list.append(match)
     return match_list
 
@@ -259,17 +275,16 @@ def read_matches_by_league(league_id, season=None, only_stages=True):
     except KeyError:
         pass
 
-    for sqllite_row in SQLLite.get_connection().select("Match", **filter):
+    for sqllite_row in SQLLite.get_connection().select("Match", column_filter=Entity.get_select_columns(Match),
+                                                       **filter):
         match = Match(sqllite_row["id"])
-        for attribute, value in sqllite_row.items():
-            match.__setattr__(attribute, value)
+        match.set_columns(sqllite_row)
 
         if only_stages and type(match.stage)!=int:
             continue
         match_list.append(match)
 
-    Cache.add_element(str(league_id) + "_" + season, match_list, "MATCH_BY_LEAGUE")
-    return match_list
+    return Cache.add_element(str(league_id) + "_" + season, match_list, "MATCH_BY_LEAGUE", tags=[("LEAGUE", league_id)])
 
 
 def read_matches_by_team(team_api_id, season=None):
@@ -279,7 +294,7 @@ def read_matches_by_team(team_api_id, season=None):
     :param season:
     :return:
     """
-    match_list = read_matches_by_home_team(team_api_id, season)
+    match_list = Cache.copy_on_write(read_matches_by_home_team(team_api_id, season))
     match_list.extend(read_matches_by_away_team(team_api_id, season))
     return match_list
 
@@ -302,14 +317,14 @@ def read_matches_by_home_team(team_api_id, season=None):
         pass
 
     match_list = []
-    for sqllite_row in SQLLite.get_connection().select("Match", **filter):
+    for sqllite_row in SQLLite.get_connection().select("Match", column_filter=Entity.get_select_columns(Match),
+                                                       **filter):
         match = Match(sqllite_row["id"])
-        for attribute, value in sqllite_row.items():
-            match.__setattr__(attribute, value)
+        match.set_columns(sqllite_row)
         match_list.append(match)
 
-    Cache.add_element(str(team_api_id) + "_" + season, match_list, "MATCH_HOME")
-    return match_list
+    return Cache.add_element(str(team_api_id) + "_" + season, match_list, "MATCH_HOME",
+                             tags=[("TEAM_API_ID", team_api_id)])
 
 
 def read_matches_by_away_team(team_api_id, season=None):
@@ -331,14 +346,13 @@ def read_matches_by_away_team(team_api_id, season=None):
     except KeyError:
         pass
 
-    for sqllite_row in SQLLite.get_connection().select("Match", **filter):
+    for sqllite_row in SQLLite.get_connection().select("Match", column_filter=Entity.get_select_columns(Match),
+                                                       **filter):
         match = Match(sqllite_row["id"])
-        for attribute, value in sqllite_row.items():
-            match.__setattr__(attribute, value)
+        match.set_columns(sqllite_row)
         match_list.append(match)
 
-    Cache.add_element(str(team_api_id)+"_"+season, match_list, "MATCH_AWAY")
-    return match_list
+    return Cache.add_element(str(team_api_id)+"_"+season, match_list, "MATCH_AWAY", tags=[("TEAM_API_ID", team_api_id)])
 
 
 def read_by_player_api_id(player_api_id, only_stages=True):
@@ -352,25 +366,18 @@ def read_by_player_api_id(player_api_id, only_stages=True):
         return Cache.get_element(player_api_id, "MATCH_BY_PLAYER_API_ID")
     except KeyError:
         pass
-    home_player_i = 'home_player_'
-    away_player_i = 'away_player_'
-    or_filter = {}
-    for i in range(11):
-        or_filter[home_player_i + str(i+1)] = player_api_id
-        or_filter[away_player_i + str(i+1)] = player_api_id
     match_list = []
-    for sqllite_row in SQLLite.get_connection().select_or("Match", **or_filter):
+    for sqllite_row in Match_Lineup.read_match_rows_by_player_api_id(player_api_id,
+                                                                        Entity.get_select_columns(Match)):
         match = Match(sqllite_row["id"])
-        for attribute, value in sqllite_row.items():
-            match.__setattr__(attribute, value)
+        match.set_columns(sqllite_row)
 
         if only_stages and type(match.stage) != int:
             continue
 
         match_list.append(match)
 
-    Cache.add_element(player_api_id, match_list, "MATCH_BY_PLAYER_API_ID")
-    return match_list
+    return Cache.add_element(player_api_id, match_list, "MATCH_BY_PLAYER_API_ID", tags=[("PLAYER_API_ID", player_api_id)])
 
 
 def read_players_api_id_by_team_api_id(team_api_id, season=None):
@@ -381,50 +388,28 @@ def read_players_api_id_by_team_api_id(team_api_id, season=None):
     :param season:
     :return:
     """
-    players_api_id = set()
-    filter = {}
-    if season:
-        filter["season"] = season
-    else:
-        season = ""
     try:
-        return Cache.get_element(str(team_api_id) + "_" + season, "MATCH_GET_PLAYERS_BY_TEAM_API_ID")
+        return Cache.get_element(str(team_api_id) + "_" + (season or ""), "MATCH_GET_PLAYERS_BY_TEAM_API_ID")
     except KeyError:
         pass
 
-    filter["home_team_api_id"] = team_api_id
-    for sqllite_row in SQLLite.get_connection().select("Match", column_filter="home_player_1, home_player_2, "
-                                                                              "home_player_3, home_player_4, "
-                                                                              "home_player_5, home_player_6, "
-                                                                              "home_player_7, home_player_8, "
-                                                                              "home_player_9, home_player_10, "
-                                                                              "home_player_11", **filter):
-        for home_player_i, player_api_id in sqllite_row.items():
-            if player_api_id:
-                players_api_id.add(player_api_id)
-
-    del(filter["home_team_api_id"])
-    filter["away_team_api_id"] = team_api_id
-    for sqllite_row in SQLLite.get_connection().select("Match", column_filter="away_player_1, away_player_2, "
-                                                                              "away_player_3, away_player_4, "
-                                                                              "away_player_5, away_player_6, "
-                                                                              "away_player_7, away_player_8, "
-                                                                              "away_player_9, away_player_10, "
-                                                                              "away_player_11", **filter):
-        for away_player_i, player_api_id in sqllite_row.items():
-            if not util.is_None(player_api_id):
-                players_api_id.add(player_api_id)
-    Cache.add_element(str(team_api_id)+"_"+season, players_api_id, "MATCH_GET_PLAYERS_BY_TEAM_API_ID")
-    return players_api_id
+    players_api_id = Match_Lineup.read_players_api_id_by_team_api_id(team_api_id, season)
+    return Cache.add_element(str(team_api_id)+"_"+(season or ""), players_api_id, "MATCH_GET_PLAYERS_BY_TEAM_API_ID",
+                             tags=[("TEAM_API_ID", team_api_id)])
 
 
 def write_new_match(match_attributes):
     """
     Write new match (represented as a dictionary in input) in the DB
     :param match_attributes:
-    :return:
+    :return: the id of the new match
     """
-    SQLLite.get_connection().insert("Match", match_attributes)
+    connection = SQLLite.get_connection()
+    with connection.transaction():
+        match_id = connection.insert("Match", match_attributes)
+        Match_Lineup.write_match_lineup(match_id, match_attributes)
+        invalidate_cache(match_attributes, match_id)
+    return match_id
 
 
 def update_match(match, match_attributes):
@@ -434,6 +419,57 @@ def update_match(match, match_attributes):
     :param match_attributes:
     :return:
     """
-    for attribute, value in match_attributes.items():
-        match.__setattr__(attribute, value)
-    SQLLite.get_connection().update("Match", match)
+    # the elements depending on the match before the update
+    old_dependencies = {attribute: getattr(match, attribute, None) for attribute in get_cache_dependencies()}
+
+    match.set_columns(match_attributes)
+    connection = SQLLite.get_connection()
+    with connection.transaction():
+        connection.update("Match", match)
+        Match_Lineup.write_match_lineup(match.id, {column: getattr(match, column, None)
+                                                   for column in connection.getColumnFromTable("Match")})
+        invalidate_cache(old_dependencies)
+        invalidate_cache(match_attributes, match.id)
+
+
+def get_cache_dependencies():
+    """
+    Return the attributes of a match the cached elements depend on: league, teams and players
+    :return:
+    """
+    attributes = ["league_id", "home_team_api_id", "away_team_api_id"]
+    for side in Match_Lineup.sides:
+        for i in range(Match_Lineup.n_players):
+            attributes.append(side + "_player_" + str(i + 1))
+    return attributes
+
+
+def invalidate_cache(match_attributes, match_id=None):
+    """
+    Remove from the cache the elements depending on the match (represented as a dictionary):
+    matches of its league, of its teams and of its players; the row of the match is read again by the MatchStore
+    :param match_attributes:
+    :param match_id: id of the match written, None if only the dependencies have to be invalidated
+    :return:
+    """
+    import src.application.Domain.MatchStore as MatchStore
+
+    tags = []
+    for attribute in get_cache_dependencies():
+        if attribute == "league_id":
+            entity = "LEAGUE"
+        elif attribute.endswith("_team_api_id"):
+            entity = "TEAM_API_ID"
+        else:
+            entity = "PLAYER_API_ID"
+        tags.append((entity, match_attributes.get(attribute)))
+    if match_id is not None:
+        tags.append(("MATCH", match_id))
+
+    def invalidate():
+        if match_id is not None:
+            MatchStore.update_rows([match_id])
+        Cache.invalidate(*tags)
+
+    # once committed: the elements read again before would hold rows that can still be rolled back
+    SQLLite.get_connection().after_commit(invalidate)
@@ -0,0 +1,895 @@
+import os
+import logging
+import datetime
+import threading
+
+import numpy as np
+
+import src.util.SQLLite as SQLLite
+import src.util.util as util
+import src.application.Domain.Match as Match
+
+log = logging.getLogger(__name__)
+
+# Columnar version of the Match table: each column is a NumPy array, in the order of the match ids
+# The domain methods filter the matches with boolean masks over the arrays, and build the Match objects
+# (MatchView, reading from the arrays) only for the rows selected
+#
+# columns loaded with the store; the bookmaker odds (upper-case columns) are loaded with them
+core_columns = ("id", "country_id", "league_id", "season", "stage", "date", "match_api_id",
+                "home_team_api_id", "away_team_api_id", "home_team_goal", "away_team_goal")
+# columns with few distinct values, stored as codes of a list of categories
+categorical_columns = ("season",)
+# the other columns (players, coordinates of the players, incident XML strings) are read by row on first access: the
+# players and their coordinates all together, the incident XML strings one column at a time
+missing_date = np.iinfo(np.int64).min
+# a match is finished when it has been played 1 day ago (with goals) or 100 days ago (without goals), or when its
+# incidents are known (Match.is_finished)
+incident_columns = ("goal", "shoton", "shotoff", "foulcommit", "card", "cross", "corner", "possession")
+seconds_in_day = 24 * 60 * 60
+
+# KEY: <pid, first season of the store (None: all the seasons)>, VALUE: MatchStore
+match_stores = {}
+lock = threading.RLock()
+
+
+class Column(object):
+    """
+    Values of one column of Match, one for each row of the store
+    kind: "int" (int64 values, null mask), "float" (float64 values, NaN for NULL), "category" (int32 codes of
+    categories, -1 for NULL), "text" (fixed-width strings, null mask) or "object" (values as read from the DB)
+    """
+    def __init__(self, kind, values, null=None, categories=None):
+        self.kind = kind
+        self.values = values
+        self.null = null
+        self.categories = categories
+
+    def get_value(self, row):
+        """
+        Return the value of the row as the DB returns it (int, float, str or None)
+        :param row:
+        :return:
+        """
+        if self.kind == "int":
+            if self.null[row]:
+                return None
+            return int(self.values[row])
+        if self.kind == "float":
+            value = self.values[row]
+            if np.isnan(value):
+                return None
+            return float(value)
+        if self.kind == "category":
+            code = self.values[row]
+            if code < 0:
+                return None
+            return self.categories[code]
+        if self.kind == "text":
+            if self.null[row]:
+                return None
+            return str(self.values[row])
+        return self.values[row]
+
+    def extend(self, n_rows):
+        """
+        Return the Column with n_rows NULL values appended
+        :param n_rows:
+        :return:
+        """
+        if n_rows == 0:
+            return self
+        if self.kind == "int":
+            return Column("int", np.concatenate((self.values, np.zeros(n_rows, dtype=np.int64))),
+                          null=np.concatenate((self.null, np.ones(n_rows, dtype=bool))))
+        if self.kind == "float":
+            return Column("float", np.concatenate((self.values, np.full(n_rows, np.nan))))
+        if self.kind == "category":
+            return Column("category", np.concatenate((self.values, np.full(n_rows, -1, dtype=np.int32))),
+                          categories=self.categories)
+        if self.kind == "text":
+            return Column("text", np.concatenate((self.values, np.zeros(n_rows, dtype=self.values.dtype))),
+                          null=np.concatenate((self.null, np.ones(n_rows, dtype=bool))))
+        values = np.empty(len(self.values) + n_rows, dtype=object)
+        values[:len(self.values)] = self.values
+        return Column("object", values)
+
+    def set_values(self, rows, values):
+        """
+        Set the values of the rows in place
+        :param rows: list of row numbers
+        :param values: list of values, as read from the DB
+        :return: False if a value does not fit the kind of the column (nothing is set)
+        """
+        not_null = [value for value in values if value is not None]
+        if self.kind == "int":
+            if any(type(value) is not int for value in not_null):
+                return False
+            self.values[rows] = [0 if value is None else value for value in values]
+            self.null[rows] = [value is None for value in values]
+        elif self.kind == "float":
+            if any(type(value) is not float for value in not_null):
+                return False
+            self.values[rows] = [np.nan if value is None else value for value in values]
+        elif self.kind == "category":
+            for value in not_null:
+                if value not in self.categories:
+                    self.categories = self.categories + [value]
+            self.values[rows] = [-1 if value is None else self.categories.index(value) for value in values]
+        elif self.kind == "object":
+            for row, value in zip(rows, values):
+                self.values[row] = value
+        else:
+            return False
+        return True
+
+    def get_code(self, value):
+        """
+        Return the value of the arrays matching the input-value, None if no row can have it
+        :param value:
+        :return:
+        """
+        if self.kind == "int":
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        if self.kind == "float":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+        if self.kind == "category":
+            try:
+                return self.categories.index(value)
+            except ValueError:
+                return None
+        return value
+
+
+def build_column(name, values):
+    """
+    Return the Column of the values in input: numeric arrays when all the values have the same numeric type
+    :param name:
+    :param values:
+    :return:
+    """
+    not_null = [value for value in values if value is not None]
+    if name in categorical_columns:
+        categories = sorted(set(not_null))
+        code_by_category = {category: code for code, category in enumerate(categories)}
+        codes = np.fromiter((-1 if value is None else code_by_category[value] for value in values),
+                            dtype=np.int32, count=len(values))
+        return Column("category", codes, categories=categories)
+
+    value_types = set(type(value) for value in not_null)
+    if value_types <= {int}:
+        null = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+        ints = np.fromiter((0 if value is None else value for value in values), dtype=np.int64, count=len(values))
+        return Column("int", ints, null=null)
+    if value_types == {float}:
+        floats = np.fromiter((np.nan if value is None else value for value in values),
+                             dtype=np.float64, count=len(values))
+        return Column("float", floats)
+
+    objects = np.empty(len(values), dtype=object)
+    objects[:] = values
+    return Column("object", objects)
+
+
+def update_column(name, column_values, n_rows, rows, values):
+    """
+    Return the Column with the values of the rows in input, grown to n_rows: updated in place if the values fit its
+    kind, built again otherwise
+    :param name:
+    :param column_values: Column
+    :param n_rows:
+    :param rows: list of row numbers
+    :param values: list of values, as read from the DB
+    :return:
+    """
+    n_old_rows = len(column_values.values)
+    column_values = column_values.extend(n_rows - n_old_rows)
+    if not column_values.set_values(rows, values):
+        all_values = [column_values.get_value(row) for row in range(n_old_rows)] + [None] * (n_rows - n_old_rows)
+        for row, value in zip(rows, values):
+            all_values[row] = value
+        column_values = build_column(name, all_values)
+    return column_values
+
+
+def to_epoch(date_str):
+    """
+    Seconds from 1970-01-01 of the date (ISO string, with or without hours), missing_date if not a date
+    :param date_str:
+    :return:
+    """
+    if util.is_None(date_str):
+        return missing_date
+    try:
+        date = datetime.datetime.fromisoformat(date_str.strip())
+    except (AttributeError, ValueError):
+        return missing_date
+    return int((date - datetime.datetime(1970, 1, 1)).total_seconds())
+
+
+def get_now_epoch():
+    """
+    Seconds from 1970-01-01 of the current time of the run (util.get_now), with the fraction of second
+    :return:
+    """
+    return (util.get_now() - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+class MatchStore(object):
+    """
+    The Match table in memory as NumPy arrays, rows ordered by match id
+    With the historical store enabled, only the matches of the current seasons (from min_season on)
+    """
+    def __init__(self, connection, min_season=None):
+        self.connection = connection
+        self.min_season = min_season
+        self.data_version = get_data_version(connection)
+        self.column_names = connection.getColumnFromTable("Match")
+        eager_columns = [column for column in self.column_names
+                         if column in core_columns or column.isupper()]
+
+        if min_season is None:
+            sqllite_rows = connection.execute_select("SELECT " + ", ".join(eager_columns) + " FROM Match ORDER BY id;")
+        else:
+            sqllite_rows = connection.execute_select("SELECT " + ", ".join(eager_columns) + " FROM Match "
+                                                     "WHERE season >= ? ORDER BY id;", [min_season])
+        self.n_rows = len(sqllite_rows)
+        self.columns = {}
+        for i, column in enumerate(eager_columns):
+            self.columns[column] = build_column(column, [sqllite_row[i] for sqllite_row in sqllite_rows])
+        self.ids = self.columns["id"].values
+        self.date_epoch = np.fromiter((to_epoch(date) for date in self.columns["date"].values),
+                                      dtype=np.int64, count=self.n_rows)
+        # KEY: lazy column, VALUE: dictionary row --> value, for the rows read so far
+        self.lazy_values = {}
+        # mask of the finished matches, valid for the current times (epoch) in [finished_from, finished_until]
+        self.finished = None
+        self.finished_from = None
+        self.finished_until = None
+        # Match objects of the rows, built on first access
+        self.views = [None] * self.n_rows
+        # increased by each update of the rows (update_rows): globally, and for the <league, season> and the
+        # <team, season> of the matches updated, before and after the update (see increase_versions)
+        self.version = 0
+        self.league_versions = {}
+        self.team_versions = {}
+        self.lock = threading.RLock()
+        log.debug("MatchStore loaded: " + str(self.n_rows) + " matches, " + str(len(eager_columns)) + " columns")
+
+    def get_column(self, column):
+        """
+        Return the Column with the values of all the rows, loading it from the DB if it is not in memory yet
+        Throw a KeyError if the column is not in the Match table
+        :param column:
+        :return:
+        """
+        try:
+            return self.columns[column]
+        except KeyError:
+            pass
+        if column not in self.column_names:
+            raise KeyError(column)
+
+        with self.lock:
+            if column not in self.columns:
+                sqllite_rows = self.connection.execute_select("SELECT id, " + column + " FROM Match "
+                                                              "WHERE id <= ? ORDER BY id;", [self.get_max_id()])
+                rows = self.get_rows([sqllite_row[0] for sqllite_row in sqllite_rows])
+                values = [None] * self.n_rows
+                for row, sqllite_row in zip(rows, sqllite_rows):
+                    if row >= 0:
+                        values[row] = sqllite_row[1]
+                self.columns[column] = build_column(column, values)
+                self.lazy_values.pop(column, None)
+        return self.columns[column]
+
+    def get_value(self, column, row):
+        """
+        Return the value of the column in the row; a column not in memory is read from the DB only for the row
+        Throw a KeyError if the column is not in the Match table
+        :param column:
+        :param row:
+        :return:
+        """
+        try:
+            return self.columns[column].get_value(row)
+        except KeyError:
+            pass
+        try:
+            return self.lazy_values[column][row]
+        except KeyError:
+            pass
+        if column not in self.column_names:
+            raise KeyError(column)
+        self.load_rows([row], self.get_lazy_group(column))
+        return self.lazy_values[column][row]
+
+    def get_lazy_group(self, column):
+        """
+        Return the lazy columns read from the DB together with the input one
+        :param column:
+        :return:
+        """
+        if column in incident_columns:
+            return [column]
+        return [lazy_column for lazy_column in self.column_names
+                if lazy_column not in self.columns and lazy_column not in incident_columns]
+
+    def load_rows(self, rows, columns):
+        """
+        Read from the DB the values of the lazy columns in input, only for the rows in input
+        :param rows: row numbers
+        :param columns:
+        :return:
+        """
+        match_ids = [int(self.ids[row]) for row in rows]
+        sqllite_row_by_id = {}
+        for i in range(0, len(match_ids), SQLLite.max_in_values):
+            chunk = match_ids[i:i + SQLLite.max_in_values]
+            for sqllite_row in self.connection.execute_select("SELECT id, " + ", ".join(columns) + " FROM Match "
+                                                              "WHERE id IN (" + ",".join(["?"] * len(chunk))
+                                                              + ");", chunk):
+                sqllite_row_by_id[sqllite_row[0]] = sqllite_row
+        with self.lock:
+            for i, column in enumerate(columns):
+                values = self.lazy_values.setdefault(column, {})
+                for row, match_id in zip(rows, match_ids):
+                    sqllite_row = sqllite_row_by_id.get(match_id)
+                    values[int(row)] = None if sqllite_row is None else sqllite_row[i + 1]
+
+    def update_rows(self, match_ids):
+        """
+        Read again from the DB the matches in input, written by this process: their rows are updated in place, the
+        new matches are appended; the versions of their leagues and of their teams are increased
+        :param match_ids:
+        :return: False if the store cannot be updated in place (a match deleted, inserted before the last one, or of a
+                 season before min_season)
+        """
+        match_ids = sorted(set(int(match_id) for match_id in match_ids if not util.is_None(match_id)))
+        columns = list(self.columns.keys())
+        sqllite_rows = []
+        for i in range(0, len(match_ids), SQLLite.max_in_values):
+            chunk = match_ids[i:i + SQLLite.max_in_values]
+            sqllite_rows.extend(self.connection.execute_select("SELECT " + ", ".join(columns) + " FROM Match "
+                                                               "WHERE id IN (" + ",".join(["?"] * len(chunk))
+                                                               + ") ORDER BY id;", chunk))
+        if self.min_season is not None:
+            season_index = columns.index("season")
+            if any(sqllite_row[season_index] is None or sqllite_row[season_index] < self.min_season
+                   for sqllite_row in sqllite_rows):
+                return False
+        id_index = columns.index("id")
+        found_ids = [sqllite_row[id_index] for sqllite_row in sqllite_rows]
+        if np.any(self.get_rows(sorted(set(match_ids) - set(found_ids))) >= 0):
+            # deleted
+            return False
+        rows = self.get_rows(found_ids)
+        new_ids = [match_id for match_id, row in zip(found_ids, rows) if row < 0]
+        if len(new_ids) > 0 and new_ids[0] <= self.get_max_id():
+            return False
+
+        with self.lock:
+            self.increase_versions(rows[rows >= 0])
+            n_rows = self.n_rows + len(new_ids)
+            rows = rows.tolist()
+            for i, match_id in enumerate(new_ids):
+                rows[found_ids.index(match_id)] = self.n_rows + i
+            for i, column in enumerate(columns):
+                self.columns[column] = update_column(column, self.columns[column], n_rows, rows,
+                                                     [sqllite_row[i] for sqllite_row in sqllite_rows])
+            self.ids = self.columns["id"].values
+            self.date_epoch = np.concatenate((self.date_epoch, np.zeros(len(new_ids), dtype=np.int64)))
+            self.date_epoch[rows] = [to_epoch(self.columns["date"].get_value(row)) for row in rows]
+            for values in self.lazy_values.values():
+                for row in rows:
+                    values.pop(row, None)
+            self.views.extend([None] * len(new_ids))
+            self.n_rows = n_rows
+            if self.finished is not None:
+                # built again at the next access, compared with the status of the rows not updated
+                self.finished = np.concatenate((self.finished, np.zeros(len(new_ids), dtype=bool)))
+                self.finished_until = None
+            self.increase_versions(np.asarray(rows, dtype=np.int64))
+            self.version += 1
+        log.debug("MatchStore updated: " + str(len(rows)) + " matches, " + str(len(new_ids)) + " new")
+        return True
+
+    def increase_versions(self, rows):
+        """
+        Increase the versions of the teams of the rows in their season, and of the leagues these teams play in that
+        season (the form of a team, read by the inputs of a league, counts its matches of any league)
+        :param rows:
+        :return:
+        """
+        if len(rows) == 0:
+            return
+        season_column = self.get_column("season")
+        teams_by_season = {}
+        for row in rows:
+            season = season_column.get_value(row)
+            teams = teams_by_season.setdefault(season, set())
+            teams.add(self.get_value("home_team_api_id", row))
+            teams.add(self.get_value("away_team_api_id", row))
+            league_key = (get_version_key(self.get_value("league_id", row)), season)
+            self.league_versions[league_key] = self.league_versions.get(league_key, 0) + 1
+
+        for season, teams in teams_by_season.items():
+            for team_api_id in teams:
+                team_key = (get_version_key(team_api_id), season)
+                self.team_versions[team_key] = self.team_versions.get(team_key, 0) + 1
+            team_codes = [code for code in (self.get_column("home_team_api_id").get_code(team_api_id)
+                                            for team_api_id in teams) if code is not None]
+            in_season = self.mask(season=season)
+            played = in_season & (np.isin(self.get("home_team_api_id"), team_codes)
+                                  | np.isin(self.get("away_team_api_id"), team_codes))
+            for league_id in set(self.get_value("league_id", row) for row in np.flatnonzero(played)):
+                league_key = (get_version_key(league_id), season)
+                self.league_versions[league_key] = self.league_versions.get(league_key, 0) + 1
+
+    def get_league_version(self, league_id, season):
+        """
+        Return the version of the matches of the league in the season: it changes when one of them, or a match of one
+        of its teams in the season, is updated (update_rows)
+        :param league_id:
+        :param season:
+        :return:
+        """
+        return self.league_versions.get((get_version_key(league_id), season), 0)
+
+    def get_team_version(self, team_api_id, season):
+        """
+        Return the version of the matches of the team in the season: it changes when one of them is updated
+        :param team_api_id:
+        :param season:
+        :return:
+        """
+        return self.team_versions.get((get_version_key(team_api_id), season), 0)
+
+    def get_max_id(self):
+        if self.n_rows == 0:
+            return -1
+        return int(self.ids[-1])
+
+    def get(self, column, rows=None):
+        """
+        Return the values of the column (NumPy array), for all the rows or only for the input ones
+        :param column:
+        :param rows: array of row numbers, or a boolean mask
+        :return:
+        """
+        values = self.get_column(column).values
+        if rows is None:
+            return values
+        return values[rows]
+
+    def is_null(self, column, rows=None):
+        """
+        Return the mask of the NULL values of the column
+        :param column:
+        :param rows:
+        :return:
+        """
+        column_values = self.get_column(column)
+        if column_values.kind == "int":
+            null = column_values.null
+        elif column_values.kind == "float":
+            null = np.isnan(column_values.values)
+        elif column_values.kind == "category":
+            null = column_values.values < 0
+        elif column_values.kind == "text":
+            null = column_values.null | (column_values.values == "None")
+        else:
+            null = np.fromiter((util.is_None(value) for value in column_values.values),
+                               dtype=bool, count=self.n_rows)
+        if rows is None:
+            return null
+        return null[rows]
+
+    def mask(self, **filter):
+        """
+        Return the boolean mask of the rows whose columns have the input values (EX: league_id=1, season="2015/2016")
+        :param filter:
+        :return:
+        """
+        mask = np.ones(self.n_rows, dtype=bool)
+        for column, value in filter.items():
+            column_values = self.get_column(column)
+            code = column_values.get_code(value)
+            if code is None:
+                return np.zeros(self.n_rows, dtype=bool)
+            mask &= column_values.values == code
+            if column_values.kind == "int":
+                mask &= ~column_values.null
+        return mask
+
+    def stage_mask(self):
+        """
+        Return the mask of the rows with an integer stage (the other ones are dirty data)
+        :return:
+        """
+        column_values = self.get_column("stage")
+        if column_values.kind == "int":
+            return ~column_values.null
+        return np.fromiter((type(value) is int for value in column_values.values), dtype=bool, count=self.n_rows)
+
+    def finished_mask(self, rows=None):
+        """
+        Return the mask of the finished matches (as Match.is_finished, with respect to util.get_now)
+        The mask is built again only when the current time passes the first date a match not finished yet finishes
+        :param rows: array of row numbers; None for all the rows
+        :return:
+        """
+        now_epoch = get_now_epoch()
+        finished = self.finished
+        if finished is None or self.finished_until is None \
+                or not self.finished_from <= now_epoch <= self.finished_until:
+            finished = self.refresh_finished(now_epoch)
+        if rows is None:
+            return finished
+        return finished[rows]
+
+    def refresh_finished(self, now_epoch):
+        """
+        Build the mask of the finished matches at the input time: the rows finished (or not) since the previous mask
+        increase the versions of their leagues and teams, as the updated ones
+        :param now_epoch:
+        :return:
+        """
+        with self.lock:
+            finished, finished_until = self.build_finished_mask(now_epoch)
+            previous = self.finished
+            self.finished, self.finished_from, self.finished_until = finished, now_epoch, finished_until
+            if previous is not None and len(previous) == len(finished):
+                changed = np.flatnonzero(previous != finished)
+                if len(changed) > 0:
+                    self.increase_versions(changed)
+                    self.version += 1
+        return finished
+
+    def build_finished_mask(self, now_epoch):
+        """
+        Return <mask of the finished matches at the input time, last time (epoch) the mask is valid>
+        :param now_epoch:
+        :return:
+        """
+        home_team_goal = self.get_column("home_team_goal")
+        away_team_goal = self.get_column("away_team_goal")
+        null_goals = self.is_null("home_team_goal") | self.is_null("away_team_goal")
+        is_scored_goals = ~null_goals & ((home_team_goal.values > 0) | (away_team_goal.values > 0))
+
+        # finished by date, after 1 day (with goals) or 100 days (without goals)
+        has_date = (self.date_epoch != missing_date) & ~null_goals
+        finished_after = self.date_epoch + np.where(is_scored_goals, seconds_in_day, 100 * seconds_in_day)
+        finished = has_date & (finished_after < now_epoch)
+
+        # the other ones are finished if any incident is known: only these rows are read
+        rows = np.flatnonzero(~finished)
+        columns = [column for column in incident_columns if column in self.column_names]
+        if len(rows) > 0 and len(columns) > 0:
+            incident_rows = self.get_rows(self.read_ids_with_incidents(self.ids[rows].tolist(), columns))
+            finished[incident_rows[incident_rows >= 0]] = True
+
+        pending = has_date & ~finished
+        finished_until = float(np.min(finished_after[pending])) if np.any(pending) else np.inf
+        return finished, finished_until
+
+    def read_ids_with_incidents(self, match_ids, columns):
+        """
+        Return the ids of the matches in input with any of the incident columns not NULL (Match.is_finished)
+        :param match_ids:
+        :param columns:
+        :return:
+        """
+        condition = " OR ".join("(\"" + column + "\" IS NOT NULL AND \"" + column + "\" != 'None')"
+                                for column in columns)
+        ids = []
+        for i in range(0, len(match_ids), SQLLite.max_in_values):
+            chunk = match_ids[i:i + SQLLite.max_in_values]
+            ids.extend(sqllite_row[0] for sqllite_row in
+                       self.connection.execute_select("SELECT id FROM Match WHERE id IN ("
+                                                      + ",".join(["?"] * len(chunk)) + ") AND (" + condition + ");",
+                                                      chunk))
+        return ids
+
+    def select(self, mask):
+        """
+        Return the row numbers of the mask, in the order of the match ids
+        :param mask:
+        :return:
+        """
+        return np.flatnonzero(mask)
+
+    def get_rows(self, match_ids):
+        """
+        Return the row numbers of the matches in input (-1 for the matches not in the store)
+        :param match_ids:
+        :return:
+        """
+        match_ids = np.asarray(match_ids, dtype=np.int64)
+        if self.n_rows == 0:
+            return np.full(len(match_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, match_ids), self.n_rows - 1)
+        rows[self.ids[rows] != match_ids] = -1
+        return rows
+
+    def get_view(self, row):
+        """
+        Return the Match of the row
+        :param row:
+        :return:
+        """
+        view = self.views[row]
+        if view is None:
+            view = MatchView(self, int(row))
+            self.views[row] = view
+        return view
+
+    def views_of(self, rows):
+        """
+        Return the Match objects of the rows, in the same order
+        :param rows:
+        :return:
+        """
+        return [self.get_view(row) for row in rows]
+
+
+class MatchView(Match.Match):
+    """
+    Match reading its attributes from the arrays of a MatchStore
+    Attributes set on the object (EX: by Match.update_match) hide the values of the store
+    """
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        object.__setattr__(self, "store", store)
+        object.__setattr__(self, "row", row)
+
+    def __getattribute__(self, attribute):
+        # not __getattr__: the domain code reads the columns also with an explicit __getattribute__
+        try:
+            return object.__getattribute__(self, attribute)
+        except AttributeError:
+            pass
+        try:
+            return object.__getattribute__(self, "store").get_value(attribute, object.__getattribute__(self, "row"))
+        except KeyError:
+            raise AttributeError(attribute)
+
+    def is_finished(self):
+        for column in ("date", "home_team_goal", "away_team_goal"):
+            try:
+                object.__getattribute__(self, column)
+                # set on the object (EX: by Match.update_match): not the value of the store
+                return Match.Match.is_finished(self)
+            except AttributeError:
+                pass
+        return bool(object.__getattribute__(self, "store").finished_mask()[object.__getattribute__(self, "row")])
+
+    def load_columns(self, columns):
+        # the lazy columns are read from the store, not from the DB
+        store = object.__getattribute__(self, "store")
+        row = object.__getattribute__(self, "row")
+        for column in columns:
+            try:
+                value = store.get_value(column, row)
+            except KeyError:
+                value = None
+            setattr(self, column, value)
+
+    def __reduce__(self):
+        # not the whole store: the match is read again by id when unpickled
+        return Match.read_by_match_id, (self.id,)
+
+
+def get_version_key(value):
+    """
+    Key of a league/team in the versions of a MatchStore: the ids as in the arrays (int)
+    :param value:
+    :return:
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def get_league_version(league_id, seasons):
+    """
+    Return the version of the matches of the league in the seasons, to check the structures built over them: it
+    changes when the store of one of the seasons is loaded again, or updated with a match of the league or of one
+    of its teams in the season
+    :param league_id:
+    :param seasons:
+    :return: tuple of <MatchStore, version> of each season
+    """
+    return tuple((match_store, match_store.get_league_version(league_id, season))
+                 for season, match_store in get_match_stores(seasons))
+
+
+def get_team_version(team_api_id, seasons):
+    """
+    Return the version of the matches of the team in the seasons (as get_league_version)
+    :param team_api_id:
+    :param seasons:
+    :return: tuple of <MatchStore, version> of each season
+    """
+    return tuple((match_store, match_store.get_team_version(team_api_id, season))
+                 for season, match_store in get_match_stores(seasons))
+
+
+def get_match_stores(seasons):
+    """
+    Return <season, MatchStore of the season> for each season, checking the DB only once for all the seasons not in
+    the historical store
+    The masks of the finished matches of the stores are brought to the current time: the matches finished in the
+    meantime change the versions of their leagues and teams
+    :param seasons:
+    :return:
+    """
+    import src.application.Domain.HistoricalStore as HistoricalStore
+
+    historical_store = HistoricalStore.get_historical_store()
+    if historical_store is not None:
+        historical_store.finished_mask()
+    match_stores_by_season = []
+    match_store = None
+    for season in seasons:
+        if historical_store is not None and season < historical_store.season:
+            match_stores_by_season.append((season, historical_store))
+            continue
+        if match_store is None:
+            match_store = get_match_store(season)
+            match_store.finished_mask()
+        match_stores_by_season.append((season, match_store))
+    return match_stores_by_season
+
+
+def get_stores_until(season=None):
+    """
+    Return the MatchStores with the matches of the season and of the previous ones: with the historical store enabled,
+    the historical store and the MatchStore of the current seasons
+    :param season: None for any season
+    :return:
+    """
+    import src.application.Domain.HistoricalStore as HistoricalStore
+
+    match_store = get_match_store(season)
+    if match_store.min_season is not None:
+        historical_store = HistoricalStore.get_historical_store()
+        if historical_store is not None:
+            return [historical_store, match_store]
+    return [match_store]
+
+
+def locate(match_ids, season=None):
+    """
+    Return the matches in input grouped by store, as a list of <MatchStore, positions in input, rows in the store>
+    The matches of a window of the season are of that season or of the previous ones (get_stores_until); the matches
+    in no store are left out
+    :param match_ids:
+    :param season: season of the window, None for any season
+    :return:
+    """
+    match_ids = np.asarray(match_ids, dtype=np.int64)
+    groups = []
+    for window_store in get_stores_until(season):
+        rows = window_store.get_rows(match_ids)
+        positions = np.flatnonzero(rows >= 0)
+        if len(positions) > 0:
+            groups.append((window_store, positions, rows[positions]))
+    return groups
+
+
+def count_finished():
+    """
+    Return the number of finished matches up to the current season, with respect to util.get_now
+    :return:
+    """
+    return sum(int(np.count_nonzero(match_store.finished_mask()))
+               for match_store in get_stores_until(util.get_current_season()))
+
+
+def get_data_version(connection):
+    """
+    Version of the DB file: it changes when another connection (EX: the crawler process) commits
+    :param connection:
+    :return:
+    """
+    return connection.get_data_version()
+
+
+def get_match_store(season=None):
+    """
+    Return the MatchStore of the current process, loading it again if the DB has been changed by another process
+    With the historical store enabled, the matches of a past season are read from its memory-mapped files, the ones of
+    the current seasons from a MatchStore of these seasons only; the reads of any season (None) load all the matches
+    :param season: season of the matches to read, None for any season
+    :return:
+    """
+    import src.application.Domain.HistoricalStore as HistoricalStore
+
+    min_season = None
+    if season:
+        historical_store = HistoricalStore.get_historical_store()
+        if historical_store is not None:
+            if season < historical_store.season:
+                return historical_store
+            min_season = historical_store.season
+
+    key = (os.getpid(), min_season)
+    connection = SQLLite.get_connection()
+    with lock:
+        match_store = match_stores.get(key)
+        if match_store is None or match_store.connection is not connection \
+                or match_store.data_version != get_data_version(connection):
+            if match_store is not None:
+                # another process wrote the DB: the past seasons too, maybe
+                HistoricalStore.check()
+            match_store = MatchStore(connection, min_season)
+            match_stores[key] = match_store
+    return match_store
+
+
+def update_rows(match_ids):
+    """
+    Update the MatchStores of the current process with the matches written by this process (the writes of the same
+    connection do not change the data version): a store is loaded again at the next access only if it cannot be
+    updated in place, or if the DB has been changed by another process in the meantime
+    The historical store is checked against the DB, in case the matches written are of the past seasons
+    :param match_ids:
+    :return:
+    """
+    import src.application.Domain.HistoricalStore as HistoricalStore
+
+    pid = os.getpid()
+    connection = SQLLite.get_connection()
+    with lock:
+        for key, match_store in list(match_stores.items()):
+            if key[0] != pid or match_store.connection is not connection:
+                continue
+            if match_store.data_version != get_data_version(connection) or not match_store.update_rows(match_ids):
+                match_stores.pop(key, None)
+    HistoricalStore.check()
+
+
+def inherit_match_store(parent_pid):
+    """
+    In a forked process, adopt the MatchStores of the parent (their arrays are shared copy-on-write, and the
+    structures built over them stay valid) with the connection of this process; the matches of the past seasons too
+    :param parent_pid:
+    :return:
+    """
+    pid = os.getpid()
+    parent_connection = SQLLite.sqllite_connections.get(parent_pid)
+    if pid != parent_pid and parent_connection is not None and pid not in SQLLite.sqllite_connections:
+        # the connection of this process opens the DB of the parent (not necessarily the default one)
+        SQLLite.sqllite_connections[pid] = SQLLite.SQLiteConnection(parent_connection.database_path)
+    with lock:
+        for (store_pid, min_season), match_store in list(match_stores.items()):
+            if store_pid != parent_pid or pid == parent_pid or (pid, min_season) in match_stores:
+                continue
+            connection = SQLLite.get_connection()
+            match_store.connection = connection
+            match_store.data_version = get_data_version(connection)
+            match_stores[(pid, min_season)] = match_store
+    import src.application.Domain.HistoricalStore as HistoricalStore
+    HistoricalStore.inherit_historical_store(parent_pid)
+
+
+def invalidate():
+    """
+    Discard the MatchStores of the current process: the next access loads them again
+    To be called after writing the Match table (the writes of the same connection do not change the data version);
+    the historical store is checked against the DB on its own (HistoricalStore.check)
+    :return:
+    """
+    pid = os.getpid()
+    with lock:
+        for key in [key for key in match_stores if key[0] == pid]:
+            match_stores.pop(key, None)
@@ -0,0 +1,144 @@
+import logging
+
+import src.util.SQLLite as SQLLite
+import src.util.util as util
+import src.util.IncidentParser as IncidentParser
+
+log = logging.getLogger(__name__)
+
+# Match_Incident is the normalized version of the incident columns of Match (XML strings):
+# one row for each incident, so that the statistics can be computed by SQL aggregates
+incident_types = ("goal", "shoton", "shotoff", "foulcommit", "card", "cross", "corner", "possession")
+create_statement = "CREATE TABLE Match_Incident(id INTEGER PRIMARY KEY AUTOINCREMENT, match_id INTEGER, " \
+                   "type STRING, subtype STRING, team INTEGER, player1 INTEGER, player2 INTEGER, " \
+                   "elapsed INTEGER, elapsed_plus INTEGER, x INTEGER, y INTEGER)"
+# number of matches converted in each step of the migration
+migration_chunk_size = 500
+# maximum number of match ids in a IN condition
+max_in_params = 500
+
+
+def init_table():
+    """
+    Create the Match_Incident table; the first time, convert the incidents of the matches already in the DB
+    :return:
+    """
+    if SQLLite.get_connection().create_table("Match_Incident", create_statement):
+        backfill()
+
+
+def backfill():
+    """
+    One-shot migration: parse the incident columns of all the matches and store them in Match_Incident
+    The matches are read in chunks, to not load all the XML strings in memory
+    :return:
+    """
+    connection = SQLLite.get_connection()
+    select = "SELECT id, " + ", ".join(incident_types) + " FROM Match WHERE id > ? ORDER BY id LIMIT ?;"
+    last_match_id = -1
+    n_incidents = 0
+    with connection.transaction():
+        while True:
+            sqllite_rows = connection.execute_select(select, [last_match_id, migration_chunk_size])
+            if len(sqllite_rows) == 0:
+                break
+            rows = []
+            for sqllite_row in sqllite_rows:
+                match_id = sqllite_row[0]
+                for incident_type, incidents_str in zip(incident_types, sqllite_row[1:]):
+                    rows.extend(get_incident_rows(match_id, incident_type, IncidentParser.parse(incidents_str)))
+            n_incidents += connection.insert_many("Match_Incident", rows)
+            last_match_id = sqllite_rows[-1][0]
+    log.debug("Match_Incident backfilled: " + str(n_incidents) + " incidents")
+
+
+def get_incident_rows(match_id, incident_type, incidents):
+    """
+    Return the Match_Incident rows, given the incidents (IncidentParser.Incident)
+    Missing values are not in the rows, so they are stored as NULL
+    :param match_id:
+    :param incident_type: name of the incident column of Match
+    :param incidents:
+    :return:
+    """
+    rows = []
+    for incident in incidents:
+        row = {"match_id": match_id, "type": incident_type}
+        for attribute in ("subtype", "team", "player1", "player2", "elapsed", "elapsed_plus", "x", "y"):
+            value = incident.__getattribute__(attribute)
+            if not util.is_None(value):
+                row[attribute] = value
+        rows.append(row)
+    return rows
+
+
+def write_match_incidents(match_id, incidents_by_type):
+    """
+    Replace the incidents of the match with the input ones
+    :param match_id:
+    :param incidents_by_type: dictionary incident type --> list of incidents, as crawled
+    :return:
+    """
+    rows = []
+    for incident_type, incidents in incidents_by_type.items():
+        rows.extend(get_incident_rows(match_id, incident_type,
+                                      [IncidentParser.from_dict(incident) for incident in incidents]))
+
+    connection = SQLLite.get_connection()
+    with connection.transaction():
+        connection.execute_update("DELETE FROM Match_Incident WHERE match_id = ?;", [str(match_id)])
+        connection.insert_many("Match_Incident", rows)
+
+
+def count_incidents(incident_type, match_ids, team_api_id=None, player1=None, player2=None, with_player2=False):
+    """
+    Return the number of incidents of the input-type in the matches
+    :param incident_type:
+    :param match_ids:
+    :param team_api_id: consider only the incidents of this team
+    :param player1: consider only the incidents whose first player is this one (EX: the scorer)
+    :param player2: consider only the incidents whose second player is this one (EX: the assist-man)
+    :param with_player2: consider only the incidents with a second player
+    :return:
+    """
+    conditions = ["type = ?"]
+    params = [incident_type]
+    if not util.is_None(team_api_id):
+        conditions.append("team = ?")
+        params.append(str(team_api_id))
+    if not util.is_None(player1):
+        conditions.append("player1 = ?")
+        params.append(str(player1))
+    if not util.is_None(player2):
+        conditions.append("player2 = ?")
+        params.append(str(player2))
+    if with_player2:
+        conditions.append("player2 IS NOT NULL")
+
+    match_ids = list(match_ids)
+    cnt = 0
+    for i in range(0, len(match_ids), max_in_params):
+        chunk = [str(match_id) for match_id in match_ids[i:i + max_in_params]]
+        query = "SELECT COUNT(*) FROM Match_Incident WHERE " + " AND ".join(conditions) \
+                + " AND match_id IN (" + ",".join(["?"] * len(chunk)) + ");"
+        cnt += SQLLite.get_connection().execute_select(query, params + chunk)[0][0]
+    return cnt
+
+
+def count_incidents_by_match(incident_type, match_ids):
+    """
+    Return the number of incidents of the input-type in each match, for each team
+    (count_incidents of many windows of matches, with one query for each chunk of ids)
+    :param incident_type:
+    :param match_ids:
+    :return: dictionary <match_id, team> --> number of incidents
+    """
+    match_ids = list(match_ids)
+    counts = {}
+    for i in range(0, len(match_ids), max_in_params):
+        chunk = [str(match_id) for match_id in match_ids[i:i + max_in_params]]
+        query = "SELECT match_id, team, COUNT(*) FROM Match_Incident WHERE type = ? " \
+                "AND match_id IN (" + ",".join(["?"] * len(chunk)) + ") GROUP BY match_id, team;"
+        for match_id, team, cnt in SQLLite.get_connection().execute_select(query, [incident_type] + chunk):
+            counts[(match_id, team)] = cnt
+    return counts
@@ -0,0 +1,132 @@
+import logging
+
+import src.util.SQLLite as SQLLite
+import src.util.util as util
+
+log = logging.getLogger(__name__)
+
+# Match_Lineup is derived from the 22 player columns of Match (and their coordinates):
+# one row for each player lined up, so that the lookups by player can be answered by an index
+sides = ("home", "away")
+n_players = 11
+create_statement = "CREATE TABLE Match_Lineup(id INTEGER PRIMARY KEY AUTOINCREMENT, match_id INTEGER, " \
+                   "player_api_id INTEGER, side STRING, slot INTEGER, x INTEGER, y INTEGER)"
+
+
+def init_table():
+    """
+    Create the Match_Lineup table; the first time, fill it with the line-ups of the matches already in the DB
+    :return:
+    """
+    if SQLLite.get_connection().create_table("Match_Lineup", create_statement):
+        backfill()
+
+
+def backfill():
+    """
+    One-shot migration: copy the line-ups of all the matches, with a single INSERT ... SELECT
+    :return:
+    """
+    selects = []
+    for side in sides:
+        for slot in range(1, n_players + 1):
+            player_column = side + "_player_" + str(slot)
+            selects.append("SELECT id, " + player_column + ", '" + side + "', " + str(slot) + ", "
+                           + side + "_player_X" + str(slot) + ", " + side + "_player_Y" + str(slot)
+                           + " FROM Match WHERE " + player_column + " IS NOT NULL AND "
+                           + player_column + " <> 'None'")
+
+    SQLLite.get_connection().execute_transaction("INSERT INTO Match_Lineup (match_id, player_api_id, side, slot, x, y) "
+                                                 + " UNION ALL ".join(selects) + ";")
+    log.debug("Match_Lineup backfilled")
+
+
+def get_lineup_rows(match_id, match_attributes):
+    """
+    Return the Match_Lineup rows of the match, given its attributes (dictionary column --> value)
+    :param match_id:
+    :param match_attributes:
+    :return:
+    """
+    rows = []
+    for side in sides:
+        for slot in range(1, n_players + 1):
+            player_api_id = match_attributes.get(side + "_player_" + str(slot))
+            if util.is_None(player_api_id):
+                continue
+            row = {"match_id": match_id, "player_api_id": player_api_id, "side": side, "slot": slot}
+            # missing coordinates are not in the row, so they are stored as NULL
+            for coordinate in ("X", "Y"):
+                value = match_attributes.get(side + "_player_" + coordinate + str(slot))
+                if not util.is_None(value):
+                    row[coordinate.lower()] = value
+            rows.append(row)
+    return rows
+
+
+def write_match_lineup(match_id, match_attributes):
+    """
+    Replace the line-up of the match with the one in the input-attributes
+    :param match_id:
+    :param match_attributes:
+    :return:
+    """
+    connection = SQLLite.get_connection()
+    with connection.transaction():
+        connection.execute_update("DELETE FROM Match_Lineup WHERE match_id = ?;", [str(match_id)])
+        connection.insert_many("Match_Lineup", get_lineup_rows(match_id, match_attributes))
+
+
+def read_match_rows_by_player_api_id(player_api_id, column_filter='*'):
+    """
+    Return the rows of the matches the input-player has been lined up in (dictionary column --> value)
+    :param player_api_id:
+    :param column_filter: columns of Match to read
+    :return:
+    """
+    connection = SQLLite.get_connection()
+    column_names = connection.get_column_names("Match", column_filter)
+    query = "SELECT " + ", ".join("M." + column for column in column_names) + " FROM Match_Lineup L " \
+            "JOIN Match M ON M.id = L.match_id WHERE L.player_api_id = ?;"
+    return connection.fetch_rows(query, [str(player_api_id)], column_names)
+
+
+def read_players_api_id_by_team_api_id(team_api_id, season=None):
+    """
+    Return the set of players lined up by the team, in the season if required
+    :param team_api_id:
+    :param season:
+    :return:
+    """
+    query = "SELECT DISTINCT L.player_api_id FROM Match M JOIN Match_Lineup L ON L.match_id = M.id " \
+            "WHERE L.side = ? AND M.{side}_team_api_id = ?"
+    if season:
+        query += " AND M.season = ?"
+
+    players_api_id = set()
+    for side in sides:
+        params = [side, str(team_api_id)]
+        if season:
+            params.append(season)
+        for row in SQLLite.get_connection().execute_select(query.format(side=side) + ";", params):
+            players_api_id.add(row[0])
+    return players_api_id
+
+
+def read_last_team_api_id_by_player_api_id(player_api_id):
+    """
+    Return the team the player has been lined up for, in the last match played (only stage matches)
+    :param player_api_id:
+    :return: team_api_id, None if the player has never been lined up
+    """
+    query = "SELECT L.side, M.home_team_api_id, M.away_team_api_id " \
+            "FROM Match_Lineup L JOIN Match M ON M.id = L.match_id " \
+            "WHERE L.player_api_id = ? AND typeof(M.stage) = 'integer' " \
+            "ORDER BY M.date DESC LIMIT 1;"
+    rows = SQLLite.get_connection().execute_select(query, [str(player_api_id)])
+    if len(rows) == 0:
+        return None
+    side, home_team_api_id, away_team_api_id = rows[0]
+    if side == "home":
+        return home_team_api_id
+    return away_team_api_id
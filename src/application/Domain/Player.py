@@ -2,14 +2,19 @@ import logging
 import src.util.SQLLite as SQLLite
 import src.util.Cache as Cache
 import src.util.util as util
+import src.util.Entity as Entity
 import src.application.Domain.Match as Match
+import src.application.Domain.Match_Lineup as Match_Lineup
+import src.application.Domain.Match_Incident as Match_Incident
 import src.application.Domain.Player_Attributes as Player_Attributes
-from bs4 import BeautifulSoup
 
 log = logging.getLogger(__name__)
 
 
-class Player(object):
+class Player(Entity.Entity):
+    __slots__ = Entity.get_slots("Player")
+    table = "Player"
+
     def __init__(self, id):
         self.id = id
 
@@ -74,20 +79,12 @@ class Player(object):
         except KeyError:
             pass
 
-        matches = self.get_matches()
         current_team = None
-        if len(matches) > 0:
-            last_match = sorted(matches, key=lambda match: match.date)[-1]
-            home_player_i = 'home_player_'
-            away_player_i = 'away_player_'
-            for i in range(11):
-                if last_match.__getattribute__(home_player_i + str(i + 1)) == self.player_api_id:
-                    current_team = Team.read_by_team_api_id(last_match.home_team_api_id)
-                    break
-                if last_match.__getattribute__(away_player_i + str(i + 1)) == self.player_api_id:
-                    current_team = Team.read_by_team_api_id(last_match.away_team_api_id)
-                    break
-        Cache.add_element(self.id, current_team, "PLAYER_CURRENT_TEAM")
+        if not util.is_None(self.player_api_id):
+            team_api_id = Match_Lineup.read_last_team_api_id_by_player_api_id(self.player_api_id)
+            if team_api_id is not None:
+                current_team = Team.read_by_team_api_id(team_api_id)
+        Cache.add_element(self.id, current_team, "PLAYER_CURRENT_TEAM", tags=[("PLAYER_API_ID", self.player_api_id)])
         return current_team
 
     def get_goal_done(self, season=None, stage=None):
@@ -97,18 +94,8 @@ class Player(object):
         :param stage:
         :return:
         """
-        cnt = 0
-        matches = self.get_matches(season=season, ordered=True)
-        for m in matches:
-            if util.is_None(m.goal):
-                continue
-            if not util.is_None(stage) and m.stage >= stage:
-                return cnt
-            soup = BeautifulSoup(m.goal, "html.parser")
-            for player1 in soup.find_all('player1'):
-                if int(str(player1.string).strip()) == self.player_api_id:
-                    cnt += 1
-        return cnt
+        return Match_Incident.count_incidents("goal", self.get_match_ids_with_goals(season, stage),
+                                              player1=self.player_api_id)
 
     def get_goal_received(self, season=None, stage=None):
         """
@@ -136,17 +123,24 @@ class Player(object):
         :param stage:
         :return:
         """
-        cnt = 0
+        return Match_Incident.count_incidents("goal", self.get_match_ids_with_goals(season, stage),
+                                              player2=self.player_api_id)
+
+    def get_match_ids_with_goals(self, season=None, stage=None):
+        """
+        Return the ids of the matches played by this player, with the goals known, before the stage
+        :param season:
+        :param stage:
+        :return:
+        """
+        match_ids = []
         for m in self.get_matches(season=season, ordered=True):
             if util.is_None(m.goal):
                 continue
             if not util.is_None(stage) and m.stage >= stage:
-                return cnt
-            soup = BeautifulSoup(m.goal, "html.parser")
-            for player1 in soup.find_all('player2'):
-                if int(str(player1.string).strip()) == self.player_api_id:
-                    cnt += 1
-        return cnt
+                break
+            match_ids.append(m.id)
+        return match_ids
 
     def is_gk(self):
         """
@@ -190,13 +184,16 @@ def read_all():
     Read all players
     :return:
     """
-    players = []
-    for p in SQLLite.read_all("Player"):
-        player = Player(p["id"])
-        for attribute, value in p.items():
-            player.__setattr__(attribute, value)
-        players.append(player)
-    return players
+    return list(stream_all())
+
+
+def stream_all(batch_size=None):
+    """
+    Return the generator of all the players, read from the DB batch_size at a time
+    :param batch_size:
+    :return:
+    """
+    return SQLLite.stream_all("Player", row_factory=Entity.get_row_factory(Player), batch_size=batch_size)
 
 
 def read_by_id(id):
@@ -218,13 +215,12 @@ def read_by_id(id):
     except IndexError:
         return None
     player = Player(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        player.__setattr__(attribute, value)
+    player.set_columns(sqllite_row)
 
-    Cache.add_element(player.player_fifa_api_id, player, "PLAYER_BY_FIFA_API_ID")
-    Cache.add_element(player.player_api_id, player, "PLAYER_BY_API_ID")
-    Cache.add_element(player.player_name, player, "PLAYER_BY_NAME")
-    Cache.add_element(player.id, player, "PLAYER_BY_ID")
+    Cache.add_element(player.player_fifa_api_id, player, "PLAYER_BY_FIFA_API_ID", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.player_api_id, player, "PLAYER_BY_API_ID", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.player_name, player, "PLAYER_BY_NAME", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.id, player, "PLAYER_BY_ID", tags=[("PLAYER", player.id)])
     return player
 
 
@@ -247,17 +243,51 @@ def read_by_api_id(player_api_id):
     except IndexError:
         return None
     player = Player(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        player.__setattr__(attribute, value)
+    player.set_columns(sqllite_row)
 
-    Cache.add_element(player.player_fifa_api_id, player, "PLAYER_BY_FIFA_API_ID")
-    Cache.add_element(player.player_api_id, player, "PLAYER_BY_API_ID")
-    Cache.add_element(player.player_name, player, "PLAYER_BY_NAME")
-    Cache.add_element(player.id, player, "PLAYER_BY_ID")
+    Cache.add_element(player.player_fifa_api_id, player, "PLAYER_BY_FIFA_API_ID", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.player_api_id, player, "PLAYER_BY_API_ID", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.player_name, player, "PLAYER_BY_NAME", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.id, player, "PLAYER_BY_ID", tags=[("PLAYER", player.id)])
 
     return player
 
 
+def read_many_by_api_ids(player_api_ids):
+    """
+    Read the players of the api_ids in input: the ones not in the cache are read from the DB with a single query
+    :param player_api_ids:
+    :return: dictionary player_api_id --> Player (the players not in the DB are not in the dictionary)
+    """
+    players = {}
+    player_api_ids_to_read = set()
+    for player_api_id in player_api_ids:
+        if util.is_None(player_api_id):
+            continue
+        try:
+            players[player_api_id] = Cache.get_element(player_api_id, "PLAYER_BY_API_ID")
+        except KeyError:
+            player_api_ids_to_read.add(player_api_id)
+
+    if len(player_api_ids_to_read) == 0:
+        return players
+
+    sqllite_rows = SQLLite.get_connection().select_in("Player", "player_api_id", player_api_ids_to_read)
+    # as read_by_api_id, the first player of each api_id
+    for sqllite_row in sorted(sqllite_rows, key=lambda sqllite_row: sqllite_row["id"]):
+        if sqllite_row["player_api_id"] in players:
+            continue
+        player = Player(sqllite_row["id"])
+        player.set_columns(sqllite_row)
+
+        Cache.add_element(player.player_fifa_api_id, player, "PLAYER_BY_FIFA_API_ID", tags=[("PLAYER", player.id)])
+        Cache.add_element(player.player_api_id, player, "PLAYER_BY_API_ID", tags=[("PLAYER", player.id)])
+        Cache.add_element(player.player_name, player, "PLAYER_BY_NAME", tags=[("PLAYER", player.id)])
+        Cache.add_element(player.id, player, "PLAYER_BY_ID", tags=[("PLAYER", player.id)])
+        players[player.player_api_id] = player
+    return players
+
+
 def read_by_fifa_api_id(player_fifa_api_id):
     """
     Read a player by its team_fifa_api_id
@@ -276,13 +306,12 @@ def read_by_fifa_api_id(player_fifa_api_id):
         return None
 
     player = Player(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        player.__setattr__(attribute, value)
+    player.set_columns(sqllite_row)
 
-    Cache.add_element(player.player_fifa_api_id, player, "PLAYER_BY_FIFA_API_ID")
-    Cache.add_element(player.player_api_id, player, "PLAYER_BY_API_ID")
-    Cache.add_element(player.player_name, player, "PLAYER_BY_NAME")
-    Cache.add_element(player.id, player, "PLAYER_BY_ID")
+    Cache.add_element(player.player_fifa_api_id, player, "PLAYER_BY_FIFA_API_ID", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.player_api_id, player, "PLAYER_BY_API_ID", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.player_name, player, "PLAYER_BY_NAME", tags=[("PLAYER", player.id)])
+    Cache.add_element(player.id, player, "PLAYER_BY_ID", tags=[("PLAYER", player.id)])
 
     return player
 
@@ -304,8 +333,7 @@ def read_by_name(player_name, like=False):
     players = []
     for p in sqlrows:
         player = Player(p["id"])
-        for attribute, value in p.items():
-            player.__setattr__(attribute, value)
+        player.set_columns(p)
         players.append(player)
 
     return players
@@ -328,6 +356,7 @@ def read_by_team_api_id(team_api_id, season=None):
         pass
     players = []
     players_api_id = Match.read_players_api_id_by_team_api_id(team_api_id, season)
+    players_by_api_id = read_many_by_api_ids(players_api_id)
     for player_api_id in players_api_id:
 
         # if the player_api_id is not set --> continue
@@ -335,24 +364,15 @@ def read_by_team_api_id(team_api_id, season=None):
             continue
 
         try:
-            player = Cache.get_element(player_api_id, "PLAYER_BY_API_ID")
+            player = players_by_api_id[player_api_id]
         except KeyError:
-            filter = {"player_api_id": player_api_id}
-
-            try:
-                sqllite_row = SQLLite.get_connection().select("Player", **filter)[0]
-            except IndexError:
-                log.warning("Player api id not found in DB ["+str(player_api_id)+"]")
-                continue
-            player = Player(sqllite_row["id"])
-            for attribute, value in sqllite_row.items():
-                player.__setattr__(attribute, value)
-            Cache.add_element(player_api_id, player, "PLAYER_BY_API_ID")
+            log.warning("Player api id not found in DB ["+str(player_api_id)+"]")
+            continue
 
         players.append(player)
 
-    Cache.add_element(str(team_api_id)+"_"+season, players, "PLAYER_BY_TEAM_API_ID")
-    return players
+    tags = [("TEAM_API_ID", team_api_id)] + [("PLAYER", player.id) for player in players]
+    return Cache.add_element(str(team_api_id)+"_"+season, players, "PLAYER_BY_TEAM_API_ID", tags=tags)
 
 
 def write_new_player(player_name, player_fifa_api_id, birthday, height, weight, player_api_id=None):
@@ -393,9 +413,6 @@ def update(player):
     """
     SQLLite.get_connection().update("Player", player)
 
-    Cache.del_element(player.player_fifa_api_id, "PLAYER_BY_FIFA_API_ID")
-    Cache.del_element(player.player_api_id, "PLAYER_BY_API_ID")
-    Cache.del_element(player.player_name, "PLAYER_BY_NAME")
-    Cache.del_element(player.id, "PLAYER_BY_ID")
+    Cache.invalidate(("PLAYER", player.id))
 
     return read_by_id(player.id)
@@ -1,5 +1,6 @@
 import logging
 import src.util.SQLLite as SQLLite
+import src.util.Entity as Entity
 import src.util.util as util
 import src.util.Cache as Cache
 
@@ -23,13 +24,17 @@ def read_all():
     Read all the player attributes
     :return:
     """
-    player_attibutes_list = []
-    for p in SQLLite.read_all("Player_Attributes"):
-        player_attributes = PlayerAttributes(p["id"])
-        for attribute, value in p.items():
-            player_attributes.__setattr__(attribute, value)
-        player_attibutes_list.append(player_attributes)
-    return player_attibutes_list
+    return list(stream_all())
+
+
+def stream_all(batch_size=None):
+    """
+    Return the generator of all the player attributes, read from the DB batch_size at a time
+    :param batch_size:
+    :return:
+    """
+    return SQLLite.stream_all("Player_Attributes", row_factory=Entity.get_row_factory(PlayerAttributes),
+                              batch_size=batch_size)
 
 
 def read_by_player_fifa_api_id(player_fifa_api_id):
@@ -51,8 +56,7 @@ def read_by_player_fifa_api_id(player_fifa_api_id):
             player_attributes.__setattr__(attribute, value)
         player_attributes_list.append(player_attributes)
 
-    Cache.add_element(player_fifa_api_id, player_attributes_list, "PLAYER_ATTRIBUTES")
-    return player_attributes_list
+    return Cache.add_element(player_fifa_api_id, player_attributes_list, "PLAYER_ATTRIBUTES")
 
 
 def write_player_attributes(player, player_attributes, date=util.get_today_date()+" 00:00:00"):
@@ -69,5 +73,14 @@ def write_player_attributes(player, player_attributes, date=util.get_today_date(
     player_attributes["player_api_id"] = player.player_api_id
     player_attributes["date"] = date
 
-    SQLLite.get_connection().insert("Player_Attributes", player_attributes)
-    Cache.del_element(player.player_fifa_api_id, "PLAYER_ATTRIBUTES")
+    def invalidate():
+        Cache.del_element(player.player_fifa_api_id, "PLAYER_ATTRIBUTES")
+
+    # attributes crawled twice in a day replace the ones of the day
+    key_columns = ("player_fifa_api_id", "date")
+    write_buffer = SQLLite.get_write_buffer()
+    if write_buffer is not None:
+        write_buffer.upsert("Player_Attributes", player_attributes, key_columns, callback=invalidate)
+    else:
+        SQLLite.get_connection().upsert_many("Player_Attributes", [player_attributes], key_columns)
+        invalidate()
@@ -0,0 +1,381 @@
+import logging
+import operator
+
+import numpy as np
+
+import src.util.util as util
+import src.util.Cache as Cache
+import src.application.Domain.MatchStore as MatchStore
+import src.application.Domain.TrainingWindow as TrainingWindow
+
+log = logging.getLogger(__name__)
+
+# Standings of the leagues: for each <league, season>, the finished matches ordered by stage (as
+# League.get_matches) with the prefix sums of the points and of the games played by each team, for the total,
+# home and away tables
+# The table before a stage is a row of the prefix sums; the table of a training window is the sum of the rows of
+# its seasons. The rankings of the training windows are memoized with the position of each team
+#
+# tables: total (home=None), home (home=True), away (home=False)
+venues = (None, True, False)
+# columns of the matches that change the standings
+checked_columns = ("stage", "home_team_api_id", "away_team_api_id", "home_team_goal", "away_team_goal")
+
+
+class SeasonStandings(object):
+    """
+    Prefix sums of points and games of the teams of a league in a season
+    cum_points[venue][i][team]: points of the team in the first i matches (cum_games: games played)
+    Built in one pass, then extended with the new results as they arrive (add_matches)
+    """
+    def __init__(self, league_id, season):
+        self.league_id = league_id
+        self.season = season
+        # MatchStore.get_league_version of the league in the season
+        self.version = None
+        self.n = 0
+        self.match_ids = np.zeros(0, dtype=np.int64)
+        self.stages = np.zeros(0, dtype=np.int64)
+        # KEY: column of Match, VALUE: values of the matches (to check the results still in the store)
+        self.values = {column: np.zeros(0, dtype=np.int64) for column in checked_columns}
+        # position of the teams of the matches (-1 if the team is not in the DB) and result (0: draw, 1: home, 2: away)
+        self.home = np.zeros(0, dtype=np.int64)
+        self.away = np.zeros(0, dtype=np.int64)
+        self.results = np.zeros(0, dtype=np.int64)
+        # Team.id of each team position
+        self.team_ids = []
+        # KEY: team_api_id, VALUE: team position (-1 if not in the DB)
+        self.team_positions = {}
+        self.cum_points = np.zeros((len(venues), 1, 0), dtype=np.int64)
+        self.cum_games = np.zeros((len(venues), 1, 0), dtype=np.int64)
+        # KEY: match id, VALUE: position of the match
+        self.positions = {}
+
+    def get_team_position(self, team_api_id):
+        import src.application.Domain.Team as Team
+        try:
+            return self.team_positions[team_api_id]
+        except KeyError:
+            pass
+        team = Team.read_by_team_api_id(team_api_id)
+        if util.is_None(team):
+            position = -1
+        else:
+            position = len(self.team_ids)
+            self.team_ids.append(team.id)
+        self.team_positions[team_api_id] = position
+        return position
+
+    def is_prefix(self, match_store, rows):
+        """
+        TRUE if the matches of the standings are the first ones of the input rows, with the same results
+        :param match_store:
+        :param rows:
+        :return:
+        """
+        if len(rows) < self.n:
+            return False
+        rows = rows[:self.n]
+        if not np.array_equal(match_store.ids[rows], self.match_ids):
+            return False
+        for column, values in self.values.items():
+            if not np.array_equal(match_store.get(column, rows), values):
+                return False
+        return True
+
+    def add_matches(self, match_store, rows):
+        """
+        Append the finished matches (rows of the store, ordered by stage) and extend the prefix sums
+        :param match_store:
+        :param rows:
+        :return:
+        """
+        import src.application.Domain.Team as Team
+
+        if len(rows) == 0:
+            return
+        for i, match_id in enumerate(match_store.ids[rows]):
+            self.positions[int(match_id)] = self.n + i
+        self.match_ids = np.concatenate((self.match_ids, match_store.ids[rows]))
+        self.stages = np.concatenate((self.stages, match_store.get("stage", rows)))
+        for column in checked_columns:
+            self.values[column] = np.concatenate((self.values[column], match_store.get(column, rows)))
+
+        Team.read_many_by_api_ids(set(match_store.get("home_team_api_id", rows).tolist())
+                                  | set(match_store.get("away_team_api_id", rows).tolist()))
+        home = np.array([self.get_team_position(int(team_api_id))
+                         for team_api_id in match_store.get("home_team_api_id", rows)], dtype=np.int64)
+        away = np.array([self.get_team_position(int(team_api_id))
+                         for team_api_id in match_store.get("away_team_api_id", rows)], dtype=np.int64)
+        home_team_goal = match_store.get("home_team_goal", rows)
+        away_team_goal = match_store.get("away_team_goal", rows)
+        results = np.where(home_team_goal > away_team_goal, 1, np.where(home_team_goal < away_team_goal, 2, 0))
+
+        # a match with a team not in the DB is not counted (as in the rankings built from the matches)
+        n_teams = len(self.team_ids)
+        points = np.zeros((len(venues), len(rows), n_teams), dtype=np.int64)
+        games = np.zeros((len(venues), len(rows), n_teams), dtype=np.int64)
+        valid = np.flatnonzero((home >= 0) & (away >= 0))
+        home_valid = home[valid]
+        away_valid = away[valid]
+        home_points = np.array([1, 3, 0])[results[valid]]
+        away_points = np.array([1, 0, 3])[results[valid]]
+        # total
+        points[0, valid, home_valid] += home_points
+        points[0, valid, away_valid] += away_points
+        games[0, valid, home_valid] += 1
+        games[0, valid, away_valid] += 1
+        # home
+        points[1, valid, home_valid] = home_points
+        games[1, valid, home_valid] = 1
+        # away
+        points[2, valid, away_valid] = away_points
+        games[2, valid, away_valid] = 1
+
+        self.cum_points = extend_prefix_sums(self.cum_points, points)
+        self.cum_games = extend_prefix_sums(self.cum_games, games)
+        self.home = np.concatenate((self.home, home))
+        self.away = np.concatenate((self.away, away))
+        self.results = np.concatenate((self.results, results))
+        self.n += len(rows)
+
+    def get_stage_position(self, stage):
+        """
+        Return the number of matches played before the stage
+        :param stage:
+        :return:
+        """
+        return int(np.searchsorted(self.stages, stage, side="left"))
+
+    def get_table(self, start, end, home=None):
+        """
+        Return <points, games> of each team position, in the matches [start, end)
+        :param start:
+        :param end:
+        :param home:
+        :return:
+        """
+        venue = venues.index(home)
+        return self.cum_points[venue, end] - self.cum_points[venue, start], \
+            self.cum_games[venue, end] - self.cum_games[venue, start]
+
+    def get_scorers(self, position, home=None):
+        """
+        Return the team positions getting points in the match, in the order they enter a ranking
+        :param position:
+        :param home:
+        :return:
+        """
+        home_team, away_team, result = self.home[position], self.away[position], self.results[position]
+        if home_team < 0 or away_team < 0:
+            return []
+        if util.is_None(home):
+            return [[home_team, away_team], [home_team], [away_team]][result]
+        elif home:
+            return [[home_team], [home_team], []][result]
+        return [[away_team], [], [away_team]][result]
+
+
+def extend_prefix_sums(cum, values):
+    """
+    Append the prefix sums of the values (venue, match, team) to cum, widening it to the new teams
+    :param cum:
+    :param values:
+    :return:
+    """
+    n_teams = values.shape[2]
+    if cum.shape[2] < n_teams:
+        cum = np.concatenate((cum, np.zeros((cum.shape[0], cum.shape[1], n_teams - cum.shape[2]),
+                                            dtype=cum.dtype)), axis=2)
+    return np.concatenate((cum, cum[:, -1:, :] + np.cumsum(values, axis=1)), axis=1)
+
+
+class Ranking(object):
+    """
+    Ranking of a training window: list of <points, Team.id> ordered by descending points, and position of the teams
+    """
+    def __init__(self, version, ranking):
+        # MatchStore.get_league_version of the league in the seasons of the window
+        self.version = version
+        self.ranking = ranking
+        self.positions = {team_id: i + 1 for i, (points, team_id) in enumerate(ranking)}
+
+    def get_position(self, team_id):
+        """
+        Return the position of the team (1 is the first), after the last one if the team is not in the ranking
+        :param team_id:
+        :return:
+        """
+        return self.positions.get(team_id, len(self.ranking) + 1)
+
+
+def get_season_standings(league, season):
+    """
+    Return the SeasonStandings of the league in the season: when the DB has been changed, the standings are extended
+    with the new results, or built again if the results already counted have changed
+    :param league:
+    :param season:
+    :return:
+    """
+    key = str(league.id) + "_" + str(season)
+    version = MatchStore.get_league_version(league.id, (season,))
+    try:
+        standings = Cache.get_element(key, "LEAGUE_STANDINGS")
+        if standings.version == version:
+            return standings
+    except KeyError:
+        standings = None
+
+    match_store = MatchStore.get_match_store(season)
+    match_ids = [match_id for match_id, stage, match_season in TrainingWindow.get_finished_matches(league, season)]
+    rows = match_store.get_rows(match_ids)
+    rows = rows[rows >= 0]
+    if util.is_None(standings) or not standings.is_prefix(match_store, rows):
+        standings = SeasonStandings(league.id, season)
+        standings.add_matches(match_store, rows)
+    else:
+        # new results: only them are added
+        standings.add_matches(match_store, rows[standings.n:])
+    standings.version = version
+
+    # not tagged: the standings are checked against the version of the matches, so that they can be extended
+    return Cache.add_element(key, standings, "LEAGUE_STANDINGS")
+
+
+def get_ranking(league, season, stage=None):
+    """
+    Return the ranking of the league in the season, before the stage (all the finished matches if stage is None),
+    as a list of <points, Team.id> ordered by descending points
+    :param league:
+    :param season:
+    :param stage:
+    :return:
+    """
+    standings = get_season_standings(league, season)
+    if util.is_None(stage):
+        end = standings.n
+    else:
+        end = standings.get_stage_position(stage)
+    points, games = standings.get_table(0, end)
+
+    ranking = {team.id: 0 for team in league.get_teams(season=season)}
+    for position, team_id in enumerate(standings.team_ids):
+        if team_id in ranking:
+            ranking[team_id] = int(points[position])
+    return [(p, team_id) for team_id, p in sorted(ranking.items(), key=operator.itemgetter(1))[::-1]]
+
+
+def get_training_ranking(league, season, stage_to_predict, stages_to_train, home=None):
+    """
+    Return the Ranking of the training matches of the league (League.get_training_matches), by points per game
+    :param league:
+    :param season:
+    :param stage_to_predict:
+    :param stages_to_train:
+    :param home: total (None), home (True) or away (False) table
+    :return:
+    """
+    key = str(league.id) + "_" + str(season) + "_" + str(stage_to_predict) + "_" + str(stages_to_train) + "_" \
+        + str(home)
+    version = MatchStore.get_league_version(league.id, TrainingWindow.get_seasons_until(league, season))
+    try:
+        ranking = Cache.get_element(key, "LEAGUE_TRAINING_RANKING")
+        if ranking.version == version:
+            return ranking
+    except KeyError:
+        pass
+
+    match_ids = TrainingWindow.get_league_window(league, season, stage_to_predict, stages_to_train)
+
+    # the teams of the season, then the other teams of the window getting points
+    points = {team.id: 0 for team in league.get_teams(season=season)}
+    games = {}
+    other_teams = []
+    for standings, positions in get_segments(league, season, match_ids):
+        if positions == list(range(positions[0], positions[-1] + 1)):
+            segment_points, segment_games = standings.get_table(positions[0], positions[-1] + 1, home)
+        else:
+            positions_array = np.asarray(positions, dtype=np.int64)
+            segment_points = sum_rows(standings.cum_points[venues.index(home)], positions_array)
+            segment_games = sum_rows(standings.cum_games[venues.index(home)], positions_array)
+        for team_position, team_id in enumerate(standings.team_ids):
+            if segment_games[team_position] == 0:
+                continue
+            util.increase_dict_entry(team_id, games, int(segment_games[team_position]))
+            if segment_points[team_position] > 0:
+                if team_id not in points:
+                    other_teams.append(team_id)
+                util.increase_dict_entry(team_id, points, int(segment_points[team_position]))
+
+    if len(other_teams) > 0:
+        # they enter the ranking in the order of their first points in the window
+        first_points = get_first_points(league, season, match_ids, set(other_teams), home)
+        for team_id in sorted(other_teams, key=lambda team_id: first_points[team_id]):
+            points[team_id] = points.pop(team_id)
+
+    # divide the overall point by the number of matches done
+    norm_ranking = dict()
+    for team_id, team_points in points.items():
+        if games.get(team_id, 0) > 0:
+            norm_ranking[team_id] = team_points / games[team_id]
+        else:
+            norm_ranking[team_id] = 0
+
+    ranking = [(p, team_id) for team_id, p in sorted(norm_ranking.items(), key=operator.itemgetter(1))[::-1]]
+    return Cache.add_element(key, Ranking(version, ranking), "LEAGUE_TRAINING_RANKING")
+
+
+def get_segments(league, season, match_ids):
+    """
+    Return the matches of the window grouped by season, as <SeasonStandings, positions of the matches>
+    :param league:
+    :param season: season of the window
+    :param match_ids:
+    :return:
+    """
+    segments = []
+    for match_store, input_positions, rows in MatchStore.locate(match_ids, season):
+        season_column = match_store.get_column("season")
+        for code in np.unique(season_column.values[rows]):
+            standings = get_season_standings(league, season_column.categories[code])
+            positions = sorted(standings.positions[int(match_id)]
+                               for match_id in match_store.ids[rows[season_column.values[rows] == code]]
+                               if int(match_id) in standings.positions)
+            if len(positions) > 0:
+                segments.append((standings, positions))
+    return segments
+
+
+def sum_rows(cum, positions):
+    # sum of the increments of the matches in the positions
+    return np.sum(cum[positions + 1] - cum[positions], axis=0)
+
+
+def get_first_points(league, season, match_ids, team_ids, home):
+    """
+    Return <index in the window, index in the match> of the first points of each team
+    :param league:
+    :param season: season of the window
+    :param match_ids:
+    :param team_ids:
+    :param home:
+    :return:
+    """
+    first_points = {}
+    located = [None] * len(match_ids)
+    for match_store, input_positions, rows in MatchStore.locate(match_ids, season):
+        for i, row in zip(input_positions.tolist(), rows.tolist()):
+            located[i] = (match_store, row)
+    for i, store_row in enumerate(located):
+        if store_row is None:
+            continue
+        match_store, row = store_row
+        standings = get_season_standings(league, match_store.get_column("season").get_value(row))
+        position = standings.positions.get(int(match_store.ids[row]))
+        if position is None:
+            continue
+        for j, team_position in enumerate(standings.get_scorers(position, home)):
+            team_id = standings.team_ids[team_position]
+            if team_id in team_ids and team_id not in first_points:
+                first_points[team_id] = (i, j)
+    return first_points
@@ -1,14 +1,20 @@
-import logging
+import numpy as np
 import src.util.SQLLite as SQLLite
 import src.util.util as util
+import src.util.Entity as Entity
 import src.util.Cache as Cache
-import src.application.Domain.Match as Match
+import src.application.Domain.MatchStore as MatchStore
+import src.application.Domain.Match_Incident as Match_Incident
+import src.application.Domain.TeamFormIndex as TeamFormIndex
+import src.application.Domain.TrainingWindow as TrainingWindow
 import src.application.Domain.Team_Attributes as Team_Attributes
-from bs4 import BeautifulSoup
 from src.application.Exception.MLException import MLException
 
 
-class Team(object):
+class Team(Entity.Entity):
+    __slots__ = Entity.get_slots("Team")
+    table = "Team"
+
     def __init__(self, id):
         self.id = id
 
@@ -32,11 +38,18 @@ class Team(object):
         :return:
         """
         try:
-            matches = self.get_training_matches(season, stage, n, home=home)
+            window = TeamFormIndex.get_training_window(self.team_api_id, season, stage, n, home=home)
+            if util.is_None(window):
+                matches = self.get_training_matches(season, stage, n, home=home)
         except MLException:
             return ""
 
         trend = ""
+        if not util.is_None(window):
+            for result in TeamFormIndex.get_results(window)[-n:]:
+                trend = TeamFormIndex.trend_labels[result] + " " + trend
+            return trend
+
         for match in matches[-n:]:
 
             result, winner = match.get_winner()
@@ -51,34 +64,44 @@ class Team(object):
 
         return trend
 
-    def get_matches(self, season=None, ordered=False, finished=False, home=None):
+    def get_matches(self, season=None, ordered=False, finished=False, home=None, stage=None):
         """
         Return matches of this team
         :param season:
         :param ordered:
         :param finished:
         :param home:
+        :param stage:
         :return:
         """
+        match_store = MatchStore.get_match_store(season)
+        filter = {}
+        if season:
+            filter["season"] = season
+        if stage:
+            filter["stage"] = stage
+        mask = match_store.mask(**filter)
+
         if util.is_None(home):
             # match when team plays both home and away
-            matches = Match.read_matches_by_team(self.team_api_id, season)
+            rows = np.concatenate((match_store.select(mask & match_store.mask(home_team_api_id=self.team_api_id)),
+                                   match_store.select(mask & match_store.mask(away_team_api_id=self.team_api_id))))
         elif home:
             # match when team plays home
-            matches = Match.read_matches_by_home_team(self.team_api_id, season)
+            rows = match_store.select(mask & match_store.mask(home_team_api_id=self.team_api_id))
         else:
             # match when team plays away
-            matches = Match.read_matches_by_away_team(self.team_api_id, season)
+            rows = match_store.select(mask & match_store.mask(away_team_api_id=self.team_api_id))
 
         if ordered:
             # order the match by date
-            matches = sorted(matches, key=lambda match: match.date)
+            rows = rows[np.argsort(match_store.get("date", rows), kind="stable")]
 
         if finished:
             # consider only finished matxh
-            matches = [m for m in matches if m.is_finished()]
+            rows = rows[match_store.finished_mask(rows)]
 
-        return matches
+        return match_store.views_of(rows)
 
     def get_last_team_attributes(self):
         """
@@ -113,6 +136,10 @@ class Team(object):
         :param home:
         :return:
         """
+        window = TeamFormIndex.get_training_window(self.team_api_id, season, stage_to_predict, stages_to_train, home)
+        if not util.is_None(window):
+            return TeamFormIndex.get_points(window)
+
         matches = self.get_training_matches(season, stage_to_predict, stages_to_train, home=home)
         points = 0
         for match in matches:
@@ -135,6 +162,10 @@ class Team(object):
         :param home:
         :return:
         """
+        window = TeamFormIndex.get_training_window(self.team_api_id, season, stage_to_predict, stages_to_train, home)
+        if not util.is_None(window):
+            return TeamFormIndex.get_goals(window)
+
         matches = self.get_training_matches(season, stage_to_predict, stages_to_train, home=home)
         goal_done = 0
         goal_received = 0
@@ -213,18 +244,13 @@ class Team(object):
         :param stage:
         :return:
         """
-        cnt = 0
+        match_ids = []
         for match in self.get_matches(season=season, ordered=True):
             if not util.is_None(stage) and match.stage >= stage:
-                return cnt
+                break
             if not util.is_None(match.goal):
-                soup = BeautifulSoup(match.goal, "html.parser")
-                for value in soup.find_all('value'):
-                    team = value.find('team')
-                    if team and int(str(team.string).strip()) == self.team_api_id:
-                        if not util.is_None(value.find('player2')):
-                            cnt += 1
-        return cnt
+                match_ids.append(match.id)
+        return Match_Incident.count_incidents("goal", match_ids, team_api_id=self.team_api_id, with_player2=True)
 
     def get_shots_by_train_matches(self, season, stage_to_predict, stages_to_train, on=True, home=None):
         """
@@ -239,15 +265,7 @@ class Team(object):
         :return:
         """
         matches = self.get_training_matches(season, stage_to_predict, stages_to_train, home=home)
-        n_shot = 0
-        for match in matches:
-            for shot in match.get_shots(on):
-                try:
-                    if shot.team == self.team_api_id:
-                        n_shot += 1
-                except AttributeError:
-                    logging.debug("Shot of the Match with api_id [ "+str(match.match_api_id)+" ] has no attribute team")
-        return n_shot
+        return count_shots(self.team_api_id, matches, on)
 
     def get_shots(self, season, stage, n=None, on=True):
         """
@@ -260,22 +278,14 @@ class Team(object):
         :param on:
         :return:
         """
-        matches = self.get_matches(season=season, ordered=True)
-        shot_on_off = 0
-        for match in matches:
+        matches = []
+        for match in self.get_matches(season=season, ordered=True):
             if match.stage >= stage:
-                return shot_on_off
+                break
             if n and match.stage < stage-n:
                 continue
-
-            for shot in match.get_shots(on):
-                try:
-                    if shot.team == self.team_api_id:
-                        shot_on_off += 1
-                except AttributeError:
-                    logging.debug("Shot of the Match with api_id [ "+str(match.match_api_id)+" ] has no attribute team")
-
-        return shot_on_off
+            matches.append(match)
+        return count_shots(self.team_api_id, matches, on)
 
     def get_players(self, season=None):
         """
@@ -305,6 +315,13 @@ class Team(object):
         :param home: consider in the train matches home/away/both
         :return:
         """
+        if not consider_last:
+            # the window resolved by the form index, without recursion
+            window = TeamFormIndex.get_training_window(self.team_api_id, season, stage_to_predict, stages_to_train,
+                                                       home=home)
+            if not util.is_None(window):
+                return TrainingWindow.get_matches(TeamFormIndex.get_match_ids(window), season)
+
         if util.is_None(stages_to_train):
             # stages to train not defined --> return only stage of this season
             training_matches = [m for m in self.get_matches(season=season, ordered=True, home=home, finished=True)
@@ -362,8 +379,7 @@ def read_all():
     team_list = []
     for p in SQLLite.read_all("Team"):
         team = Team(p["id"])
-        for attribute, value in p.items():
-            team.__setattr__(attribute, value)
+        team.set_columns(p)
         team_list.append(team)
     return team_list
 
@@ -384,21 +400,19 @@ def read_teams_by_league(league, season=None):
         pass
 
     teams_api_id = []
-    query = "SELECT distinct(home_team_api_id) FROM Match WHERE league_id='" + str(league.id) + "'"
+    query = "SELECT distinct(home_team_api_id) FROM Match WHERE league_id = ?"
+    params = [str(league.id)]
     if season != "":
-        query += " AND season='" + season + "'"
-    for sqllite_row in SQLLite.get_connection().execute_select(query):
+        query += " AND season = ?"
+        params.append(season)
+    for sqllite_row in SQLLite.get_connection().execute_select(query, params):
         teams_api_id.append(sqllite_row[0])
 
-    teams = []
-    for team_api_id in teams_api_id:
-        if not util.is_None(team_api_id):
-            team = read_by_team_api_id(team_api_id=team_api_id)
-            if not util.is_None(team):
-                teams.append(team)
+    teams_by_api_id = read_many_by_api_ids(teams_api_id)
+    teams = [teams_by_api_id[team_api_id] for team_api_id in teams_api_id if team_api_id in teams_by_api_id]
 
-    Cache.add_element(str(league.id) + "_" + season, teams, "TEAMS_BY_LEAGUE")
-    return teams
+    tags = [("LEAGUE", league.id)] + [("TEAM", team.id) for team in teams]
+    return Cache.add_element(str(league.id) + "_" + season, teams, "TEAMS_BY_LEAGUE", tags=tags)
 
 
 def read_by_team_api_id(team_api_id):
@@ -417,17 +431,64 @@ def read_by_team_api_id(team_api_id):
     except IndexError:
         return None
     team = Team(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        team.__setattr__(attribute, value)
+    team.set_columns(sqllite_row)
 
-    Cache.add_element(team.id, team, "TEAM_BY_ID")
-    Cache.add_element(team.team_api_id, team, "TEAM_BY_API_ID")
-    Cache.add_element(team.team_long_name, team, "TEAM_BY_LONG_NAME")
-    Cache.add_element(team.team_fifa_api_id, team, "TEAM_BY_FIFA_API_ID")
+    Cache.add_element(team.id, team, "TEAM_BY_ID", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_api_id, team, "TEAM_BY_API_ID", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_long_name, team, "TEAM_BY_LONG_NAME", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_fifa_api_id, team, "TEAM_BY_FIFA_API_ID", tags=[("TEAM", team.id)])
 
     return team
 
 
+def read_many_by_api_ids(team_api_ids):
+    """
+    Read the teams of the team_api_ids in input: the ones not in the cache are read from the DB with a single query
+    :param team_api_ids:
+    :return: dictionary team_api_id --> Team (the teams not in the DB are not in the dictionary)
+    """
+    teams = {}
+    team_api_ids_to_read = set()
+    for team_api_id in team_api_ids:
+        if util.is_None(team_api_id):
+            continue
+        try:
+            teams[team_api_id] = Cache.get_element(team_api_id, "TEAM_BY_API_ID")
+        except KeyError:
+            team_api_ids_to_read.add(team_api_id)
+
+    if len(team_api_ids_to_read) == 0:
+        return teams
+
+    sqllite_rows = SQLLite.get_connection().select_in("Team", "team_api_id", team_api_ids_to_read)
+    # as read_by_team_api_id, the first team of each team_api_id
+    for sqllite_row in sorted(sqllite_rows, key=lambda sqllite_row: sqllite_row["id"]):
+        if sqllite_row["team_api_id"] in teams:
+            continue
+        team = Team(sqllite_row["id"])
+        team.set_columns(sqllite_row)
+
+        Cache.add_element(team.id, team, "TEAM_BY_ID", tags=[("TEAM", team.id)])
+        Cache.add_element(team.team_api_id, team, "TEAM_BY_API_ID", tags=[("TEAM", team.id)])
+        Cache.add_element(team.team_long_name, team, "TEAM_BY_LONG_NAME", tags=[("TEAM", team.id)])
+        Cache.add_element(team.team_fifa_api_id, team, "TEAM_BY_FIFA_API_ID", tags=[("TEAM", team.id)])
+        teams[team.team_api_id] = team
+    return teams
+
+
+def read_teams_of_matches(matches):
+    """
+    Read the home and away teams of the matches in input, with a single query for the ones not in the cache
+    :param matches:
+    :return: dictionary team_api_id --> Team
+    """
+    team_api_ids = set()
+    for match in matches:
+        team_api_ids.add(match.home_team_api_id)
+        team_api_ids.add(match.away_team_api_id)
+    return read_many_by_api_ids(team_api_ids)
+
+
 def read_by_team_fifa_api_id(team_fifa_api_id):
     """
     Read from the DB the team by its team_fifa_api_id
@@ -444,13 +505,12 @@ def read_by_team_fifa_api_id(team_fifa_api_id):
     except IndexError:
         return None
     team = Team(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        team.__setattr__(attribute, value)
+    team.set_columns(sqllite_row)
 
-    Cache.add_element(team.id, team, "TEAM_BY_ID")
-    Cache.add_element(team.team_api_id, team, "TEAM_BY_API_ID")
-    Cache.add_element(team.team_long_name, team, "TEAM_BY_LONG_NAME")
-    Cache.add_element(team.team_fifa_api_id, team, "TEAM_BY_FIFA_API_ID")
+    Cache.add_element(team.id, team, "TEAM_BY_ID", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_api_id, team, "TEAM_BY_API_ID", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_long_name, team, "TEAM_BY_LONG_NAME", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_fifa_api_id, team, "TEAM_BY_FIFA_API_ID", tags=[("TEAM", team.id)])
 
     return team
 
@@ -471,13 +531,12 @@ def read_by_id(id):
     except IndexError:
         return None
     team = Team(sqllite_row["id"])
-    for attribute, value in sqllite_row.items():
-        team.__setattr__(attribute, value)
+    team.set_columns(sqllite_row)
 
-    Cache.add_element(team.id, team, "TEAM_BY_ID")
-    Cache.add_element(team.team_api_id, team, "TEAM_BY_API_ID")
-    Cache.add_element(team.team_long_name, team, "TEAM_BY_LONG_NAME")
-    Cache.add_element(team.team_fifa_api_id, team, "TEAM_BY_FIFA_API_ID")
+    Cache.add_element(team.id, team, "TEAM_BY_ID", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_api_id, team, "TEAM_BY_API_ID", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_long_name, team, "TEAM_BY_LONG_NAME", tags=[("TEAM", team.id)])
+    Cache.add_element(team.team_fifa_api_id, team, "TEAM_BY_FIFA_API_ID", tags=[("TEAM", team.id)])
 
     return team
 
@@ -497,22 +556,18 @@ def read_by_name(team_long_name, like=False):
     teams = []
     for p in sqllite_rows:
         team = Team(p["id"])
-        for attribute, value in p.items():
-            team.__setattr__(attribute, value)
+        team.set_columns(p)
         teams.append(team)
     return teams
 
 
 def delete(team):
     """
-    Remove the team from the cache, and delete it from the DB
+    Remove the team (and the elements depending on it) from the cache, and delete it from the DB
     :param team:
     :return:
     """
-    Cache.del_element(team.id, "TEAM_BY_ID")
-    Cache.del_element(team.team_api_id, "TEAM_BY_API_ID")
-    Cache.del_element(team.team_long_name, "TEAM_BY_LONG_NAME")
-    Cache.del_element(team.team_fifa_api_id, "TEAM_BY_FIFA_API_ID")
+    Cache.invalidate(("TEAM", team.id))
 
     SQLLite.get_connection().delete("Team", team)
 
@@ -553,10 +608,7 @@ def update(team):
     """
     SQLLite.get_connection().update("Team", team)
 
-    Cache.del_element(team.id, "TEAM_BY_ID")
-    Cache.del_element(team.team_api_id, "TEAM_BY_API_ID")
-    Cache.del_element(team.team_long_name, "TEAM_BY_LONG_NAME")
-    Cache.del_element(team.team_fifa_api_id, "TEAM_BY_FIFA_API_ID")
+    Cache.invalidate(("TEAM", team.id))
 
     return read_by_id(team.id)
 
@@ -606,3 +658,22 @@ def merge(team1, team2):
     team = write_new_team(team_long_name, team_fifa_api_id, team_api_id, team_short_name)
     print("Updating team, ", team)
     return team
+
+
+def count_shots(team_api_id, matches, on=True):
+    """
+    Return the number of shots (either on or off) done by the team in the matches
+    Raise MLException(2) if the shots of a match are not known
+    :param team_api_id:
+    :param matches:
+    :param on:
+    :return:
+    """
+    if on:
+        incident_type = "shoton"
+    else:
+        incident_type = "shotoff"
+    for match in matches:
+        if util.is_None(match.__getattribute__(incident_type)):
+            raise MLException(2)
+    return Match_Incident.count_incidents(incident_type, [match.id for match in matches], team_api_id=team_api_id)
@@ -0,0 +1,306 @@
+import logging
+
+import numpy as np
+
+import src.util.util as util
+import src.util.Cache as Cache
+import src.application.Domain.MatchStore as MatchStore
+from src.application.Exception.MLException import MLException
+
+log = logging.getLogger(__name__)
+
+# Form of the teams: for each <team, season, venue>, the finished matches in the order of Team.get_matches
+# (ordered by date) with the prefix sums of points, goals done and goals received
+# A training window (the matches of Team.get_training_matches) is a list of segments of these sequences, so the
+# aggregates of a window are differences of prefix sums, without reading and sorting the matches again
+#
+# the first season with matches in the DB: Team.get_training_matches raises MLException(1) before it
+first_season = "2006/2007"
+# results as the labels of Team.get_trend
+trend_labels = ("V", "X", "P")
+
+
+class FormEntry(object):
+    """
+    Finished matches of a team in a season, as home-team (home=True), away-team (home=False) or both (home=None)
+    """
+    def __init__(self, team_api_id, season, home, matches, version):
+        self.team_api_id = team_api_id
+        self.season = season
+        self.home = home
+        # MatchStore.get_team_version of the team in the season
+        self.version = version
+        self.match_ids = [match.id for match in matches]
+        self.stages = [match.stage for match in matches]
+        self.n = len(matches)
+
+        points = np.zeros(self.n, dtype=np.int64)
+        goal_done = np.zeros(self.n, dtype=np.int64)
+        goal_received = np.zeros(self.n, dtype=np.int64)
+        self.results = []
+        for i, match in enumerate(matches):
+            if match.home_team_goal == match.away_team_goal:
+                points[i] = 1
+            elif (match.home_team_api_id == team_api_id and match.home_team_goal > match.away_team_goal) \
+                    or (match.away_team_api_id == team_api_id and match.home_team_goal < match.away_team_goal):
+                points[i] = 3
+            if match.home_team_api_id == team_api_id:
+                goal_done[i] = match.home_team_goal
+                goal_received[i] = match.away_team_goal
+            else:
+                goal_done[i] = match.away_team_goal
+                goal_received[i] = match.home_team_goal
+
+            result, winner = match.get_winner()
+            if util.is_None(winner):
+                self.results.append(1)
+            elif winner.team_api_id == team_api_id:
+                self.results.append(0)
+            else:
+                self.results.append(2)
+
+        self.cum_points = np.concatenate(([0], np.cumsum(points)))
+        self.cum_goal_done = np.concatenate(([0], np.cumsum(goal_done)))
+        self.cum_goal_received = np.concatenate(([0], np.cumsum(goal_received)))
+        # number of distinct stages in the first i matches
+        self.cum_stages = [0]
+        stages_seen = set()
+        for stage in self.stages:
+            stages_seen.add(stage)
+            self.cum_stages.append(len(stages_seen))
+        # KEY: stage, VALUE: entry of the matches played before the stage
+        self.before_stage = {}
+
+    def get_before_stage(self, stage):
+        """
+        Return <entry, n_matches> of the matches played before the stage: this entry when they are the first matches
+        (the usual case), a new entry with only them when a match of a previous stage has been postponed
+        :param stage:
+        :return:
+        """
+        try:
+            return self.before_stage[stage]
+        except KeyError:
+            pass
+        positions = [i for i, match_stage in enumerate(self.stages)
+                     if not util.is_None(match_stage) and match_stage < stage]
+        if positions == list(range(len(positions))):
+            before_stage = (self, len(positions))
+        else:
+            before_stage = (self.subset(positions), len(positions))
+        self.before_stage[stage] = before_stage
+        return before_stage
+
+    def subset(self, positions):
+        entry = FormEntry.__new__(FormEntry)
+        entry.team_api_id = self.team_api_id
+        entry.season = self.season
+        entry.home = self.home
+        entry.version = self.version
+        entry.match_ids = [self.match_ids[i] for i in positions]
+        entry.stages = [self.stages[i] for i in positions]
+        entry.n = len(positions)
+        entry.results = [self.results[i] for i in positions]
+        positions = np.asarray(positions, dtype=np.int64)
+        for cum in ("cum_points", "cum_goal_done", "cum_goal_received"):
+            values = np.diff(getattr(self, cum))[positions]
+            setattr(entry, cum, np.concatenate(([0], np.cumsum(values))))
+        entry.cum_stages = [0]
+        stages_seen = set()
+        for stage in entry.stages:
+            stages_seen.add(stage)
+            entry.cum_stages.append(len(stages_seen))
+        entry.before_stage = {}
+        return entry
+
+
+def get_entry(team_api_id, season, home=None):
+    """
+    Return the FormEntry of the team in the season, building it from the MatchStore if needed
+    :param team_api_id:
+    :param season:
+    :param home:
+    :return:
+    """
+    import src.application.Domain.Team as Team
+
+    key = str(team_api_id) + "_" + season + "_" + str(home)
+    # the store is loaded again when another process writes the DB, updated when this process writes a match: only
+    # the entries of its teams are built again
+    version = MatchStore.get_team_version(team_api_id, (season,))
+    try:
+        entry = Cache.get_element(key, "TEAM_FORM_INDEX")
+        if entry.version == version:
+            return entry
+    except KeyError:
+        pass
+
+    team = Team.read_by_team_api_id(team_api_id)
+    matches = team.get_matches(season=season, ordered=True, finished=True, home=home)
+    entry = FormEntry(team_api_id, season, home, matches, version)
+    # not tagged: the entries of the other seasons of the team stay valid when a match is written
+    return Cache.add_element(key, entry, "TEAM_FORM_INDEX")
+
+
+def get_training_window(team_api_id, season, stage_to_predict, stages_to_train, home=None):
+    """
+    Return the segments <entry, start, end, reversed> of the matches Team.get_training_matches returns, in the
+    same order, raising the same MLException
+    None if the window cannot be resolved by the index (the caller reads the matches)
+    :param team_api_id:
+    :param season:
+    :param stage_to_predict:
+    :param stages_to_train:
+    :param home:
+    :return:
+    """
+    if util.is_None(season) or util.is_None(stage_to_predict):
+        return None
+    if not util.is_None(stages_to_train) and stages_to_train <= 0:
+        return None
+
+    entry = get_entry(team_api_id, season, home)
+    if util.is_None(stages_to_train):
+        if any(util.is_None(stage) for stage in entry.stages):
+            return None
+        entry, n = entry.get_before_stage(stage_to_predict)
+        if n == 0 and stage_to_predict == 1:
+            raise MLException(0)
+        return get_segments(entry, 0, n, False)
+
+    entry, n = entry.get_before_stage(stage_to_predict)
+    segments = get_segments(entry, 0, n, False)
+    n_stages = entry.cum_stages[n]
+    if n_stages < stages_to_train:
+        # previous seasons, considering the last matches (both home and away)
+        segments.extend(get_last_matches_window(team_api_id, util.get_previous_season(season),
+                                                stages_to_train - n_stages))
+    if get_length(segments) > stages_to_train:
+        segments = take_last(segments, stages_to_train)
+    return segments
+
+
+def get_last_matches_window(team_api_id, season, stages_to_train):
+    """
+    Window of the last matches of the season, and of the previous ones if they are not enough
+    (Team.get_training_matches with consider_last), resolved season by season without recursion
+    :param team_api_id:
+    :param season:
+    :param stages_to_train:
+    :return:
+    """
+    # <entry, stages to train> of each season, from the most recent one
+    levels = []
+    while True:
+        entry = get_entry(team_api_id, season)
+        if entry.n == 0 and season < first_season:
+            raise MLException(1)
+        levels.append((entry, stages_to_train))
+        n_stages = entry.cum_stages[entry.n]
+        if n_stages >= stages_to_train:
+            break
+        season = util.get_previous_season(season)
+        stages_to_train -= n_stages
+
+    # each season takes its last matches followed by the ones of the previous seasons, then it is truncated
+    segments = []
+    for entry, stages_to_train in levels[::-1]:
+        segments = get_segments(entry, 0, entry.n, True) + segments
+        if get_length(segments) > stages_to_train:
+            segments = reverse(take_first(segments, stages_to_train))
+    return segments
+
+
+def get_segments(entry, start, end, reversed):
+    if end <= start:
+        return []
+    return [(entry, start, end, reversed)]
+
+
+def get_length(segments):
+    return sum(end - start for entry, start, end, reversed in segments)
+
+
+def reverse(segments):
+    return [(entry, start, end, not reversed) for entry, start, end, reversed in segments[::-1]]
+
+
+def take_first(segments, n):
+    """
+    Return the segments of the first n matches
+    :param segments:
+    :param n:
+    :return:
+    """
+    first_segments = []
+    for entry, start, end, reversed in segments:
+        if n <= 0:
+            break
+        if end - start > n:
+            if reversed:
+                start = end - n
+            else:
+                end = start + n
+        first_segments.append((entry, start, end, reversed))
+        n -= end - start
+    return first_segments
+
+
+def take_last(segments, n):
+    return reverse(take_first(reverse(segments), n))
+
+
+def get_points(segments):
+    """
+    Return <points, number of matches> of the window
+    :param segments:
+    :return:
+    """
+    points = 0
+    for entry, start, end, reversed in segments:
+        points += int(entry.cum_points[end] - entry.cum_points[start])
+    return points, get_length(segments)
+
+
+def get_goals(segments):
+    """
+    Return <goals done, goals received, number of matches> of the window
+    :param segments:
+    :return:
+    """
+    goal_done = 0
+    goal_received = 0
+    for entry, start, end, reversed in segments:
+        goal_done += int(entry.cum_goal_done[end] - entry.cum_goal_done[start])
+        goal_received += int(entry.cum_goal_received[end] - entry.cum_goal_received[start])
+    return goal_done, goal_received, get_length(segments)
+
+
+def get_results(segments):
+    """
+    Return the results of the matches of the window, in order (0: win, 1: draw, 2: lost)
+    :param segments:
+    :return:
+    """
+    results = []
+    for entry, start, end, reversed in segments:
+        if reversed:
+            results.extend(entry.results[start:end][::-1])
+        else:
+            results.extend(entry.results[start:end])
+    return results
+
+
+def get_match_ids(segments):
+    """
+    Return the ids of the matches of the window, in order
+    :param segments:
+    :return:
+    """
+    match_ids = []
+    for entry, start, end, reversed in segments:
+        if reversed:
+            match_ids.extend(entry.match_ids[start:end][::-1])
+        else:
+            match_ids.extend(entry.match_ids[start:end])
+    return match_ids
@@ -52,8 +52,7 @@ def read_by_team_fifa_api_id(team_fifa_api_id):
             team_attributes.__setattr__(attribute, value)
         team_attributes_list.append(team_attributes)
 
-    Cache.add_element(team_fifa_api_id, team_attributes_list, "TEAM_ATTRIBUTES")
-    return team_attributes_list
+    return Cache.add_element(team_fifa_api_id, team_attributes_list, "TEAM_ATTRIBUTES")
 
 
 def write_team_attributes(team, team_attributes, date=util.get_today_date()+" 00:00:00"):
@@ -70,5 +69,14 @@ def write_team_attributes(team, team_attributes, date=util.get_today_date()+" 00
     team_attributes["team_api_id"] = team.team_api_id
     team_attributes["date"] = date
 
-    SQLLite.get_connection().insert("Team_Attributes", team_attributes)
-    Cache.del_element(team.team_fifa_api_id, "TEAM_ATTRIBUTES")
+    def invalidate():
+        Cache.del_element(team.team_fifa_api_id, "TEAM_ATTRIBUTES")
+
+    # attributes crawled twice in a day replace the ones of the day
+    key_columns = ("team_fifa_api_id", "date")
+    write_buffer = SQLLite.get_write_buffer()
+    if write_buffer is not None:
+        write_buffer.upsert("Team_Attributes", team_attributes, key_columns, callback=invalidate)
+    else:
+        SQLLite.get_connection().upsert_many("Team_Attributes", [team_attributes], key_columns)
+        invalidate()
@@ -0,0 +1,155 @@
+import logging
+
+import src.util.util as util
+import src.util.Cache as Cache
+import src.application.Domain.MatchStore as MatchStore
+from src.application.Exception.MLException import MLException
+
+log = logging.getLogger(__name__)
+
+# Training windows of the leagues (League.get_training_matches): the matches of the stages_to_train stages before the
+# stage to predict, also from the previous seasons when the current one has not enough stages
+# The seasons are resolved in a loop (no recursion), and each window is memoized as a tuple of match ids
+#
+# the first season with matches in the DB: League.get_training_matches raises MLException(0) before it
+first_season = "2006/2007"
+
+
+class MatchIds(object):
+    """
+    Match ids resolved over the MatchStore: they are valid while the version of the matches of the league in the
+    seasons they are read from (MatchStore.get_league_version) does not change
+    """
+    def __init__(self, version, match_ids):
+        self.version = version
+        self.match_ids = match_ids
+
+
+def get_seasons_until(league, season):
+    """
+    Return the seasons of the league up to the input one: the ones a training window of the season can reach
+    :param league:
+    :param season:
+    :return:
+    """
+    return sorted(set(league_season for league_season in league.get_seasons()
+                      if not util.is_None(league_season) and league_season <= season) | {season})
+
+
+def get_finished_matches(league, season):
+    """
+    Return the finished matches of the league in the season, ordered by stage, as tuples <id, stage, season>
+    :param league:
+    :param season:
+    :return:
+    """
+    key = str(league.id) + "_" + str(season)
+    version = MatchStore.get_league_version(league.id, (season,))
+    try:
+        matches = Cache.get_element(key, "LEAGUE_FINISHED_MATCHES")
+        if matches.version == version:
+            return matches.match_ids
+    except KeyError:
+        pass
+
+    matches = tuple((match.id, match.stage, match.season)
+                    for match in league.get_matches(season=season, ordered=True, finished=True))
+    # not tagged (as the other elements checked against the version of their matches)
+    Cache.add_element(key, MatchIds(version, matches), "LEAGUE_FINISHED_MATCHES")
+    return matches
+
+
+def get_league_window(league, season, stage_to_predict, stages_to_train, consider_last=False):
+    """
+    Return the ids of the training matches of the league, in the order of League.get_training_matches
+    :param league:
+    :param season:
+    :param stage_to_predict:
+    :param stages_to_train:
+    :param consider_last: start from the last matches of the season
+    :return:
+    """
+    key = str(league.id) + "_" + str(season) + "_" + str(stage_to_predict) + "_" + str(stages_to_train) + "_" \
+        + str(consider_last)
+    version = MatchStore.get_league_version(league.id, get_seasons_until(league, season))
+    try:
+        window = Cache.get_element(key, "LEAGUE_TRAINING_WINDOW")
+        if window.version == version:
+            return window.match_ids
+    except KeyError:
+        pass
+
+    if util.is_None(stages_to_train):
+        # only stages of this season
+        match_ids = tuple(match_id for match_id, stage, match_season in get_finished_matches(league, season)
+                          if stage < stage_to_predict)
+    else:
+        match_ids = tuple(resolve_window(league, season, stage_to_predict, stages_to_train, consider_last))
+
+    Cache.add_element(key, MatchIds(version, match_ids), "LEAGUE_TRAINING_WINDOW")
+    return match_ids
+
+
+def resolve_window(league, season, stage_to_predict, stages_to_train, consider_last=False):
+    """
+    The matches of the stages before stage_to_predict; when they are less than stages_to_train stages, the last
+    matches of the previous seasons
+    :param league:
+    :param season:
+    :param stage_to_predict:
+    :param stages_to_train:
+    :param consider_last:
+    :return: list of match ids
+    """
+    # <matches, stages to train, consider last> of each season, from the one of the stage to predict
+    levels = []
+    while True:
+        if consider_last:
+            # matches of previous seasons --> take them in the reverse order
+            matches = list(get_finished_matches(league, season))[::-1]
+        else:
+            matches = [match for match in get_finished_matches(league, season) if match[1] < stage_to_predict]
+        if len(matches) == 0 and season < first_season:
+            raise MLException(0)
+
+        levels.append((matches, stages_to_train, consider_last))
+        n_stages = len(set((stage, match_season) for match_id, stage, match_season in matches))
+        if n_stages >= stages_to_train:
+            break
+        season = util.get_previous_season(season)
+        stages_to_train -= n_stages
+        consider_last = True
+
+    # EX: stage_to_predict = 7, n_match_1_stage = 10 --> 70 matches
+    n_matches_in_stage = int(len(league.get_teams_current_season()) / 2)
+    training_matches = []
+    for matches, stages_to_train, consider_last in levels[::-1]:
+        training_matches = matches + training_matches
+        if len(training_matches) / n_matches_in_stage > stages_to_train:
+            # too matches in training --> remove too far
+            if consider_last:
+                training_matches = training_matches[:stages_to_train * n_matches_in_stage][::-1]
+            else:
+                training_matches = training_matches[-stages_to_train * n_matches_in_stage:]
+    return [match[0] for match in training_matches]
+
+
+def get_matches(match_ids, season=None):
+    """
+    Return the Match objects (views of the MatchStore) of the ids in input, in the same order, with their teams read
+    :param match_ids:
+    :param season: season of the window (its matches are of that season or of the previous ones)
+    :return:
+    """
+    import src.application.Domain.Team as Team
+
+    matches = [None] * len(match_ids)
+    team_api_ids = set()
+    for match_store, positions, rows in MatchStore.locate(match_ids, season):
+        for position, match in zip(positions.tolist(), match_store.views_of(rows)):
+            matches[position] = match
+        team_api_ids.update(match_store.get("home_team_api_id", rows).tolist())
+        team_api_ids.update(match_store.get("away_team_api_id", rows).tolist())
+    # the input builders read the teams of every match: one query for the ones not in the cache
+    Team.read_many_by_api_ids(team_api_ids)
+    return [match for match in matches if match is not None]
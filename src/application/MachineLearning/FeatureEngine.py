@@ -0,0 +1,561 @@
+import logging
+
+import numpy as np
+
+import src.util.util as util
+import src.util.Cache as Cache
+import src.application.Domain.League as League
+import src.application.Domain.Team as Team
+import src.application.Domain.MatchStore as MatchStore
+import src.application.Domain.Match_Incident as Match_Incident
+import src.application.Domain.TrainingWindow as TrainingWindow
+import src.application.MachineLearning.input_train.kekko_input as kekko_input
+import src.application.MachineLearning.input_train.poisson as poisson
+from src.application.Exception.MLException import MLException
+
+log = logging.getLogger(__name__)
+
+# Feature matrices of the inputs of MachineLearningInput (ids 1-5) for the leagues: the features of all the matches
+# of a league-season are computed in one pass, for every representation, and memoized; the input of a stage is a
+# slice of the matrices of its season (and of the previous seasons, for the training matches)
+# The aggregates of the teams are read once for each <team, stage> and combined with vectorized operations
+#
+# Each row has a status, following the input_train modules: a match whose features raise an MLException is skipped,
+# a match raising any other error makes the engine give way to the input_train module (that raises the same error)
+#
+# False to build the inputs only with the input_train modules
+enabled = True
+# status of a row
+valid = 0
+skipped = 1
+failed = 2
+# representations of the inputs with more than one (team_form, team_home_away_form)
+representations = (1, 2, 3, 4)
+
+
+class SeasonFeatures(object):
+    """
+    Features of the matches of a league in a season (ordered by stage), for one input and all its representations
+    Valid while the version of the matches of the league in the seasons up to this one (MatchStore.get_league_version)
+    does not change
+    """
+    def __init__(self, version, matches):
+        self.version = version
+        self.n = len(matches)
+        self.match_ids = [match.id for match in matches]
+        self.rows_by_id = {match_id: row for row, match_id in enumerate(self.match_ids)}
+        self.stages = np.fromiter((match.stage for match in matches), dtype=np.int64, count=self.n)
+        self.home_team_api_ids = [match.home_team_api_id for match in matches]
+        self.away_team_api_ids = [match.away_team_api_id for match in matches]
+        self.labels, self.label_status = get_labels(matches)
+        # KEY: representation (None for the inputs without representations), VALUE: matrix rows x features
+        self.features = {}
+        self.status = np.zeros(self.n, dtype=np.int8)
+
+
+def get_input_to_train(id, domain, representation, stage, stages_to_train, season, dataset=None):
+    """
+    Return the input of MachineLearningInput.get_input_to_train as slices of the feature matrices
+    None if the engine cannot build it (EX: the domain is a team): the caller uses the input_train module
+    :param id:
+    :param domain:
+    :param representation:
+    :param stage:
+    :param stages_to_train:
+    :param season:
+    :param dataset: WalkForwardDataset keeping the training rows of the previous stage
+    :return: matches, labels, matches_id, matches_to_predict, matches_to_predict_id, labels_to_predict
+    """
+    if not enabled or id not in builders or not isinstance(domain, League.League) or not season or not stage:
+        return None
+    if id in (1, 2):
+        if representation not in representations:
+            return None
+    else:
+        representation = None
+
+    matches, labels, matches_id = np.asarray([]), np.asarray([]), []
+    if id != 5:
+        # the Poisson input has no training matches
+        if dataset is not None:
+            training_input = dataset.get_training_input(stage)
+        else:
+            training_input = get_training_input(id, domain, representation, stage, stages_to_train, season)
+        if training_input is None:
+            return None
+        matches, labels, matches_id = training_input
+
+    season_features = get_season_features(id, domain, season, stages_to_train)
+    rows = np.flatnonzero(season_features.stages == stage)
+    status = season_features.status[rows]
+    if np.any(status == failed):
+        return None
+    rows = rows[status == valid]
+    matches_to_predict = season_features.features[representation][rows]
+    matches_to_predict_id = [season_features.match_ids[row] for row in rows]
+    labels_to_predict = season_features.labels[rows]
+
+    if len(matches_to_predict) == 0 or (id != 5 and len(matches) == 0):
+        raise MLException(2)
+    if id == 2 and len(set(labels.tolist())) == 1:
+        raise MLException(2)
+    return matches, labels, matches_id, matches_to_predict, matches_to_predict_id, labels_to_predict
+
+
+def get_training_input(id, league, representation, stage, stages_to_train, season):
+    """
+    Return <matches, labels, matches_id> of the training matches of the league (League.get_training_matches),
+    None if a match raises an error that is not an MLException
+    :param id:
+    :param league:
+    :param representation:
+    :param stage:
+    :param stages_to_train:
+    :param season:
+    :return:
+    """
+    match_ids = get_window(league, season, stage, stages_to_train)
+    match_features = get_match_features(id, league, representation, stages_to_train, season, match_ids)
+    if match_features is None:
+        return None
+    features, labels, status = match_features
+    if np.any(status == failed):
+        return None
+    is_valid = status == valid
+    return features[is_valid], labels[is_valid], match_ids[is_valid].tolist()
+
+
+def get_window(league, season, stage, stages_to_train):
+    """
+    Return the ids of the training matches of the league (League.get_training_matches), as an array
+    :param league:
+    :param season:
+    :param stage:
+    :param stages_to_train:
+    :return:
+    """
+    match_ids = np.asarray(TrainingWindow.get_league_window(league, season, stage, stages_to_train), dtype=np.int64)
+    found = np.zeros(len(match_ids), dtype=bool)
+    for match_store, positions, rows in MatchStore.locate(match_ids, season):
+        found[positions] = True
+    return match_ids[found]
+
+
+def get_match_features(id, league, representation, stages_to_train, season, match_ids):
+    """
+    Return the rows of the matches in the matrices of their seasons: <features, labels, status>, in the order of the
+    match ids; None if a match is not in the matrices
+    :param id:
+    :param league:
+    :param representation:
+    :param stages_to_train:
+    :param season: season of the window (the matches are of that season or of the previous ones)
+    :param match_ids: array of ids
+    :return:
+    """
+    match_seasons = [None] * len(match_ids)
+    for match_store, positions, rows in MatchStore.locate(match_ids, season):
+        season_column = match_store.get_column("season")
+        for position, row in zip(positions.tolist(), rows.tolist()):
+            match_seasons[position] = season_column.get_value(row)
+    if None in match_seasons:
+        # a match not in the stores
+        return None
+    match_ids = match_ids.tolist()
+
+    # the matches are grouped by season: each group is a slice of the matrix of its season
+    groups = []
+    for match_season in sorted(set(match_seasons), reverse=True):
+        season_features = get_season_features(id, league, match_season, stages_to_train)
+        positions = np.asarray([i for i, s in enumerate(match_seasons) if s == match_season], dtype=np.int64)
+        try:
+            season_rows = np.asarray([season_features.rows_by_id[match_ids[i]] for i in positions], dtype=np.int64)
+        except KeyError:
+            return None
+        groups.append((season_features, positions, season_rows))
+
+    if len(groups) == 0:
+        return np.asarray([]), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8)
+
+    matrices = [season_features.features[representation] for season_features, p, r in groups]
+    features = np.zeros((len(match_ids), matrices[0].shape[1]), dtype=np.result_type(*matrices))
+    labels = np.zeros(len(match_ids), dtype=np.int64)
+    status = np.zeros(len(match_ids), dtype=np.int8)
+    for season_features, positions, season_rows in groups:
+        features[positions] = season_features.features[representation][season_rows]
+        labels[positions] = season_features.labels[season_rows]
+        status[positions] = season_features.status[season_rows]
+    return features, labels, status
+
+
+def get_season_features(id, league, season, stages_to_train):
+    """
+    Return the SeasonFeatures of the input for the league-season, building them if needed
+    :param id:
+    :param league:
+    :param season:
+    :param stages_to_train:
+    :return:
+    """
+    key = str(id) + "_" + str(league.id) + "_" + str(season) + "_" + str(stages_to_train)
+    version = MatchStore.get_league_version(league.id, TrainingWindow.get_seasons_until(league, season))
+    try:
+        season_features = Cache.get_element(key, "LEAGUE_SEASON_FEATURES")
+        if season_features.version == version:
+            return season_features
+    except KeyError:
+        pass
+
+    season_features = SeasonFeatures(version, league.get_matches(season=season, ordered=True))
+    if season_features.n > 0:
+        features, status = builders[id](league, season, stages_to_train, season_features)
+    else:
+        features, status = {}, season_features.status
+    season_features.features = features
+    # the label is read after the features
+    season_features.status = combine(status, season_features.label_status)
+    log.debug("Features [" + key + "]: " + str(season_features.n) + " matches")
+    return Cache.add_element(key, season_features, "LEAGUE_SEASON_FEATURES")
+
+
+def get_labels(matches):
+    """
+    Return <labels, status> of the matches, as MLUtil.get_label (failed if the goals are not known)
+    :param matches:
+    :return:
+    """
+    home_goals = [match.home_team_goal for match in matches]
+    away_goals = [match.away_team_goal for match in matches]
+    known = np.fromiter((type(home_goal) is int and type(away_goal) is int
+                         for home_goal, away_goal in zip(home_goals, away_goals)), dtype=bool, count=len(matches))
+    home_goals = np.asarray([home_goal if is_known else 0 for home_goal, is_known in zip(home_goals, known)],
+                            dtype=np.int64)
+    away_goals = np.asarray([away_goal if is_known else 0 for away_goal, is_known in zip(away_goals, known)],
+                            dtype=np.int64)
+    labels = np.where(home_goals > away_goals, 1, np.where(home_goals < away_goals, 2, 0)).astype(np.int64)
+    return labels, np.where(known, valid, failed).astype(np.int8)
+
+
+def evaluate(function, skipped_errors, *args):
+    """
+    Return <result, status> of the function
+    :param function:
+    :param skipped_errors: errors skipping the match
+    :param args:
+    :return:
+    """
+    try:
+        return function(*args), valid
+    except skipped_errors:
+        return None, skipped
+    except Exception as e:
+        log.debug("Features :: " + type(e).__name__ + " " + str(e))
+        return None, failed
+
+
+def get_team_values(team_api_ids, stages, function, n_values, dtype=np.int64, skipped_errors=(MLException,)):
+    """
+    Evaluate the function once for each distinct <team, stage> of the rows
+    :param team_api_ids: team of each row
+    :param stages: stage of each row
+    :param function: function(team, stage) returning n_values numbers
+    :param n_values:
+    :param dtype:
+    :param skipped_errors:
+    :return: <values (matrix rows x n_values, zeros where the status is not valid), status of each row>
+    """
+    def read_and_call(team_api_id, stage):
+        return function(Team.read_by_team_api_id(team_api_id), stage)
+
+    values = np.zeros((len(team_api_ids), n_values), dtype=dtype)
+    status = np.zeros(len(team_api_ids), dtype=np.int8)
+    results = {}
+    for row, key in enumerate(zip(team_api_ids, stages.tolist())):
+        try:
+            result, result_status = results[key]
+        except KeyError:
+            result, result_status = evaluate(read_and_call, skipped_errors, *key)
+            results[key] = (result, result_status)
+        if result_status == valid:
+            values[row] = result
+        status[row] = result_status
+    return values, status
+
+
+def get_stage_values(stages, function, n_values, dtype=np.float64):
+    """
+    Evaluate the function once for each distinct stage of the rows
+    :param stages:
+    :param function: function(stage) returning n_values numbers
+    :param n_values:
+    :param dtype:
+    :return: <values, status of each row>
+    """
+    values = np.zeros((len(stages), n_values), dtype=dtype)
+    status = np.zeros(len(stages), dtype=np.int8)
+    for stage in np.unique(stages).tolist():
+        rows = stages == stage
+        result, status[rows] = evaluate(function, (MLException,), stage)
+        if result is not None:
+            values[rows] = result
+    return values, status
+
+
+def combine(*statuses):
+    """
+    Return the status of the rows: the first one not valid, in the order the values are computed
+    :param statuses:
+    :return:
+    """
+    status = np.zeros(len(statuses[0]), dtype=np.int8)
+    for other_status in statuses:
+        status = np.where(status == valid, other_status, status).astype(np.int8)
+    return status
+
+
+def zero_check(status, *counts):
+    """
+    Return the status (skipped) of the rows where any count is 0
+    :param status: status of the rows computed so far
+    :param counts:
+    :return:
+    """
+    is_zero = np.zeros(len(status), dtype=bool)
+    for count in counts:
+        is_zero |= count == 0
+    return np.where((status == valid) & is_zero, skipped, valid).astype(np.int8)
+
+
+def get_divisors(counts, status):
+    """
+    Return the counts, 1 in the rows not valid (their features are not used)
+    :param counts:
+    :param status:
+    :return:
+    """
+    return np.where(status == valid, counts, 1)
+
+
+def get_form_representations(forms, status, differences):
+    """
+    Return the representations 1-4 of the team forms
+    :param forms: pairs <points, n> of the columns
+    :param status:
+    :param differences: pairs of indexes of forms, subtracted in representations 3 and 4
+    :return:
+    """
+    forms = [(points, get_divisors(n, status)) for points, n in forms]
+    ratio = [points / n for points, n in forms]
+    discretized = [points // n for points, n in forms]
+    return {1: np.column_stack(ratio),
+            2: np.column_stack(discretized),
+            3: np.column_stack([ratio[i] - ratio[j] for i, j in differences]),
+            4: np.column_stack([discretized[i] - discretized[j] for i, j in differences])}
+
+
+def build_team_form(league, season, stages_to_train, season_features):
+    """
+    team_form: form of the two teams
+    :param league:
+    :param season:
+    :param stages_to_train:
+    :param season_features:
+    :return: <features by representation, status>
+    """
+    def points(team, stage):
+        return team.get_points_by_train_matches(season, stage, stages_to_train)
+
+    stages = season_features.stages
+    home, home_status = get_team_values(season_features.home_team_api_ids, stages, points, 2)
+    away, away_status = get_team_values(season_features.away_team_api_ids, stages, points, 2)
+    status = combine(home_status, away_status)
+    status = combine(status, zero_check(status, home[:, 1], away[:, 1]))
+
+    forms = [(home[:, 0], home[:, 1]), (away[:, 0], away[:, 1])]
+    return get_form_representations(forms, status, [(0, 1)]), status
+
+
+def build_team_home_away_form(league, season, stages_to_train, season_features):
+    """
+    team_home_away_form: form of the two teams, overall, at home and away
+    :param league:
+    :param season:
+    :param stages_to_train:
+    :param season_features:
+    :return: <features by representation, status>
+    """
+    def points(home):
+        return lambda team, stage: team.get_points_by_train_matches(season, stage, stages_to_train, home=home)
+
+    stages = season_features.stages
+    home_team_api_ids = season_features.home_team_api_ids
+    away_team_api_ids = season_features.away_team_api_ids
+    # in the order of team_home_away_form.get_home_away_team_form
+    values = [get_team_values(home_team_api_ids, stages, points(None), 2),
+              get_team_values(away_team_api_ids, stages, points(None), 2),
+              get_team_values(home_team_api_ids, stages, points(True), 2),
+              get_team_values(home_team_api_ids, stages, points(False), 2),
+              get_team_values(away_team_api_ids, stages, points(True), 2),
+              get_team_values(away_team_api_ids, stages, points(False), 2)]
+    status = combine(*[value_status for value, value_status in values])
+    status = combine(status, zero_check(status, *[value[:, 1] for value, value_status in values]))
+
+    home_form, away_form, home_home_form, home_away_form, away_home_form, away_away_form = \
+        [(value[:, 0], value[:, 1]) for value, value_status in values]
+    forms = [home_form, home_home_form, home_away_form, away_form, away_home_form, away_away_form]
+    return get_form_representations(forms, status, [(0, 3), (1, 4), (2, 5)]), status
+
+
+def build_match_statistics(league, season, stages_to_train, season_features):
+    """
+    match_statistics: goals, shots, goal ratio and form of the two teams
+    :param league:
+    :param season:
+    :param stages_to_train:
+    :param season_features:
+    :return: <features, status>
+    """
+    # match_statistics.get_match_as_array skips the matches raising an AttributeError
+    skipped_errors = (MLException, AttributeError)
+    stages = season_features.stages
+    home_team_api_ids = season_features.home_team_api_ids
+    away_team_api_ids = season_features.away_team_api_ids
+
+    def goals(team, stage):
+        return team.get_goals_by_train_matches(season, stage, stages_to_train)
+
+    def points(team, stage):
+        return team.get_points_by_train_matches(season, stage, stages_to_train)
+
+    # shots: the training matches of each <team, stage>, then the incidents of all of them in one query for each type
+    windows = {}
+
+    def window(team, stage):
+        matches = team.get_training_matches(season, stage, stages_to_train)
+        windows[(team.team_api_id, stage)] = ([match.id for match in matches],
+                                              any(util.is_None(match.shoton) for match in matches),
+                                              any(util.is_None(match.shotoff) for match in matches))
+        return ()
+
+    home_window_status = get_team_values(home_team_api_ids, stages, window, 0, skipped_errors=skipped_errors)[1]
+    away_window_status = get_team_values(away_team_api_ids, stages, window, 0, skipped_errors=skipped_errors)[1]
+    window_match_ids = set(match_id for match_ids, null_on, null_off in windows.values() for match_id in match_ids)
+    shots_on = Match_Incident.count_incidents_by_match("shoton", window_match_ids)
+    shots_off = Match_Incident.count_incidents_by_match("shotoff", window_match_ids)
+
+    def shots(team, stage):
+        # as Team.count_shots: on, then off
+        match_ids, null_on, null_off = windows[(team.team_api_id, stage)]
+        if null_on:
+            raise MLException(2)
+        on = sum(shots_on.get((match_id, team.team_api_id), 0) for match_id in match_ids)
+        if null_off:
+            raise MLException(2)
+        return on, sum(shots_off.get((match_id, team.team_api_id), 0) for match_id in match_ids)
+
+    home_goals, home_goals_status = get_team_values(home_team_api_ids, stages, goals, 3, skipped_errors=skipped_errors)
+    away_goals, away_goals_status = get_team_values(away_team_api_ids, stages, goals, 3, skipped_errors=skipped_errors)
+    home_shots, home_shots_status = get_team_values(home_team_api_ids, stages, shots, 2, skipped_errors=skipped_errors)
+    away_shots, away_shots_status = get_team_values(away_team_api_ids, stages, shots, 2, skipped_errors=skipped_errors)
+    status = combine(home_goals_status, away_goals_status,
+                     combine(home_window_status, home_shots_status), combine(away_window_status, away_shots_status))
+    home_n_shots = home_shots[:, 0] + home_shots[:, 1]
+    away_n_shots = away_shots[:, 0] + away_shots[:, 1]
+    status = combine(status, zero_check(status, home_n_shots, away_n_shots))
+    home_form, home_form_status = get_team_values(home_team_api_ids, stages, points, 2, skipped_errors=skipped_errors)
+    away_form, away_form_status = get_team_values(away_team_api_ids, stages, points, 2, skipped_errors=skipped_errors)
+    status = combine(status, home_form_status, away_form_status)
+
+    features = np.column_stack((home_goals[:, 0] - home_goals[:, 1],
+                                away_goals[:, 0] - away_goals[:, 1],
+                                home_shots[:, 0],
+                                away_shots[:, 0],
+                                home_goals[:, 0] / get_divisors(home_n_shots, status),
+                                away_goals[:, 0] / get_divisors(away_n_shots, status),
+                                home_form[:, 0],
+                                away_form[:, 0]))
+    return {None: features}, status
+
+
+def build_kekko_input(league, season, stages_to_train, season_features):
+    """
+    kekko_input: training positions, trends and goals of the two teams
+    :param league:
+    :param season:
+    :param stages_to_train:
+    :param season_features:
+    :return: <features, status>
+    """
+    def classifica(team, stage):
+        return kekko_input.get_classifica(league, team, season, stage, stages_to_train)
+
+    def trend(team, stage):
+        return kekko_input.get_trend(team, stage, season)
+
+    def goals(team, stage):
+        return kekko_input.get_goals(team, stage, season, stages_to_train)
+
+    stages = season_features.stages
+    values = []
+    # in the order of kekko_input.kekko_input
+    for function, n_values in ((classifica, 3), (trend, 15), (goals, 6)):
+        for team_api_ids in (season_features.home_team_api_ids, season_features.away_team_api_ids):
+            values.append(get_team_values(team_api_ids, stages, function, n_values, dtype=np.float64))
+
+    status = combine(*[value_status for value, value_status in values])
+    return {None: np.hstack([value for value, value_status in values])}, status
+
+
+def build_poisson_input(league, season, stages_to_train, season_features):
+    """
+    poisson_input: expected goals of the two teams
+    :param league:
+    :param season:
+    :param stages_to_train:
+    :param season_features:
+    :return: <features, status>
+    """
+    def average_goals(stage):
+        return poisson.get_average_goals(league, season, stage, stages_to_train)
+
+    def home_goals(team, stage):
+        return team.get_goals_by_train_matches(season, stage, stages_to_train, home=True)
+
+    def away_goals(team, stage):
+        return team.get_goals_by_train_matches(season, stage, stages_to_train, home=False)
+
+    stages = season_features.stages
+    averages, averages_status = get_stage_values(stages, average_goals, 4)
+    home, home_status = get_team_values(season_features.home_team_api_ids, stages, home_goals, 3)
+    away, away_status = get_team_values(season_features.away_team_api_ids, stages, away_goals, 3)
+    avg_home_goal_done, avg_home_goal_rece, avg_away_goal_done, avg_away_goal_rece = averages.T
+
+    # poisson.get_strength divides by the number of matches and by the averages
+    home_division = np.where((home[:, 2] == 0) | (avg_home_goal_done == 0) | (avg_home_goal_rece == 0), failed, valid)
+    away_division = np.where((away[:, 2] == 0) | (avg_away_goal_done == 0) | (avg_away_goal_rece == 0), failed, valid)
+    status = combine(averages_status, home_status, home_division.astype(np.int8),
+                     away_status, away_division.astype(np.int8))
+
+    home_n = get_divisors(home[:, 2], status)
+    away_n = get_divisors(away[:, 2], status)
+    avg_home_goal_done = get_divisors(avg_home_goal_done, status)
+    avg_home_goal_rece = get_divisors(avg_home_goal_rece, status)
+    avg_away_goal_done = get_divisors(avg_away_goal_done, status)
+    avg_away_goal_rece = get_divisors(avg_away_goal_rece, status)
+    home_attack_strength = (home[:, 0] / home_n) / avg_home_goal_done
+    home_defense_strength = (home[:, 1] / home_n) / avg_home_goal_rece
+    away_attack_strength = (away[:, 0] / away_n) / avg_away_goal_done
+    away_defense_strength = (away[:, 1] / away_n) / avg_away_goal_rece
+
+    features = np.column_stack((
+        poisson.get_goal_expectancy(home_attack_strength, away_defense_strength, avg_home_goal_done),
+        poisson.get_goal_expectancy(away_attack_strength, home_defense_strength, avg_away_goal_done)))
+    return {None: features}, status
+
+
+# KEY: input id (MachineLearningInput.get_input_ids), VALUE: builder of the SeasonFeatures
+builders = {1: build_team_form,
+            2: build_team_home_away_form,
+            3: build_match_statistics,
+            4: build_kekko_input,
+            5: build_poisson_input}
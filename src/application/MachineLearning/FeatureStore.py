@@ -0,0 +1,198 @@
+import os
+import shutil
+import hashlib
+import logging
+import sqlite3
+import zipfile
+
+import numpy as np
+
+import src.util.util as util
+import src.util.Cache as Cache
+import src.util.SQLLite as SQLLite
+import src.util.PersistentCache as PersistentCache
+import src.application.Domain.MatchStore as MatchStore
+from src.application.Exception.MLException import MLException
+
+log = logging.getLogger(__name__)
+
+# Inputs of MachineLearningInput.get_input_to_train stored on disk, shared by the processes (GUI, experiments) and
+# kept across the runs: the same <input, representation, window, domain, season, stage> is built once for all the
+# ML algorithms, windows and experiments using it
+# The inputs are addressed by their parameters and by the data version, a digest of the changes of the tables they are
+# computed from (counted by triggers): when new matches land (or the current time of the run changes the finished
+# ones), the version changes and the inputs are built again
+#
+#   <directory>/<data version>/<digest of the parameters>.npz      arrays of the input, or the code of its MLException
+#
+# The inputs read or written by the process are kept also in the cache (namespace ML_INPUT)
+#
+# directory of the feature store; None if the feature store is disabled
+directory = None
+default_directory = "data/cache/features"
+feature_store_version = 2
+# number of data versions kept on disk (processes with a different current time use different versions)
+max_versions = 4
+# tables the inputs depend on (tables of SQLLite.change_counters)
+version_tables = ("Match", "Match_Incident", "Team", "Team_Attributes")
+# names of the arrays of an input, in the order of get_input_to_train
+input_names = ("matches", "labels", "matches_id", "matches_to_predict", "matches_to_predict_id", "labels_to_predict")
+
+# <<connection, its commits, data version of the DB>, changes of the version tables> of the last read of the changes
+table_changes = None
+
+
+def init_feature_store(feature_directory=None):
+    """
+    Enable the feature store
+    :param feature_directory: relative to the project directory
+    :return: False if the feature store is not available (the changes of the tables cannot be counted)
+    """
+    global directory
+
+    if feature_directory is None:
+        feature_directory = default_directory
+    if not os.path.isabs(feature_directory):
+        feature_directory = util.get_project_directory() + feature_directory
+    try:
+        SQLLite.create_change_counters()
+    except sqlite3.OperationalError as e:
+        log.warning("Feature store not available: " + str(e))
+        return False
+    os.makedirs(feature_directory, exist_ok=True)
+    directory = feature_directory
+    return True
+
+
+def get_key(id, domain, representation, stage, stages_to_train, season):
+    """
+    Return the path of the input with these parameters, with the current data version
+    None if the feature store is disabled
+    :param id:
+    :param domain: league or team
+    :param representation:
+    :param stage:
+    :param stages_to_train:
+    :param season:
+    :return:
+    """
+    if directory is None:
+        return None
+    parameters = repr((id, type(domain).__name__, domain.id, representation, stage, stages_to_train, season))
+    return os.path.join(directory, get_data_version(), hashlib.sha1(parameters.encode()).hexdigest() + ".npz")
+
+
+def get_input(key):
+    """
+    Return the stored input, raising its MLException if the input could not be built
+    Throw a KeyError if the input is not stored
+    :param key:
+    :return:
+    """
+    try:
+        stored_input = Cache.get_element(key, "ML_INPUT")
+    except KeyError:
+        stored_input = Cache.add_element(key, read(key), "ML_INPUT")
+    return to_input(stored_input)
+
+
+def read(key):
+    """
+    Return the arrays of the input on disk, or the code of its MLException
+    Throw a KeyError if the input is not on disk
+    :param key:
+    :return:
+    """
+    try:
+        with np.load(key, allow_pickle=False) as stored_input:
+            if "ml_exception" in stored_input.files:
+                return int(stored_input["ml_exception"])
+            return tuple(stored_input[name] for name in input_names)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        raise KeyError(key)
+
+
+def to_input(stored_input):
+    if isinstance(stored_input, int):
+        raise MLException(stored_input)
+    # the ids are lists (new ones: the callers extend them)
+    matches, labels, matches_id, matches_to_predict, matches_to_predict_id, labels_to_predict = stored_input
+    return matches, labels, matches_id.tolist(), matches_to_predict, matches_to_predict_id.tolist(), labels_to_predict
+
+
+def add_input(key, input_to_train):
+    """
+    Store the input, returning it
+    :param key:
+    :param input_to_train:
+    :return:
+    """
+    arrays = {name: np.asarray(value) for name, value in zip(input_names, input_to_train)}
+    if any(array.dtype.hasobject for array in arrays.values()):
+        # not numeric (dirty data): not stored
+        return input_to_train
+    write(key, arrays)
+    Cache.add_element(key, tuple(arrays[name] for name in input_names), "ML_INPUT")
+    return input_to_train
+
+
+def add_exception(key, ml_exception):
+    """
+    Store the MLException raised building the input
+    :param key:
+    :param ml_exception:
+    :return:
+    """
+    write(key, {"ml_exception": np.asarray(ml_exception.get_code())})
+    Cache.add_element(key, ml_exception.get_code(), "ML_INPUT")
+
+
+def write(key, arrays):
+    version_directory = os.path.dirname(key)
+    try:
+        if not os.path.isdir(version_directory):
+            os.makedirs(version_directory, exist_ok=True)
+            remove_old_versions()
+        # written aside, then renamed: the other processes never read a partial file
+        tmp_path = key + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_path, "wb") as tmp_file:
+            np.savez(tmp_file, **arrays)
+        os.replace(tmp_path, key)
+    except OSError as e:
+        log.warning("Feature store :: input not stored: " + str(e))
+
+
+def remove_old_versions():
+    versions = [os.path.join(directory, name) for name in os.listdir(directory)
+                if os.path.isdir(os.path.join(directory, name))]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for old_version in versions[max_versions:]:
+        shutil.rmtree(old_version, ignore_errors=True)
+
+
+def get_data_version():
+    """
+    Return the version of the data the inputs are computed from: digest of the DB file, of the number of changes of
+    the tables read by the inputs (SQLLite.change_counters) and of the number of finished matches (with the same rows,
+    the finished matches only grow with the current time of the run, so their number tells which ones they are)
+    :return:
+    """
+    connection = SQLLite.get_connection()
+    version = (feature_store_version, PersistentCache.get_data_identity(connection.database_path),
+               get_table_changes(connection), MatchStore.count_finished())
+    return hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+
+
+def get_table_changes(connection):
+    """
+    Return the number of changes of each table of version_tables, read again only if the DB has been written since
+    the last read
+    :param connection:
+    :return:
+    """
+    global table_changes
+
+    key = (connection, connection.n_commits, connection.get_data_version())
+    if table_changes is None or table_changes[0] != key:
+        table_changes = (key, tuple(SQLLite.get_changes(table) for table in version_tables))
+    return table_changes[1]
@@ -5,6 +5,9 @@ import src.application.MachineLearning.input_train.team_home_away_form as team_h
 import src.application.MachineLearning.input_train.match_statistics as match_statistics_input
 import src.application.MachineLearning.input_train.kekko_input as kekko_input
 import src.application.MachineLearning.input_train.poisson as poisson
+import src.application.MachineLearning.FeatureEngine as FeatureEngine
+import src.application.MachineLearning.FeatureStore as FeatureStore
+from src.application.Exception.MLException import MLException
 
 log = logging.getLogger(__name__)
 
@@ -23,7 +26,41 @@ def get_representations(id):
         return []
 
 
-def get_input_to_train(id, domain, representation, stage, stages_to_train, season):
+def get_input_to_train(id, domain, representation, stage, stages_to_train, season, dataset=None):
+    """
+    Return the input to train and to predict with, read from the feature store if it has been already built
+    :param id:
+    :param domain:
+    :param representation:
+    :param stage:
+    :param stages_to_train:
+    :param season:
+    :param dataset: WalkForwardDataset of the previous stages of the season (WalkForwardDataset.get_input_to_train)
+    :return: matches, labels, matches_id, matches_to_predict, matches_to_predict_id, labels_to_predict
+    """
+    key = FeatureStore.get_key(id, domain, representation, stage, stages_to_train, season)
+    if key is None:
+        return build_input_to_train(id, domain, representation, stage, stages_to_train, season, dataset)
+    try:
+        return FeatureStore.get_input(key)
+    except KeyError:
+        pass
+
+    try:
+        input_to_train = build_input_to_train(id, domain, representation, stage, stages_to_train, season, dataset)
+    except MLException as e:
+        FeatureStore.add_exception(key, e)
+        raise
+    return FeatureStore.add_input(key, input_to_train)
+
+
+def build_input_to_train(id, domain, representation, stage, stages_to_train, season, dataset=None):
+    # leagues: slices of the feature matrices of the season
+    input_to_train = FeatureEngine.get_input_to_train(id, domain, representation, stage, stages_to_train, season,
+                                                      dataset)
+    if input_to_train is not None:
+        return input_to_train
+
     if id == 1:
         log.debug("team form")
         return team_form_input.team_form(domain,
@@ -0,0 +1,182 @@
+import logging
+
+import numpy as np
+
+import src.application.Domain.MatchStore as MatchStore
+import src.application.Domain.TrainingWindow as TrainingWindow
+import src.application.MachineLearning.FeatureEngine as FeatureEngine
+import src.application.MachineLearning.MachineLearningInput as MachineLearningInput
+
+log = logging.getLogger(__name__)
+
+# Walk-forward over the stages of a league-season: the training matches of stage S+1 are the ones of stage S, without
+# the oldest stage and with the matches of stage S
+# The rows of the training window are kept in a ring buffer: moving to the next stage evicts the rows of the matches
+# gone out of the window and appends the rows of the new ones (read from the matrices of FeatureEngine), so each step
+# touches only the matches of the stages entering or leaving the window
+# When the window is not the previous one shifted (EX: going back to a previous stage), the buffer is filled again
+#
+# initial number of rows of the ring buffer (doubled when full)
+initial_capacity = 64
+
+
+class WalkForwardDataset(object):
+    """
+    Training set of one input (id, representation, stages to train) for the stages of a league-season
+    """
+    def __init__(self, id, league, representation, stages_to_train, season):
+        self.id = id
+        self.league = league
+        self.representation = representation
+        self.stages_to_train = stages_to_train
+        self.season = season
+        # MatchStore.get_league_version of the matrices the rows are read from
+        self.version = None
+        self.clear()
+
+    def clear(self):
+        """
+        Empty the ring buffer
+        :return:
+        """
+        self.capacity = 0
+        self.start = 0
+        self.size = 0
+        self.features = None
+        self.labels = None
+        self.status = None
+        self.match_ids = None
+        # KEY: match id, VALUE: sequence number of the row (position in the buffer + number of evicted rows)
+        self.sequence_by_id = {}
+        self.n_evicted = 0
+
+    def get_input_to_train(self, stage):
+        """
+        Return the input of the stage, as MachineLearningInput.get_input_to_train
+        :param stage:
+        :return: matches, labels, matches_id, matches_to_predict, matches_to_predict_id, labels_to_predict
+        """
+        return MachineLearningInput.get_input_to_train(self.id, self.league, self.representation, stage,
+                                                       self.stages_to_train, self.season, dataset=self)
+
+    def get_training_input(self, stage):
+        """
+        Move the window to the stage, returning <matches, labels, matches_id> as FeatureEngine.get_training_input
+        None if a match raises an error that is not an MLException
+        :param stage:
+        :return:
+        """
+        version = MatchStore.get_league_version(self.league.id,
+                                                TrainingWindow.get_seasons_until(self.league, self.season))
+        if version != self.version:
+            # the matrices have been computed again
+            self.clear()
+            self.version = version
+
+        representation = self.representation if self.id in (1, 2) else None
+        match_ids = FeatureEngine.get_window(self.league, self.season, stage, self.stages_to_train)
+        n_kept = self.get_overlap(match_ids)
+        self.evict(self.size - n_kept)
+
+        new_rows = FeatureEngine.get_match_features(self.id, self.league, representation, self.stages_to_train,
+                                                    self.season, match_ids[n_kept:])
+        if new_rows is None:
+            self.clear()
+            return None
+        self.append(match_ids[n_kept:], *new_rows)
+        if self.size == 0:
+            return np.asarray([]), np.asarray([]), []
+
+        positions = (self.start + np.arange(self.size)) % max(self.capacity, 1)
+        status = self.status[positions]
+        if np.any(status == FeatureEngine.failed):
+            return None
+        positions = positions[status == FeatureEngine.valid]
+        return self.features[positions], self.labels[positions], self.match_ids[positions].tolist()
+
+    def get_overlap(self, match_ids):
+        """
+        Return the number of rows of the buffer that are the first matches of the new window (the rows before them
+        are evicted), 0 if the new window does not continue the buffer
+        :param match_ids:
+        :return:
+        """
+        if self.size == 0 or len(match_ids) == 0:
+            return 0
+        # the window of the previous stage continues in the new one from the row of its first match
+        try:
+            first = self.sequence_by_id[int(match_ids[0])] - self.n_evicted
+        except KeyError:
+            return 0
+        n_kept = min(self.size - first, len(match_ids))
+        positions = (self.start + first + np.arange(n_kept)) % self.capacity
+        if first + n_kept != self.size or not np.array_equal(self.match_ids[positions], match_ids[:n_kept]):
+            return 0
+        return n_kept
+
+    def evict(self, n):
+        """
+        Remove the n oldest rows
+        :param n:
+        :return:
+        """
+        if n <= 0:
+            return
+        positions = (self.start + np.arange(n)) % self.capacity
+        for match_id in self.match_ids[positions].tolist():
+            del self.sequence_by_id[match_id]
+        self.start = (self.start + n) % self.capacity
+        self.size -= n
+        self.n_evicted += n
+
+    def append(self, match_ids, features, labels, status):
+        """
+        Add the rows after the last one
+        :param match_ids:
+        :param features:
+        :param labels:
+        :param status:
+        :return:
+        """
+        n = len(match_ids)
+        if n == 0:
+            return
+        if self.features is None or self.size + n > self.capacity or features.dtype != self.features.dtype:
+            self.grow(self.size + n, features)
+        positions = (self.start + self.size + np.arange(n)) % self.capacity
+        self.features[positions] = features
+        self.labels[positions] = labels
+        self.status[positions] = status
+        self.match_ids[positions] = match_ids
+        sequence = self.n_evicted + self.size
+        for i, match_id in enumerate(match_ids.tolist()):
+            self.sequence_by_id[match_id] = sequence + i
+        self.size += n
+
+    def grow(self, size, features):
+        """
+        Allocate a buffer of at least size rows, moving the current rows at its beginning
+        :param size:
+        :param features: new rows (for the number of features and the type)
+        :return:
+        """
+        capacity = max(self.capacity, initial_capacity)
+        while capacity < size:
+            capacity *= 2
+        positions = (self.start + np.arange(self.size)) % max(self.capacity, 1)
+
+        dtype = features.dtype if self.features is None else np.result_type(features, self.features)
+        new_features = np.zeros((capacity,) + features.shape[1:], dtype=dtype)
+        new_labels = np.zeros(capacity, dtype=np.int64)
+        new_status = np.zeros(capacity, dtype=np.int8)
+        new_match_ids = np.zeros(capacity, dtype=np.int64)
+        if self.size > 0:
+            new_features[:self.size] = self.features[positions]
+            new_labels[:self.size] = self.labels[positions]
+            new_status[:self.size] = self.status[positions]
+            new_match_ids[:self.size] = self.match_ids[positions]
+
+        self.features, self.labels, self.status, self.match_ids = new_features, new_labels, new_status, new_match_ids
+        self.capacity = capacity
+        self.start = 0
+
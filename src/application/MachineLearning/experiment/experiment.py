@@ -3,6 +3,7 @@ import warnings
 import src.util.util as util
 import src.application.MachineLearning.MachineLearningAlgorithm as mla
 import src.application.MachineLearning.MachineLearningInput as mli
+import src.application.MachineLearning.FeatureStore as FeatureStore
 from src.application.MachineLearning.prediction_accuracy.prediction_accuracy import PredictionAccuracy
 from src.application.MachineLearning.experiment.experiment_plot import PlotExperiment
 
@@ -29,6 +30,10 @@ class Experiment(object):
         self.experiment_dir = util.get_project_directory()+"data/experiments/"+self.id
         os.makedirs(self.experiment_dir,exist_ok=True)
 
+        # the experiments build the same inputs for every ML algorithm and window
+        if FeatureStore.directory is None:
+            FeatureStore.init_feature_store()
+
     def run(self, league, complete=True, **params):
         if self.type == 0:
             import src.application.MachineLearning.experiment.experiment_0 as exp_0
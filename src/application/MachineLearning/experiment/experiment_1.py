@@ -1,6 +1,7 @@
 import src.util.util as util
 import src.application.MachineLearning.experiment.experiment as experiment
 from src.application.MachineLearning.prediction_accuracy.prediction_accuracy import PredictionAccuracy
+import src.application.MachineLearning.prediction_accuracy.Backtest as Backtest
 
 
 def run_experiment_1(exp, league, ml_train_input_id, ml_train_input_representation, **params):
@@ -17,23 +18,31 @@ def run_experiment_1(exp, league, ml_train_input_id, ml_train_input_representati
     average_accuracy = dict()
     match_predicted = dict()
     for only_team_history in [True, False]:
+        # the seasons of all the windows are computed together
+        prediction_accuracies = dict()
         for n_matches in ml_train_stages_to_train:
             params["ml_train_stages_to_train"] = n_matches
-
-            curr_denominator = 0
-            curr_execution_time = 0
-            curr_average_accuracy = 0
+            prediction_accuracies[n_matches] = []
 
             for season in league.get_seasons():
                 if season == util.get_current_season():
                     break
 
-                print(season, n_matches)
-
                 params["season"] = season
+                prediction_accuracies[n_matches].append(PredictionAccuracy(league,
+                                                                           only_team_history=only_team_history,
+                                                                           **params))
+        Backtest.compute([pa for n_matches in ml_train_stages_to_train for pa in prediction_accuracies[n_matches]])
+
+        for n_matches in ml_train_stages_to_train:
+            params["ml_train_stages_to_train"] = n_matches
+
+            curr_denominator = 0
+            curr_execution_time = 0
+            curr_average_accuracy = 0
 
-                pa = PredictionAccuracy(league, only_team_history=only_team_history, **params)
-                pa.compute_prediction_accuracy()
+            for pa in prediction_accuracies[n_matches]:
+                print(pa.season, n_matches)
 
                 print("Average accuracy:", pa.get_average_accuracy())
                 print("Match predicted:", pa.get_match_predicted())
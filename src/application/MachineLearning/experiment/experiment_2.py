@@ -2,6 +2,7 @@ import src.util.util as util
 import src.application.MachineLearning.experiment.experiment as experiment
 from src.application.MachineLearning.prediction_accuracy.prediction_accuracy import PredictionAccuracy
 import src.application.MachineLearning.MachineLearningAlgorithm as mla
+import src.application.MachineLearning.prediction_accuracy.Backtest as Backtest
 
 
 class entry(object):
@@ -66,6 +67,8 @@ def run_experiment_2(exp, league, ml_train_input_id, ml_train_input_representati
                 break
 
             params["season"] = season
+            # the frameworks and the methods of the season are computed together
+            prediction_accuracies = []
             for f in mla.get_frameworks():
 
                 if ml_train_input_id not in mla.get_inputs_by_framework(f):
@@ -77,8 +80,7 @@ def run_experiment_2(exp, league, ml_train_input_id, ml_train_input_representati
 
                     params["ml_alg_framework"] = f
                     pa = PredictionAccuracy(league, only_team_history=False, **params)
-                    pa.compute_prediction_accuracy()
-                    plot_entries[n_matches].add_accuracy(f, None, pa.get_average_accuracy(), pa.get_match_predicted(), pa.get_execution_time())
+                    prediction_accuracies.append((f, None, pa))
 
                 for m in mla.get_methods_by_framework(f):
                     # framework can be used in different manner (ex. SKlearn)
@@ -87,10 +89,13 @@ def run_experiment_2(exp, league, ml_train_input_id, ml_train_input_representati
                     params["ml_alg_method"]=m
                     params["ml_alg_framework"]=f
                     pa = PredictionAccuracy(league, only_team_history=False, **params)
-                    pa.compute_prediction_accuracy()
-                    plot_entries[n_matches].add_accuracy(f, m, pa.get_average_accuracy(), pa.get_match_predicted(),
-                                                         pa.get_execution_time())
+                    prediction_accuracies.append((f, m, pa))
+            Backtest.compute([pa for f, m, pa in prediction_accuracies])
 
+            for f, m, pa in prediction_accuracies:
+                plot_entries[n_matches].add_accuracy(f, m, pa.get_average_accuracy(), pa.get_match_predicted(),
+                                                     pa.get_execution_time())
+                if m:
                     print(plot_entries[n_matches])
 
             report = open(exp.experiment_dir+"/report_"+str(ml_train_input_id)+"_"
@@ -2,6 +2,7 @@ import src.util.util as util
 import src.application.MachineLearning.experiment.experiment as experiment
 import src.application.MachineLearning.MachineLearningAlgorithm as mla
 from src.application.MachineLearning.prediction_accuracy.prediction_accuracy import PredictionAccuracy
+import src.application.MachineLearning.prediction_accuracy.Backtest as Backtest
 
 
 def run_experiment_3(exp, league, ml_train_input_id, ml_train_input_representation, ml_train_stages_to_train):
@@ -30,16 +31,19 @@ def run_experiment_3(exp, league, ml_train_input_id, ml_train_input_representati
                     curr_execution_time = 0
                     curr_average_accuracy = 0
 
+                    # the seasons are computed together
+                    prediction_accuracies = []
                     for season in league.get_seasons():
                         if season == util.get_current_season():
                             break
 
-                        print(season, only_team_history, ml_alg_framework, ml_alg_method)
-
                         params["season"] = season
+                        prediction_accuracies.append(PredictionAccuracy(league, only_team_history=only_team_history,
+                                                                        **params))
+                    Backtest.compute(prediction_accuracies)
 
-                        pa = PredictionAccuracy(league, only_team_history=only_team_history, **params)
-                        pa.compute_prediction_accuracy()
+                    for pa in prediction_accuracies:
+                        print(pa.season, only_team_history, ml_alg_framework, ml_alg_method)
 
                         print("Average accuracy:", pa.get_average_accuracy())
                         print("Match predicted:", pa.get_match_predicted())
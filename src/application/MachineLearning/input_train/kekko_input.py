@@ -43,7 +43,7 @@ def kekko_input(domain,
         except MLException:
             continue
 
-    for match in [m for m in domain.get_matches(season=season) if m.stage == stage_to_predict]:
+    for match in domain.get_matches(season=season, stage=stage_to_predict):
         home_team = match.get_home_team()
         away_team = match.get_away_team()
 
@@ -117,22 +117,8 @@ def transform_tren(trend_str):
 
 def get_classifica(league, team, season, stage_to_predict, stages_to_train):
 
-    pos = 1
-    for points_i, team_i in league.get_training_ranking(season, stage_to_predict, stages_to_train):
-        if team.id == team_i.id:
-            break
-        pos += 1
-
-    home_pos = 1
-    for points_i, team_i in league.get_training_ranking(season, stage_to_predict, stages_to_train, home=True):
-        if team.id == team_i.id:
-            break
-        home_pos += 1
-
-    away_pos = 1
-    for points_i, team_i in league.get_training_ranking(season, stage_to_predict, stages_to_train, home=False):
-        if team.id == team_i.id:
-            break
-        away_pos += 1
+    pos = league.get_training_position(team, season, stage_to_predict, stages_to_train)
+    home_pos = league.get_training_position(team, season, stage_to_predict, stages_to_train, home=True)
+    away_pos = league.get_training_position(team, season, stage_to_predict, stages_to_train, home=False)
 
     return [pos, home_pos, away_pos]
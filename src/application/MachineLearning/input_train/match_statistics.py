@@ -28,7 +28,7 @@ def match_statistics(domain,
             continue
 
     # match to predict
-    for match in [m for m in domain.get_matches(season=season) if m.stage == stage_to_predict]:
+    for match in domain.get_matches(season=season, stage=stage_to_predict):
         try:
             matches_to_predict.append(get_match_as_array(match, stages_to_train))
             labels_to_predict.append(MLUtil.get_label(match))
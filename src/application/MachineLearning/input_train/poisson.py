@@ -26,7 +26,7 @@ def poisson_input(league,
     matches_id, matches_to_predict_id = [], []
 
     # set to be predicted
-    for match in [m for m in league.get_matches(season=season) if m.stage == stage_to_predict]:
+    for match in league.get_matches(season=season, stage=stage_to_predict):
         try:
             matches_to_predict.append(np.asarray(get_match_as_array(league, match, stages_to_train)))
             matches_to_predict_id.append(match.id)
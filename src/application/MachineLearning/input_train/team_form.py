@@ -36,7 +36,7 @@ def team_form(domain,
         except MLException:
             continue
 
-    for match in [m for m in domain.get_matches(season=season) if m.stage == stage_to_predict]:
+    for match in domain.get_matches(season=season, stage=stage_to_predict):
         try:
             matches_to_predict.append(get_team_form(match, stages_to_train, representation))
             matches_to_predict_id.append(match.id)
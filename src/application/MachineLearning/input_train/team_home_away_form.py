@@ -36,7 +36,7 @@ def team_home_away_form(league_or_team,
             continue
 
     # match to predict
-    for match in [m for m in league_or_team.get_matches(season=season) if m.stage == stage_to_predict]:
+    for match in league_or_team.get_matches(season=season, stage=stage_to_predict):
         try:
             matches_to_predict.append(get_home_away_team_form(match, stages_to_train, representation))
             matches_to_predict_id.append(match.id)
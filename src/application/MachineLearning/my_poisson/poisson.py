@@ -1,14 +1,27 @@
+import math
 import logging
 import numpy as np
 
-from numpy.random import poisson
-
 from src.application.MachineLearning.MachineLearningAlgorithm import MachineLearningAlgorithm
-from src.application.Exception.MLException import MLException
 import src.util.util as util
 
 log = logging.getLogger(__name__)
 
+# The goals of each team are Poisson distributed (the input is the pair of goal expectancies of a match): the
+# probabilities of the scorelines are the products of the probability mass functions of the two teams, computed in
+# closed form for all the matches at once
+#   scorelines[match, home goals, away goals]
+# 1 (home win) is the lower triangle of the scoreline matrix, X the diagonal, 2 the upper triangle
+#
+# labels of the events, in the order of the columns of the event probabilities (on ties the first one is predicted)
+event_labels = (1, 0, 2)
+# minimum number of goals of the scoreline matrices; it grows with the expectancies, so that the probability of the
+# goals left out is negligible (below the poisson tail of expectancy + tail_deviations standard deviations)
+max_goals = 10
+tail_deviations = 10
+# goal line of the over/under probabilities
+default_goal_line = 2.5
+
 
 class Poisson(MachineLearningAlgorithm):
     def __init__(self, **params):
@@ -21,7 +34,7 @@ class Poisson(MachineLearningAlgorithm):
                                           [])
         self.params = params
 
-        self.number_sample = util.get_default(params, "poisson_n_sample", 10000)
+        self.max_goals = util.get_default(params, "poisson_max_goals", max_goals)
 
     def train(self,):
         pass
@@ -39,65 +52,144 @@ class Poisson(MachineLearningAlgorithm):
         return self.post_score(predicted_labels, probability_events)
 
     def predict(self, data):
-
-        predicted_labels = []
-        probability_events = []
-
-        for exp in data:
-            outcomes_0 = poisson(exp[0], self.number_sample)
-            outcomes_1 = poisson(exp[1], self.number_sample)
-
-            prob_dist_0 = get_probability(outcomes_0)
-            prob_dist_1 = get_probability(outcomes_1)
-
-            event_prob = get_event_probability(prob_dist_0, prob_dist_1)
-            predicted_label, prob = predict(event_prob)
-
-            predicted_labels.append(predicted_label)
-            probability_events.append(prob)
-
+        """
+        Return the most probable event of each match (1, 0 or 2) and its probability
+        :param data: goal expectancies <home, away> of the matches
+        :return:
+        """
+        event_prob = get_event_probabilities(self.get_scoreline_probabilities(data))
+        best_events = np.argmax(event_prob, axis=1)
+
+        predicted_labels = [event_labels[event] for event in best_events.tolist()]
+        probability_events = event_prob[np.arange(len(best_events)), best_events].tolist()
         return predicted_labels, probability_events
 
-
-def predict(event_prob):
-    p_max = 0
-    label = None
-
-    for event_outcome, prob in event_prob.items():
-        if prob > p_max:
-            p_max = prob
-            label = event_outcome
-
-    return label, p_max
-
-
-def get_probability(outcomes):
-    outcome_counter = dict()
-    count = 0
-    for outcome in outcomes:
-        count += 1
-        try:
-            outcome_counter[outcome] += 1
-        except KeyError:
-            outcome_counter[outcome] = 1
-
-    res = dict()
-    for k,v in outcome_counter.items():
-        res[k] = v/count
-    return res
-
-
-def get_event_probability(g1_prob, g2_prob):
-    prob_1 = 0
-    prob_X = 0
-    prob_2 = 0
-    for hg, phg in g1_prob.items():
-        for ag, pag in g2_prob.items():
-            if hg > ag:
-                prob_1 += phg*pag
-            elif hg < ag:
-                prob_2 += phg*pag
-            else:
-                prob_X += phg * pag
-
-    return {1:prob_1, 0:prob_X, 2:prob_2}
+    def get_scoreline_probabilities(self, data):
+        """
+        Return the probabilities of the scorelines of the matches: matrix matches x home goals x away goals
+        :param data: goal expectancies <home, away> of the matches
+        :return:
+        """
+        expectancies = get_expectancies(data)
+        return get_scoreline_probabilities(expectancies[:, 0], expectancies[:, 1], self.max_goals)
+
+    def get_event_probabilities(self, data):
+        """
+        Return the probabilities of the events of the matches: matrix matches x events (event_labels)
+        :param data: goal expectancies <home, away> of the matches
+        :return:
+        """
+        return get_event_probabilities(self.get_scoreline_probabilities(data))
+
+    def get_over_under_probabilities(self, data, goal_line=default_goal_line):
+        """
+        Return the probabilities of more and of less goals than the goal line, for each match
+        :param data: goal expectancies <home, away> of the matches
+        :param goal_line:
+        :return: <over probabilities, under probabilities>
+        """
+        return get_over_under_probabilities(self.get_scoreline_probabilities(data), goal_line)
+
+    def get_both_teams_to_score_probabilities(self, data):
+        """
+        Return the probability that both the teams score, for each match
+        :param data: goal expectancies <home, away> of the matches
+        :return:
+        """
+        return get_both_teams_to_score_probabilities(self.get_scoreline_probabilities(data))
+
+
+def get_expectancies(data):
+    """
+    Return the goal expectancies as a matrix matches x 2
+    :param data:
+    :return:
+    """
+    expectancies = np.asarray(data, dtype=np.float64).reshape(-1, 2)
+    if not np.all(expectancies >= 0):
+        # as numpy.random.poisson
+        raise ValueError("poisson: goal expectancy < 0 or nan")
+    return expectancies
+
+
+def get_n_goals(expectancies, min_goals=max_goals):
+    """
+    Return the number of goals of the scoreline matrices (goals 0..n_goals - 1) for these expectancies
+    :param expectancies:
+    :param min_goals:
+    :return:
+    """
+    if len(expectancies) == 0:
+        return min_goals + 1
+    max_expectancy = float(np.max(expectancies))
+    return max(min_goals, int(math.ceil(max_expectancy + tail_deviations * (math.sqrt(max_expectancy) + 1)))) + 1
+
+
+def get_goal_probabilities(expectancies, n_goals):
+    """
+    Return the Poisson probability mass function of the goals 0..n_goals - 1: matrix teams x goals
+    :param expectancies:
+    :param n_goals:
+    :return:
+    """
+    goals = np.arange(n_goals)
+    log_factorials = np.concatenate(([0.], np.cumsum(np.log(np.arange(1, n_goals)))))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_pmf = goals * np.log(expectancies)[:, None] - expectancies[:, None] - log_factorials
+    # 0 goals (also with expectancy 0)
+    log_pmf[:, 0] = -expectancies
+    return np.exp(log_pmf)
+
+
+def get_scoreline_probabilities(home_expectancies, away_expectancies, min_goals=max_goals):
+    """
+    Return the probabilities of the scorelines: matrix matches x home goals x away goals
+    :param home_expectancies:
+    :param away_expectancies:
+    :param min_goals:
+    :return:
+    """
+    home_expectancies = np.asarray(home_expectancies, dtype=np.float64)
+    away_expectancies = np.asarray(away_expectancies, dtype=np.float64)
+    n_goals = get_n_goals(np.concatenate((home_expectancies, away_expectancies)), min_goals)
+    home_goals = get_goal_probabilities(home_expectancies, n_goals)
+    away_goals = get_goal_probabilities(away_expectancies, n_goals)
+    return home_goals[:, :, None] * away_goals[:, None, :]
+
+
+def get_event_probabilities(scorelines):
+    """
+    Return the probabilities of the events: matrix matches x events (event_labels)
+    :param scorelines: matrix matches x home goals x away goals
+    :return:
+    """
+    n_goals = scorelines.shape[1]
+    home_goals, away_goals = np.indices((n_goals, n_goals))
+    prob_1 = np.sum(scorelines, axis=(1, 2), where=home_goals > away_goals)
+    prob_X = np.trace(scorelines, axis1=1, axis2=2)
+    # summed as the lower triangle of the transposed matrices: equal expectancies give exactly equal 1 and 2
+    prob_2 = np.sum(scorelines.transpose(0, 2, 1), axis=(1, 2), where=home_goals > away_goals)
+    return np.stack((prob_1, prob_X, prob_2), axis=1)
+
+
+def get_over_under_probabilities(scorelines, goal_line=default_goal_line):
+    """
+    Return the probabilities of more and of less goals than the goal line
+    :param scorelines: matrix matches x home goals x away goals
+    :param goal_line:
+    :return: <over probabilities, under probabilities>
+    """
+    n_goals = scorelines.shape[1]
+    home_goals, away_goals = np.indices((n_goals, n_goals))
+    over = np.sum(scorelines, axis=(1, 2), where=home_goals + away_goals > goal_line)
+    under = np.sum(scorelines, axis=(1, 2), where=home_goals + away_goals < goal_line)
+    return over, under
+
+
+def get_both_teams_to_score_probabilities(scorelines):
+    """
+    Return the probability that both the teams score
+    :param scorelines: matrix matches x home goals x away goals
+    :return:
+    """
+    return np.sum(scorelines[:, 1:, 1:], axis=(1, 2))
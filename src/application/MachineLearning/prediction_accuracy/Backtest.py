@@ -0,0 +1,174 @@
+import os
+import copy
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import src.util.util as util
+import src.util.Cache as Cache
+import src.util.IncidentParser as IncidentParser
+import src.application.Domain.MatchStore as MatchStore
+import src.application.MachineLearning.FeatureEngine as FeatureEngine
+from src.application.Exception.MLException import MLException
+
+log = logging.getLogger(__name__)
+
+# Backtest of many PredictionAccuracy (seasons, windows, algorithms of an experiment) over a pool of processes
+# Each PredictionAccuracy is split in tasks of consecutive stages (so the walk-forward training set of a task moves
+# forward stage by stage), computed by the workers and merged back in the order of the stages: the statistics are
+# the ones of compute_prediction_accuracy, whatever the number of workers
+# The workers are forked: the MatchStore, the memory-mapped historical store and the cache (with the feature matrices
+# computed before the fork) are shared copy-on-write, not rebuilt by each worker
+#
+# number of worker processes (None: one for each CPU, 1: no pool)
+n_workers = None
+# number of stages of each task
+stages_by_task = 5
+
+# PredictionAccuracy of the running backtest and its tasks <index of the PredictionAccuracy, stages>, read by the
+# forked workers
+prediction_accuracies_to_compute = []
+tasks = []
+
+
+def compute(prediction_accuracies, workers=None):
+    """
+    Compute the prediction accuracy of each PredictionAccuracy, as compute_prediction_accuracy
+    :param prediction_accuracies:
+    :param workers: number of worker processes (default n_workers)
+    :return: the PredictionAccuracy
+    """
+    global prediction_accuracies_to_compute, tasks
+
+    if workers is None:
+        workers = n_workers if n_workers is not None else (os.cpu_count() or 1)
+    if "fork" not in multiprocessing.get_all_start_methods():
+        # the workers would not share the data of this process
+        workers = 1
+
+    prediction_accuracies = list(prediction_accuracies)
+    backtest_tasks = get_tasks(prediction_accuracies)
+    workers = min(workers, len(backtest_tasks))
+    if workers <= 1:
+        with util.pinned_now():
+            for pa in prediction_accuracies:
+                pa.compute_prediction_accuracy()
+        return prediction_accuracies
+
+    # the matches finished are the same for the warm-up and for all the workers
+    with util.pinned_now():
+        warm_up(prediction_accuracies)
+        prediction_accuracies_to_compute = prediction_accuracies
+        tasks = backtest_tasks
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                     initializer=init_worker, initargs=(os.getpid(),)) as executor:
+                results = list(executor.map(compute_task, range(len(tasks))))
+        finally:
+            prediction_accuracies_to_compute = []
+            tasks = []
+
+    for index, pa in enumerate(prediction_accuracies):
+        merge(pa, [result for (pa_index, stages), result in zip(backtest_tasks, results) if pa_index == index])
+    return prediction_accuracies
+
+
+def get_tasks(prediction_accuracies):
+    """
+    Split the stages of each PredictionAccuracy in chunks of stages_by_task stages
+    :param prediction_accuracies:
+    :return: list of <index of the PredictionAccuracy, stages>
+    """
+    backtest_tasks = []
+    for index, pa in enumerate(prediction_accuracies):
+        stages = list(pa.stages)
+        for i in range(0, len(stages), max(stages_by_task, 1)):
+            backtest_tasks.append((index, stages[i:i + stages_by_task]))
+    return backtest_tasks
+
+
+def warm_up(prediction_accuracies):
+    """
+    Compute in this process the feature matrices of the seasons in the training windows, so that the workers inherit
+    them instead of computing them each one
+    :param prediction_accuracies:
+    :return:
+    """
+    computed = set()
+    for pa in prediction_accuracies:
+        if pa.only_team_history or len(pa.stages) == 0:
+            continue
+        key = (pa.ml_train_input_id, pa.league.id, pa.season, pa.ml_train_stages_to_train)
+        if key in computed or pa.ml_train_input_id not in FeatureEngine.builders:
+            continue
+        computed.add(key)
+        representation = pa.representation if pa.ml_train_input_id in (1, 2) else None
+        # the windows of the first stage and of the last one span the seasons of all the windows
+        for stage in (pa.stages[0], pa.stages[-1]):
+            try:
+                match_ids = FeatureEngine.get_window(pa.league, pa.season, stage, pa.ml_train_stages_to_train)
+                FeatureEngine.get_match_features(pa.ml_train_input_id, pa.league, representation,
+                                                 pa.ml_train_stages_to_train, pa.season, match_ids)
+            except MLException:
+                continue
+
+
+def init_worker(parent_pid):
+    """
+    Initializer of the worker processes: use the MatchStore of the parent
+    :param parent_pid:
+    :return:
+    """
+    MatchStore.inherit_match_store(parent_pid)
+
+
+def compute_task(task_index):
+    """
+    Compute the prediction accuracy of the stages of the task (in a worker)
+    :param task_index:
+    :return: <accuracy by stage, accuracy by team, number of predicted matches, execution time>
+    """
+    index, stages = tasks[task_index]
+    pa = copy.copy(prediction_accuracies_to_compute[index])
+    pa.stages = stages
+    pa.n_predicted_match = 0
+    pa.accuracy_by_team_dic = dict()
+    pa.accuracy_by_stage_dic = {x: 0 for x in stages}
+    try:
+        pa.compute_prediction_accuracy()
+    finally:
+        # the workers end without running the exit handlers: what they parsed and cached is written now
+        IncidentParser.flush()
+        Cache.flush()
+    return pa.accuracy_by_stage_dic, pa.accuracy_by_team_dic, pa.n_predicted_match, pa.finish_time
+
+
+def merge(pa, results):
+    """
+    Set the statistics of the PredictionAccuracy from the results of its tasks, in the order of the stages
+    :param pa:
+    :param results:
+    :return:
+    """
+    start_time = time.time()
+    accuracy_by_stage_dic = dict()
+    pa.accuracy_by_team_dic = dict()
+    pa.n_predicted_match = 0
+    pa.finish_time = 0
+    for task_accuracy_by_stage, task_accuracy_by_team, n_predicted_match, finish_time in results:
+        accuracy_by_stage_dic.update(task_accuracy_by_stage)
+        pa.n_predicted_match += n_predicted_match
+        pa.finish_time += finish_time
+        for team_name, task_team_accuracy in task_accuracy_by_team.items():
+            try:
+                team_accuracy = pa.accuracy_by_team_dic[team_name]
+            except KeyError:
+                pa.accuracy_by_team_dic[team_name] = task_team_accuracy
+                continue
+            team_accuracy.n_succesfull_predicted_label += task_team_accuracy.n_succesfull_predicted_label
+            team_accuracy.n_predicted_game += task_team_accuracy.n_predicted_game
+            team_accuracy.result_played_games.extend(task_team_accuracy.result_played_games)
+    pa.accuracy_by_stage_dic = {stage: accuracy_by_stage_dic[stage] for stage in pa.stages
+                                if stage in accuracy_by_stage_dic}
+    pa.finish_time += time.time() - start_time
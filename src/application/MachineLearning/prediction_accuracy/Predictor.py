@@ -2,7 +2,7 @@ import src.util.util as util
 import src.util.Cache as Cache
 import src.util.MLUtil as MLUtil
 import src.application.MachineLearning.MachineLearningAlgorithm as mla
-import src.application.MachineLearning.MachineLearningInput as mli
+from src.application.MachineLearning.WalkForwardDataset import WalkForwardDataset
 import src.application.Domain.Match as Match
 import src.application.Domain.Team as Team
 import heapq
@@ -25,6 +25,8 @@ class Predictor(object):
 
         # KEY: LEAGUE ID;  VALUE: <MATCH ID: <pred, prob>>
         self.predictions = dict()
+        # KEY: <LEAGUE ID, SEASON>;  VALUE: WalkForwardDataset
+        self.datasets = dict()
         Cache.add_element(key, self, "PREDICTOR_BY_KEY")
 
     def get_predictor_key(self):
@@ -58,12 +60,7 @@ class Predictor(object):
 
         try:
             matches, labels, matches_id, matches_to_predict, matches_to_predict_id, labels_to_predict = \
-                mli.get_input_to_train(self.ml_train_input_id,
-                                       league,
-                                       self.ml_train_input_representation,
-                                       stage,
-                                       self.ml_train_stages_to_train,
-                                       season)
+                self.get_dataset(league, season).get_input_to_train(stage)
 
             ml_alg = mla.get_machine_learning_algorithm(self.ml_alg_framework,
                                                         self.ml_alg_method,
@@ -84,6 +81,25 @@ class Predictor(object):
         except Exception as e:
             return {}
 
+    def get_dataset(self, league, season):
+        """
+        Return the training set of the league-season, moved forward stage by stage
+        :param league:
+        :param season:
+        :return:
+        """
+        try:
+            return self.datasets[(league.id, season)]
+        except KeyError:
+            pass
+        dataset = WalkForwardDataset(self.ml_train_input_id,
+                                     league,
+                                     self.ml_train_input_representation,
+                                     self.ml_train_stages_to_train,
+                                     season)
+        self.datasets[(league.id, season)] = dataset
+        return dataset
+
     def get_best_team_predicted(self, league, season, stage, n_teams_returned=3):
 
         best_teams = dict()
@@ -119,8 +135,10 @@ class Predictor(object):
         for team_api_id, accuracy in best_teams.items():
             heapq.heappush(h, (accuracy, team_api_id))
 
-        top_k = [Team.read_by_team_api_id(team_api_id) for a, team_api_id
-                 in heapq.nlargest(n_teams_returned, h, lambda x: x[0])[:n_teams_returned]]
+        top_k_api_id = [team_api_id for a, team_api_id
+                        in heapq.nlargest(n_teams_returned, h, lambda x: x[0])[:n_teams_returned]]
+        teams_by_api_id = Team.read_many_by_api_ids(top_k_api_id)
+        top_k = [teams_by_api_id.get(team_api_id) for team_api_id in top_k_api_id]
         return top_k
 
 
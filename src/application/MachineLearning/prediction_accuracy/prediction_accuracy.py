@@ -4,6 +4,7 @@ import time
 import src.application.Domain.Match as Match
 import src.application.MachineLearning.MachineLearningInput as MLInput
 import src.application.MachineLearning.MachineLearningAlgorithm as MachineLearningAlgorithm
+from src.application.MachineLearning.WalkForwardDataset import WalkForwardDataset
 import src.util.util as util
 
 import numpy as np
@@ -107,6 +108,12 @@ class PredictionAccuracy(object):
 
     def compute_prediction_accuracy(self):
         start_time = time.time()
+        # training set of the league, moved forward stage by stage
+        dataset = WalkForwardDataset(self.ml_train_input_id,
+                                     self.league,
+                                     self.representation,
+                                     self.ml_train_stages_to_train,
+                                     self.season)
         for stage in self.stages:
             if self.only_team_history:
                 # train ml algorithm only with past mathces of teams
@@ -166,12 +173,7 @@ class PredictionAccuracy(object):
                         self.matches_id, \
                         self.matches_to_predict, \
                         self.matches_to_predict_id, \
-                        self.labels_to_predict = MLInput.get_input_to_train(self.ml_train_input_id,
-                                                                            self.league,
-                                                                            self.representation,
-                                                                            stage,
-                                                                            stages_to_train=self.ml_train_stages_to_train,
-                                                                            season=self.season)
+                        self.labels_to_predict = dataset.get_input_to_train(stage)
                     accuracy = self.train_predict(stage)
 
                     self.accuracy_by_stage_dic[stage] = accuracy
@@ -1,6 +1,7 @@
 import src.util.util as util
 import src.util.GuiUtil as GuiUtil
 import src.application.Domain.Match as Match
+import src.application.Domain.Team as Team
 import src.application.MachineLearning.prediction_accuracy.Predictor as Predictor
 
 def run():
@@ -35,6 +36,7 @@ def run():
 def print_bet_odds(date):
     GuiUtil.print_info("Bet odds of", date)
     matches = Match.read_by_match_date(date, order_by_date=True)
+    Team.read_teams_of_matches(matches)
     pi = 1
     for match in matches:
         match_event_out = get_match_event_out(match)
@@ -85,6 +85,7 @@ def search_by_league():
     elif len(leagues) == 1:
         league = leagues[0]
         matches = league.get_matches(season=util.get_current_season(), ordered=True)
+        Team.read_teams_of_matches(matches)
         for i, match in enumerate(matches):
             match_out = get_printable_match(match)
             GuiUtil.print_indent_answer(i + 1, match_out, True)
@@ -92,6 +93,7 @@ def search_by_league():
 
 def get_printable_matches(matches):
     printable_matches = []
+    Team.read_teams_of_matches(matches)
     for m in matches:
         printable_matches.append(get_printable_match(m))
     return printable_matches
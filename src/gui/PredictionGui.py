@@ -3,6 +3,7 @@ import src.util.GuiUtil as GuiUtil
 import src.util.util as util
 
 import src.application.Domain.Match as Match
+import src.application.Domain.Team as Team
 import src.application.Exception.MLException as MLException
 import src.application.MachineLearning.MachineLearningAlgorithm as mla
 import src.application.MachineLearning.MachineLearningInput as mli
@@ -180,6 +181,7 @@ def predict_by_date():
         GuiUtil.print_att("No match found in date", date)
     else:
         GuiUtil.print_ans("Prediction by date", date)
+        Team.read_teams_of_matches(matches)
         pi = 1
         for match in matches:
             if not match.is_finished():
@@ -1,5 +1,6 @@
 import sys
 import os
+import atexit
 import argparse
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -7,6 +8,10 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import src.gui.MainGui as MainGui
 import src.util.util as util
 import src.util.SQLLite as SQLLite
+import src.util.Cache as Cache
+import src.util.IndexAdvisor as IndexAdvisor
+import src.application.Domain.HistoricalStore as HistoricalStore
+import src.application.MachineLearning.FeatureStore as FeatureStore
 import src.application.Crawl.Crawl as Crawl
 import src.application.MachineLearning.prediction_accuracy.Predictor as Predictor
 
@@ -23,16 +28,56 @@ if __name__ == "__main__":
                         help='do not index on the start up of the application')
     parser.set_defaults(do_index=True)
 
+    # --no-persistent-cache
+    parser.add_argument('--no-persistent-cache', dest='persistent_cache', action='store_false',
+                        help='do not read and write the cache on disk')
+    parser.set_defaults(persistent_cache=True)
+
+    # --historical-store
+    parser.add_argument('--historical-store', dest='historical_store', action='store_true',
+                        help='read the matches of the past seasons from memory-mapped files')
+    parser.set_defaults(historical_store=False)
+
+    # --no-feature-store
+    parser.add_argument('--no-feature-store', dest='feature_store', action='store_false',
+                        help='do not read and write the inputs of the ML algorithms on disk')
+    parser.set_defaults(feature_store=True)
+
+    # --now
+    parser.add_argument('--now', dest='now', default=None,
+                        help='current date of the run (YYYY-MM-DD), to reproduce the predictions of a past date')
+
+    # --index-advisor
+    parser.add_argument('--index-advisor', dest='index_advisor', action='store_true',
+                        help='record the filters of the selects and print how they are answered on exit')
+    parser.set_defaults(index_advisor=False)
+
     # -d
     parser.add_argument('-v', dest='debug', action='store_true',
                         help='turn debug on')
     parser.set_defaults(debug=False)
     args = parser.parse_args()
 
+    if args.now:
+        util.set_now(args.now)
+
+    if args.index_advisor:
+        IndexAdvisor.enabled = True
+        atexit.register(IndexAdvisor.print_report)
+
     if not SQLLite.init_database():
         print("IMPORT DATABASE!!!")
         exit(-1)
 
+    if args.persistent_cache:
+        Cache.init_persistent_cache()
+
+    if args.historical_store:
+        HistoricalStore.init_historical_store()
+
+    if args.feature_store:
+        FeatureStore.init_feature_store()
+
     Predictor.init_predictor()
 
     if args.debug:
@@ -0,0 +1,123 @@
+"""
+Memory benchmark: Match objects with a __dict__ filled by SELECT * VS slotted entities with lazy columns
+
+It builds the Match table of the schema (all the columns of SQLLite.ini: players, coordinates, incident XML strings,
+odds) in a temporary database, then loads all the matches of all the leagues, measuring with tracemalloc the memory
+retained by the matches and the peak during the load
+
+    python -m src.test.benchmark_entity_memory [n_leagues] [n_seasons]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+
+import src.util.SQLLite as SQLLite
+import src.util.Cache as Cache
+import src.util.Entity as Entity
+import src.application.Domain.Match as Match
+import src.application.Domain.MatchStore as MatchStore
+from src.test.benchmark_incident_parser import get_season
+
+
+class DictMatch(object):
+    """
+    Match as it was before the slotted entities: every column of SELECT * in the __dict__
+    """
+    def __init__(self, id):
+        self.id = id
+
+
+def create_database(database_path, n_leagues, n_seasons):
+    connection = SQLLite.SQLiteConnection(database_path)
+    columns = Entity.get_columns("Match")
+    connection.execute_create("CREATE TABLE Match(id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                              + ", ".join(column + " " + get_column_type(column) for column in columns[1:]) + ")")
+    match_api_id = 0
+    rows = []
+    for league_id in range(1, n_leagues + 1):
+        for season in range(2008, 2008 + n_seasons):
+            for stage, (_, incidents) in enumerate(get_season(380)):
+                match_api_id += 1
+                row = {"country_id": league_id, "league_id": league_id, "season": str(season)+"/"+str(season+1),
+                       "stage": stage // 10 + 1, "date": str(season) + "-09-01 00:00:00", "match_api_id": match_api_id,
+                       "home_team_api_id": league_id * 100 + stage % 20, "away_team_api_id": league_id * 100 + 1,
+                       "home_team_goal": random.randint(0, 4), "away_team_goal": random.randint(0, 4)}
+                for column in columns:
+                    if column in incidents:
+                        row[column] = incidents[column]
+                    elif column.startswith(("home_player_X", "home_player_Y", "away_player_X", "away_player_Y")):
+                        row[column] = random.randint(1, 11)
+                    elif column.startswith(("home_player_", "away_player_")):
+                        row[column] = random.randint(30000, 600000)
+                    elif column in Match.lazy_groups[0]:
+                        row[column] = "<" + column + "><value><elapsed>3</elapsed></value></" + column + ">"
+                    elif column.isupper():
+                        row[column] = round(random.uniform(1.1, 9.0), 2)
+                rows.append(row)
+    connection.insert_many("Match", rows)
+    return connection
+
+
+def get_column_type(column):
+    if column.isupper():
+        return "NUMERIC"
+    if column in ("season", "date") or column in Match.lazy_groups[0]:
+        return "TEXT"
+    return "INTEGER"
+
+
+def read_dict_matches(connection, league_id):
+    matches = []
+    for sqllite_row in connection.select("Match", **{"league_id": league_id}):
+        match = DictMatch(sqllite_row["id"])
+        for attribute, value in sqllite_row.items():
+            match.__setattr__(attribute, value)
+        matches.append(match)
+    return matches
+
+
+def read_slotted_matches(connection, league_id):
+    return list(Match.read_matches_by_league(league_id, only_stages=False))
+
+
+def read_store_matches(connection, league_id):
+    match_store = MatchStore.get_match_store()
+    return match_store.views_of(match_store.select(match_store.mask(league_id=league_id)))
+
+
+def measure(read, connection, n_leagues):
+    Cache.reset("MATCH_BY_LEAGUE")
+    MatchStore.invalidate()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    matches = []
+    for league_id in range(1, n_leagues + 1):
+        matches.extend(read(connection, league_id))
+    elapsed = time.perf_counter() - start_time
+    # what is used by a simple training loop: scores and teams
+    sum(m.home_team_goal - m.away_team_goal for m in matches if m.home_team_api_id > 0)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(matches), current, peak, elapsed
+
+
+def main(n_leagues=11, n_seasons=2):
+    random.seed(0)
+    database_path = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite")
+    connection = create_database(database_path, n_leagues, n_seasons)
+    SQLLite.sqllite_connections[os.getpid()] = connection
+    Cache.max_cache_size = 1024 * 1024 * 1024 * 4
+
+    for name, read in (("dict (SELECT *)   ", read_dict_matches),
+                       ("slotted entities  ", read_slotted_matches),
+                       ("MatchStore views  ", read_store_matches)):
+        n_matches, current, peak, elapsed = measure(read, connection, n_leagues)
+        print("%s: %6d matches, retained %7.1f MB, peak %7.1f MB, %6.2f s"
+              % (name, n_matches, current / 1024 / 1024, peak / 1024 / 1024, elapsed))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,104 @@
+"""
+Microbenchmark: BeautifulSoup parsing of the incident strings VS IncidentParser
+
+It builds the shoton/shotoff/goal strings of a full league season (20 teams, 380 matches) as the crawler writes them,
+then parses them as Shot.read_match_shot did before (html.parser) and with IncidentParser, without and with the
+disk cache
+
+    python -m src.test.benchmark_incident_parser [n_matches]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+import src.util.IncidentParser as IncidentParser
+from src.application.Crawl.enetscores.CrawlerIncidents import elaborate_tag
+from bs4 import BeautifulSoup
+
+
+def get_incident(incident_type, n, team_api_id):
+    incident = {"stats": {incident_type: 1},
+                "event_incident_typefk": random.randint(1, 200),
+                "elapsed": random.randint(1, 90),
+                "subtype": random.choice(["header", "shot", "distance", "blocked_shot"]),
+                "player1": random.randint(30000, 600000),
+                "sortorder": random.randint(0, 5),
+                "team": team_api_id,
+                "n": n,
+                "type": incident_type,
+                "id": random.randint(1000000, 5000000),
+                "coordinates": [random.randint(0, 50), random.randint(0, 70)]}
+    if incident_type == "goal" and random.random() < 0.7:
+        incident["player2"] = random.randint(30000, 600000)
+    return incident
+
+
+def get_season(n_matches):
+    season = []
+    for match_api_id in range(n_matches):
+        home_team_api_id, away_team_api_id = random.sample(range(8000, 8020), 2)
+        match = {}
+        for incident_type, n_incidents in (("shoton", 14), ("shotoff", 12), ("goal", 3)):
+            incidents_str = "<" + incident_type + ">"
+            for n in range(random.randint(0, 2 * n_incidents)):
+                incidents_str += elaborate_tag(get_incident(incident_type, n,
+                                                            random.choice([home_team_api_id, away_team_api_id])))
+            match[incident_type] = incidents_str + "</" + incident_type + ">"
+        season.append((match_api_id, match))
+    return season
+
+
+def beautiful_soup_parse(match_api_id, incident_type, incidents_str):
+    """
+    Parsing as Shot.read_match_shot did before IncidentParser
+    """
+    bs = BeautifulSoup(incidents_str, "html.parser")
+    incidents = []
+    for value in bs.contents[0].children:
+        incident = {}
+        for tag in value.children:
+            if tag.name == "stats":
+                incident["stats"] = dict((content.name, str(content.string)) for content in tag.contents)
+            elif tag.name == "coordinates":
+                incident["coordinates"] = (str(tag.contents[0].string), str(tag.contents[1].string))
+            else:
+                incident[tag.name] = str(tag.string)
+        incidents.append(incident)
+    return incidents
+
+
+def run(parse, season):
+    start_time = time.perf_counter()
+    n_incidents = 0
+    for match_api_id, match in season:
+        for incident_type, incidents_str in match.items():
+            n_incidents += len(parse(match_api_id, incident_type, incidents_str))
+    return time.perf_counter() - start_time, n_incidents
+
+
+def main(n_matches=380):
+    random.seed(0)
+    season = get_season(n_matches)
+    IncidentParser.disk_cache_path = os.path.join(tempfile.mkdtemp(), "incidents.sqlite")
+
+    bs_time, bs_incidents = run(beautiful_soup_parse, season)
+    parser_time, parser_incidents = run(lambda m, t, s: IncidentParser.parse(s), season)
+    cold_time, _ = run(IncidentParser.read_incidents, season)
+    IncidentParser.flush()
+    warm_time, cached_incidents = run(IncidentParser.read_incidents, season)
+
+    if not bs_incidents == parser_incidents == cached_incidents:
+        raise Exception("The parsers returned different incidents ["+str(bs_incidents)+" / "
+                        + str(parser_incidents)+" / "+str(cached_incidents)+"]")
+
+    print("Matches:", n_matches, "- incidents parsed:", parser_incidents,
+          "- parser:", IncidentParser.iterparse.__module__)
+    for name, t in (("BeautifulSoup     ", bs_time), ("IncidentParser    ", parser_time),
+                    ("disk cache (cold) ", cold_time), ("disk cache (warm) ", warm_time)):
+        print("%s: %.3f s (%8.0f incidents/s) speed-up %.2fx" % (name, t, parser_incidents / t, bs_time / t))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,125 @@
+"""
+Microbenchmark: string-built selects VS parameterized selects of SQLiteConnection
+
+It builds a Match-like table in a temporary database and replays the lookups of the hot read paths
+(Match.read_matches_by_home_team, Team.read_by_team_api_id, Player.read_by_id)
+
+    python -m src.test.benchmark_sqllite [n_rows] [n_lookups]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+import src.util.SQLLite as SQLLite
+
+
+def create_database(database_path, n_rows):
+    connection = SQLLite.SQLiteConnection(database_path)
+    connection.execute_create("CREATE TABLE Match(id INTEGER PRIMARY KEY AUTOINCREMENT, league_id INTEGER, "
+                              "season TEXT, stage INTEGER, date TEXT, home_team_api_id INTEGER, "
+                              "away_team_api_id INTEGER, home_team_goal INTEGER, away_team_goal INTEGER)")
+    connection.execute_create("CREATE TABLE Team(id INTEGER PRIMARY KEY AUTOINCREMENT, team_api_id INTEGER, "
+                              "team_fifa_api_id INTEGER, team_long_name TEXT, team_short_name TEXT)")
+    connection.execute_create("CREATE TABLE Player(id INTEGER PRIMARY KEY AUTOINCREMENT, player_api_id INTEGER, "
+                              "player_name TEXT, player_fifa_api_id INTEGER, birthday TEXT, height INTEGER, "
+                              "weight INTEGER)")
+
+    connection.cursor.execute("begin")
+    for team_api_id in range(1, 201):
+        connection.cursor.execute("INSERT INTO Team(team_api_id, team_fifa_api_id, team_long_name, team_short_name) "
+                                  "VALUES (?, ?, ?, ?)", (team_api_id, team_api_id, "Team "+str(team_api_id), "T"))
+    for player_id in range(1, n_rows // 4 + 1):
+        connection.cursor.execute("INSERT INTO Player(player_api_id, player_name, player_fifa_api_id, birthday, "
+                                  "height, weight) VALUES (?, ?, ?, ?, ?, ?)",
+                                  (player_id, "Player "+str(player_id), player_id, "1990-01-01 00:00:00", 180, 170))
+    for i in range(n_rows):
+        connection.cursor.execute("INSERT INTO Match(league_id, season, stage, date, home_team_api_id, "
+                                  "away_team_api_id, home_team_goal, away_team_goal) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  (i % 11, "2015/2016", i % 38 + 1, "2015-09-01 00:00:00",
+                                   random.randint(1, 200), random.randint(1, 200),
+                                   random.randint(0, 4), random.randint(0, 4)))
+    connection.cursor.execute("commit")
+    return connection
+
+
+def string_built_select(connection, table_name, column_filter='*', **id):
+    """
+    Select as it was built before the parameterized path: values quoted in the SQL text
+    """
+    id_condition = ""
+    if len(id) > 0:
+        id_condition = "WHERE "
+        for attrbiute, value in id.items():
+            id_condition += attrbiute+"='"+str(value).replace("'", "''")+"' AND "
+        id_condition = id_condition[0:-4]
+
+    if column_filter == '*':
+        column_names = connection.getColumnFromTable(table_name)
+    else:
+        column_names = column_filter.split(",")
+
+    row_results = []
+    select = "SELECT "+column_filter+" FROM "+table_name+" "+id_condition+";"
+    for sqllite_row in connection.cursor.execute(select):
+        row = {}
+        for i, name in enumerate(column_names):
+            row[name] = sqllite_row[i]
+        row_results.append(row)
+    return row_results
+
+
+n_rounds = 5
+
+
+def get_lookups(n_lookups, n_rows):
+    lookups = []
+    for i in range(n_lookups):
+        lookups.append(("Match", {"home_team_api_id": random.randint(1, 200), "season": "2015/2016"}))
+        lookups.append(("Team", {"team_api_id": random.randint(1, 200)}))
+        lookups.append(("Player", {"id": random.randint(1, n_rows // 4)}))
+    return lookups
+
+
+def run(select, connection, lookups):
+    start_time = time.process_time()
+    n_rows = 0
+    for table_name, filter in lookups:
+        n_rows += len(select(connection, table_name, **filter))
+    return time.process_time() - start_time, n_rows
+
+
+def main(n_rows=20000, n_lookups=5000):
+    random.seed(0)
+    database_dir = tempfile.mkdtemp()
+    connection = create_database(os.path.join(database_dir, "benchmark.sqlite"), n_rows)
+    lookups = get_lookups(n_lookups, n_rows)
+
+    # the hot read paths filter on columns indexed in the production DB
+    connection.execute_create("CREATE INDEX benchmark_home_team ON Match(home_team_api_id, season)")
+    connection.execute_create("CREATE INDEX benchmark_team_api_id ON Team(team_api_id)")
+
+    # warm up the page cache
+    run(string_built_select, connection, lookups[:300])
+
+    # best of n_rounds, the two paths alternated (the machine noise hits both)
+    string_time = param_time = float("inf")
+    for i in range(n_rounds):
+        round_time, string_rows = run(string_built_select, connection, lookups)
+        string_time = min(string_time, round_time)
+        round_time, param_rows = run(lambda c, t, **f: c.select(t, **f), connection, lookups)
+        param_time = min(param_time, round_time)
+
+    if string_rows != param_rows:
+        raise Exception("The two paths returned different rows ["+str(string_rows)+" / "+str(param_rows)+"]")
+
+    print("Selects executed:", len(lookups), "- rows read:", param_rows)
+    print("String-built  : %.3f s (%.1f us per select)" % (string_time, string_time / len(lookups) * 1e6))
+    print("Parameterized : %.3f s (%.1f us per select)" % (param_time, param_time / len(lookups) * 1e6))
+    print("Speed-up      : %.2fx" % (string_time / param_time))
+    print("Statement shapes cached:", len(connection.statements))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
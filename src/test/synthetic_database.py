@@ -0,0 +1,106 @@
+import os
+import random
+import shutil
+import tempfile
+import itertools
+
+import src.util.SQLLite as SQLLite
+import src.util.Cache as Cache
+import src.util.util as util
+import src.application.Domain.MatchStore as MatchStore
+
+# Small DB of one league for the equivalence tests: seasons first_year/first_year+1 .. last_year/last_year+1, 6 teams
+# of n_teams in each season, each pair of teams playing home and away (10 stages of 3 matches)
+# The current time of the run is pinned in the last season, so that its teams are the teams of the current season
+#
+league_id = 1
+n_teams = 8
+first_year = 2005
+last_year = 2011
+now = "2011-10-01"
+seed = 3
+
+
+def get_seasons():
+    return ["%d/%d" % (year, year + 1) for year in range(first_year, last_year + 1)]
+
+
+def create():
+    """
+    Create the DB in a temporary directory and make it the DB of the current process
+    :return: the directory of the DB (to be passed to destroy)
+    """
+    reset_state()
+    directory = tempfile.mkdtemp()
+    connection = SQLLite.SQLiteConnection(os.path.join(directory, "database.sqlite"))
+    SQLLite.sqllite_connections[os.getpid()] = connection
+
+    columns = ["id INTEGER PRIMARY KEY", "country_id INTEGER", "league_id INTEGER", "season TEXT", "stage INTEGER",
+               "date TEXT", "match_api_id INTEGER", "home_team_api_id INTEGER", "away_team_api_id INTEGER",
+               "home_team_goal INTEGER", "away_team_goal INTEGER"]
+    for side in ("home", "away"):
+        for i in range(1, 12):
+            columns += [side + "_player_%d INTEGER" % i, side + "_player_X%d INTEGER" % i,
+                        side + "_player_Y%d INTEGER" % i]
+    columns += [column + " TEXT" for column in MatchStore.incident_columns]
+    connection.execute_create("CREATE TABLE Match(" + ", ".join(columns) + ")")
+    connection.execute_create("CREATE TABLE Team(id INTEGER PRIMARY KEY, team_api_id INTEGER, "
+                              "team_fifa_api_id INTEGER, team_long_name TEXT, team_short_name TEXT)")
+    connection.execute_create("CREATE TABLE League(id INTEGER PRIMARY KEY, country_id INTEGER, name TEXT)")
+    connection.insert("League", {"id": league_id, "country_id": 1, "name": "League"})
+    connection.insert_many("Team", [{"team_api_id": get_team_api_id(team), "team_long_name": "Team %d" % team}
+                                    for team in range(1, n_teams + 1)])
+
+    random_generator = random.Random(seed)
+    matches = []
+    for year, season in zip(range(first_year, last_year + 1), get_seasons()):
+        teams = random_generator.sample([get_team_api_id(team) for team in range(1, n_teams + 1)], 6)
+        pairs = list(itertools.permutations(teams, 2))
+        random_generator.shuffle(pairs)
+        for i, (home_team_api_id, away_team_api_id) in enumerate(pairs):
+            stage = i // 3 + 1
+            matches.append({"league_id": league_id, "season": season, "stage": stage,
+                            "date": "%d-%02d-01 00:00:00" % (year, stage % 12 + 1),
+                            "home_team_api_id": home_team_api_id, "away_team_api_id": away_team_api_id,
+                            "home_team_goal": random_generator.randint(0, 2),
+                            "away_team_goal": random_generator.randint(0, 2),
+                            "shoton": None if random_generator.random() < 0.03 else "<shoton/>",
+                            "shotoff": "<shotoff/>"})
+    connection.insert_many("Match", matches)
+    SQLLite.init_database()
+
+    incidents = []
+    for match_id, home_team_api_id, away_team_api_id in connection.execute_select(
+            "SELECT id, home_team_api_id, away_team_api_id FROM Match ORDER BY id;"):
+        for team_api_id in (home_team_api_id, away_team_api_id):
+            for incident_type in ("shoton", "shotoff"):
+                for i in range(random_generator.randint(0, 3)):
+                    incidents.append({"match_id": match_id, "type": incident_type, "team": team_api_id})
+    connection.insert_many("Match_Incident", incidents)
+
+    util.set_now(now)
+    reset_state()
+    return directory
+
+
+def destroy(directory):
+    """
+    Remove the DB created by create, restoring the clock of the run
+    :param directory:
+    :return:
+    """
+    util.set_now(None)
+    reset_state()
+    SQLLite.sqllite_connections.pop(os.getpid(), None)
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def reset_state():
+    # the structures of the process are built again over the DB
+    MatchStore.invalidate()
+    for namespace in list(Cache.namespaces.keys()):
+        Cache.reset(namespace)
+
+
+def get_team_api_id(team):
+    return team * 10
@@ -0,0 +1,74 @@
+import io
+import contextlib
+import importlib.util
+import unittest
+
+import src.application.Domain.League as League
+import src.test.synthetic_database as synthetic_database
+
+# the prediction accuracy reads the algorithms of MachineLearningAlgorithm, which imports sklearn
+sklearn_available = importlib.util.find_spec("sklearn") is not None
+
+# the Poisson algorithm (on the matches of the league) is deterministic: the Sklearn ones shuffle the training set
+# at random
+ml_alg_framework = "my_poisson"
+ml_train_input_id = 5
+n_workers = 4
+
+
+def get_state(pa):
+    """
+    Statistics of a PredictionAccuracy, as values comparable between the two paths
+    """
+    return (list(pa.accuracy_by_stage_dic.items()), pa.n_predicted_match,
+            [(team, accuracy.n_succesfull_predicted_label, accuracy.n_predicted_game, accuracy.result_played_games)
+             for team, accuracy in pa.accuracy_by_team_dic.items()])
+
+
+@unittest.skipUnless(sklearn_available, "sklearn is not installed")
+class TestBacktest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = synthetic_database.create()
+        cls.league = League.read_by_id(synthetic_database.league_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        synthetic_database.destroy(cls.directory)
+
+    def get_prediction_accuracies(self):
+        from src.application.MachineLearning.prediction_accuracy.prediction_accuracy import PredictionAccuracy
+
+        prediction_accuracies = []
+        for season in synthetic_database.get_seasons()[1:]:
+            for stages_to_train in (3, 5, 12):
+                prediction_accuracies.append(PredictionAccuracy(self.league,
+                                                                season=season,
+                                                                stages=list(range(1, 11)),
+                                                                ml_alg_framework=ml_alg_framework,
+                                                                ml_train_input_id=ml_train_input_id,
+                                                                ml_train_stages_to_train=stages_to_train))
+        return prediction_accuracies
+
+    def test_workers(self):
+        import src.application.MachineLearning.prediction_accuracy.Backtest as Backtest
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            prediction_accuracies = self.get_prediction_accuracies()
+            for pa in prediction_accuracies:
+                pa.compute_prediction_accuracy()
+            synthetic_database.reset_state()
+            serial_prediction_accuracies = Backtest.compute(self.get_prediction_accuracies(), workers=1)
+            synthetic_database.reset_state()
+            parallel_prediction_accuracies = Backtest.compute(self.get_prediction_accuracies(), workers=n_workers)
+
+        self.assertTrue(any(pa.n_predicted_match > 0 for pa in prediction_accuracies))
+        for pa, serial_pa, parallel_pa in zip(prediction_accuracies, serial_prediction_accuracies,
+                                              parallel_prediction_accuracies):
+            with self.subTest(season=pa.season, stages_to_train=pa.ml_train_stages_to_train):
+                self.assertEqual(get_state(pa), get_state(serial_pa))
+                self.assertEqual(get_state(pa), get_state(parallel_pa))
+
+
+if __name__ == '__main__':
+    unittest.main()
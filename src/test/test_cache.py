@@ -0,0 +1,124 @@
+import sys
+import time
+import unittest
+
+import src.util.Cache as Cache
+import src.application.Domain.Team as Team
+
+test_namespaces = ("TEST_LRU", "TEST_OTHER", "TEST_TTL", "TEST_TAGS")
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.max_cache_size = Cache.max_cache_size
+        for namespace in list(Cache.namespaces.keys()):
+            Cache.reset(namespace)
+
+    def tearDown(self):
+        Cache.max_cache_size = self.max_cache_size
+        for namespace in test_namespaces:
+            Cache.reset(namespace)
+            Cache.namespaces.pop(namespace, None)
+
+    def assertCached(self, elements, type):
+        for element_id, element in elements.items():
+            if element is None:
+                self.assertRaises(KeyError, Cache.get_element, element_id, type)
+            else:
+                self.assertEqual(element, Cache.get_element(element_id, type))
+
+    def test_lru(self):
+        Cache.set_namespace("TEST_LRU", max_elements=2)
+        Cache.add_element(1, "a", "TEST_LRU")
+        Cache.add_element(2, "b", "TEST_LRU")
+        Cache.add_element(1, "c", "TEST_OTHER")
+        # 1 is now the most recently used
+        Cache.get_element(1, "TEST_LRU")
+        Cache.add_element(3, "d", "TEST_LRU")
+        self.assertCached({1: "a", 2: None, 3: "d"}, "TEST_LRU")
+        # the limit is of the namespace only
+        self.assertCached({1: "c"}, "TEST_OTHER")
+
+        Cache.set_namespace("TEST_LRU", max_elements=1)
+        self.assertCached({1: None, 3: "d"}, "TEST_LRU")
+
+    def test_ttl(self):
+        Cache.set_namespace("TEST_TTL", ttl=0.05)
+        Cache.add_element(1, "a", "TEST_TTL")
+        self.assertCached({1: "a"}, "TEST_TTL")
+        time.sleep(0.1)
+        Cache.add_element(2, "b", "TEST_TTL")
+        self.assertCached({1: None, 2: "b"}, "TEST_TTL")
+        self.assertEqual(Cache.get_size("b"), Cache.get_cache_size()[0])
+
+    def test_byte_budget(self):
+        elements = {1: "a" * 1000, 2: "b" * 1000, 3: "c" * 1000}
+        size = sum(Cache.get_size(element) for element in elements.values())
+        Cache.max_cache_size = size - 1
+
+        Cache.add_element(1, elements[1], "TEST_LRU")
+        Cache.add_element(2, elements[2], "TEST_OTHER")
+        self.assertEqual(size - Cache.get_size(elements[3]), Cache.get_cache_size()[0])
+        # the least recently used element of the whole cache is evicted, whatever its namespace
+        Cache.get_element(1, "TEST_LRU")
+        Cache.add_element(3, elements[3], "TEST_LRU")
+        self.assertCached({1: elements[1], 3: elements[3]}, "TEST_LRU")
+        self.assertCached({2: None}, "TEST_OTHER")
+        self.assertEqual(size - Cache.get_size(elements[2]), Cache.get_cache_size()[0])
+
+        Cache.reset("TEST_LRU")
+        self.assertEqual(0, Cache.get_cache_size()[0])
+
+    def test_size(self):
+        element = ["a" * 100, "b" * 100]
+        self.assertEqual(sys.getsizeof(tuple(element)) + sum(sys.getsizeof(item) for item in element),
+                         Cache.get_size(tuple(element)))
+
+    def test_slotted_size(self):
+        team = Team.Team(1)
+        for slot in Team.Team.__slots__:
+            setattr(team, slot, slot[0] * 40)
+        values_size = sum(sys.getsizeof(getattr(team, slot)) for slot in Team.Team.__slots__)
+        self.assertEqual(sys.getsizeof(team) + values_size, Cache.get_size(team))
+        self.assertEqual(sys.getsizeof([team, team]) + 2 * (sys.getsizeof(team) + values_size),
+                         Cache.get_size([team, team]))
+
+        # the slots of the bases are counted, the ones not set are skipped
+        class Base:
+            __slots__ = "a"
+
+        class Derived(Base):
+            __slots__ = ("b", "c")
+
+        element = Derived()
+        element.a = "a" * 100
+        element.b = "b" * 100
+        self.assertEqual(sys.getsizeof(element) + sys.getsizeof(element.a) + sys.getsizeof(element.b),
+                         Cache.get_size(element))
+
+    def test_invalidate(self):
+        Cache.add_element(1, "a", "TEST_TAGS", tags=[("TEAM_API_ID", 10)])
+        Cache.add_element(2, "b", "TEST_TAGS", tags=[("TEAM_API_ID", 20)])
+        Cache.add_element(1, "c", "TEST_OTHER", tags=[("TEAM_API_ID", "10"), ("MATCH_ID", 5), ("PLAYER_API_ID", None)])
+        self.assertNotIn(("PLAYER_API_ID", "None"), Cache.tags_index)
+
+        # the ids are compared as strings, in every namespace
+        self.assertEqual(2, Cache.invalidate(("TEAM_API_ID", "10")))
+        self.assertCached({1: None, 2: "b"}, "TEST_TAGS")
+        self.assertCached({1: None}, "TEST_OTHER")
+        self.assertNotIn(("TEAM_API_ID", "10"), Cache.tags_index)
+        self.assertNotIn(("MATCH_ID", "5"), Cache.tags_index)
+        self.assertEqual(0, Cache.invalidate(("TEAM_API_ID", 10)))
+
+    def test_invalidate_evicted(self):
+        Cache.set_namespace("TEST_TAGS", max_elements=1)
+        Cache.add_element(1, "a", "TEST_TAGS", tags=[("TEAM_API_ID", 10)])
+        Cache.add_element(2, "b", "TEST_TAGS", tags=[("TEAM_API_ID", 20)])
+        # the reverse index follows the evictions and the resets
+        self.assertNotIn(("TEAM_API_ID", "10"), Cache.tags_index)
+        Cache.reset("TEST_TAGS")
+        self.assertNotIn(("TEAM_API_ID", "20"), Cache.tags_index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+import src.application.Domain.League as League
+import src.application.MachineLearning.FeatureEngine as FeatureEngine
+import src.application.MachineLearning.MachineLearningInput as MachineLearningInput
+import src.test.synthetic_database as synthetic_database
+from src.application.Exception.MLException import MLException
+
+
+def get_input_to_train(*args):
+    """
+    Input to train of MachineLearningInput, as values comparable between the two paths
+    """
+    try:
+        return tuple((x.dtype.str, x.shape, x.tolist()) if isinstance(x, np.ndarray) else (type(x).__name__, x)
+                     for x in MachineLearningInput.get_input_to_train(*args))
+    except MLException as e:
+        return "MLException " + str(e.get_code())
+    except Exception as e:
+        return type(e).__name__
+
+
+class TestFeatureEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = synthetic_database.create()
+        cls.league = League.read_by_id(synthetic_database.league_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        synthetic_database.destroy(cls.directory)
+
+    def get_cases(self):
+        for season in synthetic_database.get_seasons():
+            for stage_to_predict in range(1, 11):
+                for stages_to_train in (None, 1, 3, 5, 12):
+                    for ml_train_input_id in (1, 2, 3, 4, 5):
+                        for representation in ((1, 2, 3, 4) if ml_train_input_id in (1, 2) else (None,)):
+                            yield ml_train_input_id, representation, stage_to_predict, stages_to_train, season
+
+    def get_inputs(self):
+        return [get_input_to_train(ml_train_input_id, self.league, representation, stage_to_predict, stages_to_train,
+                                   season)
+                for ml_train_input_id, representation, stage_to_predict, stages_to_train, season in self.get_cases()]
+
+    def test_input_to_train(self):
+        synthetic_database.reset_state()
+        inputs = self.get_inputs()
+        # second pass over the feature matrices already built
+        cached_inputs = self.get_inputs()
+        FeatureEngine.enabled = False
+        try:
+            synthetic_database.reset_state()
+            legacy_inputs = self.get_inputs()
+        finally:
+            FeatureEngine.enabled = True
+        for case, input_to_train, cached_input, legacy_input in zip(self.get_cases(), inputs, cached_inputs,
+                                                                    legacy_inputs):
+            with self.subTest(ml_train_input_id=case[0], representation=case[1], stage=case[2],
+                              stages_to_train=case[3], season=case[4]):
+                self.assertEqual(legacy_input, input_to_train)
+                self.assertEqual(legacy_input, cached_input)
+
+if __name__ == '__main__':
+    unittest.main()
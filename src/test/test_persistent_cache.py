@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import src.util.PersistentCache as PersistentCache
+
+
+class TestPersistentCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.directory, "cache.sqlite")
+        self.data_path = os.path.join(self.directory, "database.sqlite")
+        open(self.data_path, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_persistent_cache(self):
+        """
+        Persistent cache of another process of the application, on the same file
+        """
+        return PersistentCache.PersistentCache(self.database_path, self.data_path)
+
+    def get_version(self, type):
+        return self.get_persistent_cache().get_connection().execute("SELECT version FROM Namespace_Version "
+                                                                    "WHERE type = ?", (type,)).fetchone()[0]
+
+    def test_shared(self):
+        persistent_cache = self.get_persistent_cache()
+        persistent_cache.add("TEAM_BY_ID", "1", ["a", "b"], (("TEAM_API_ID", "10"),))
+        # pending elements are read before they are written
+        self.assertEqual((["a", "b"], (("TEAM_API_ID", "10"),)), persistent_cache.get("TEAM_BY_ID", "1"))
+        self.assertRaises(KeyError, self.get_persistent_cache().get, "TEAM_BY_ID", "1")
+        persistent_cache.flush()
+        self.assertEqual((["a", "b"], (("TEAM_API_ID", "10"),)), self.get_persistent_cache().get("TEAM_BY_ID", "1"))
+
+    def test_reset(self):
+        persistent_cache = self.get_persistent_cache()
+        persistent_cache.add("TEAM_BY_ID", "1", "a", ())
+        persistent_cache.add("TEAM_BY_API_ID", "10", "a", ())
+        persistent_cache.flush()
+        version = self.get_version("TEAM_BY_ID")
+
+        self.get_persistent_cache().reset("TEAM_BY_ID")
+        self.assertEqual(version + 1, self.get_version("TEAM_BY_ID"))
+        self.assertRaises(KeyError, persistent_cache.get, "TEAM_BY_ID", "1")
+        self.assertEqual("a", persistent_cache.get("TEAM_BY_API_ID", "10")[0])
+
+        # the elements of the previous version are removed by vacuum
+        persistent_cache.add("TEAM_BY_ID", "2", "b", ())
+        persistent_cache.flush()
+        persistent_cache.vacuum()
+        self.assertEqual([("TEAM_BY_API_ID", "10"), ("TEAM_BY_ID", "2")],
+                         persistent_cache.get_connection().execute("SELECT type, key FROM Cache_Element "
+                                                                   "ORDER BY type, key").fetchall())
+
+    def test_invalidate(self):
+        persistent_cache = self.get_persistent_cache()
+        persistent_cache.add("TEAM_BY_ID", "1", "a", (("TEAM_API_ID", "10"),))
+        persistent_cache.add("MATCH_HOME", "10", "b", (("TEAM_API_ID", "10"), ("MATCH_ID", "5")))
+        persistent_cache.add("TEAM_BY_ID", "2", "c", (("TEAM_API_ID", "20"),))
+        persistent_cache.flush()
+
+        self.get_persistent_cache().invalidate((("TEAM_API_ID", "10"),))
+        self.assertRaises(KeyError, persistent_cache.get, "TEAM_BY_ID", "1")
+        self.assertRaises(KeyError, persistent_cache.get, "MATCH_HOME", "10")
+        self.assertEqual("c", persistent_cache.get("TEAM_BY_ID", "2")[0])
+
+    def test_invalidated_pending(self):
+        persistent_cache = self.get_persistent_cache()
+        persistent_cache.add("TEAM_BY_ID", "1", "a", (("TEAM_API_ID", "10"),))
+        persistent_cache.add("TEAM_BY_ID", "2", "b", (("TEAM_API_ID", "20"),))
+        persistent_cache.add("MATCH_HOME", "10", "c", ())
+        # another process invalidates the entities and the namespaces of the elements not written yet
+        other_persistent_cache = self.get_persistent_cache()
+        other_persistent_cache.invalidate((("TEAM_API_ID", "10"),))
+        other_persistent_cache.reset("MATCH_HOME")
+        persistent_cache.flush()
+
+        self.assertRaises(KeyError, other_persistent_cache.get, "TEAM_BY_ID", "1")
+        self.assertRaises(KeyError, other_persistent_cache.get, "MATCH_HOME", "10")
+        self.assertEqual("b", other_persistent_cache.get("TEAM_BY_ID", "2")[0])
+
+    def test_cleared_pending(self):
+        persistent_cache = self.get_persistent_cache()
+        persistent_cache.add("TEAM_BY_ID", "1", "a", ())
+        self.get_persistent_cache().clear()
+        persistent_cache.flush()
+        self.assertRaises(KeyError, self.get_persistent_cache().get, "TEAM_BY_ID", "1")
+
+    def test_data_identity(self):
+        persistent_cache = self.get_persistent_cache()
+        persistent_cache.add("TEAM_BY_ID", "1", "a", ())
+        persistent_cache.flush()
+        self.assertEqual("a", self.get_persistent_cache().get("TEAM_BY_ID", "1")[0])
+
+        # a DB replaced by another one does not find the elements of the previous one
+        other_data_path = os.path.join(self.directory, "other.sqlite")
+        open(other_data_path, "w").close()
+        os.replace(other_data_path, self.data_path)
+        self.assertNotEqual(persistent_cache.data_identity, PersistentCache.get_data_identity(self.data_path))
+        self.assertRaises(KeyError, self.get_persistent_cache().get, "TEAM_BY_ID", "1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import src.util.SQLLite as SQLLite
+import src.application.Domain.Team_Attributes as Team_Attributes
+
+
+class Team(object):
+    def __init__(self, team_api_id, team_fifa_api_id):
+        self.team_api_id = team_api_id
+        self.team_fifa_api_id = team_fifa_api_id
+
+
+class TestWrites(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.connection = SQLLite.SQLiteConnection(os.path.join(self.directory, "database.sqlite"))
+        SQLLite.sqllite_connections[os.getpid()] = self.connection
+        self.connection.execute_create("CREATE TABLE Team_Attributes(id INTEGER PRIMARY KEY, team_fifa_api_id INTEGER, "
+                                       "team_api_id INTEGER, date TEXT, buildUpPlaySpeed INTEGER, "
+                                       "defencePressure INTEGER)")
+
+    def tearDown(self):
+        SQLLite.sqllite_connections.pop(os.getpid(), None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_rows(self):
+        return self.connection.execute_select("SELECT team_fifa_api_id, date, buildUpPlaySpeed, defencePressure "
+                                              "FROM Team_Attributes ORDER BY team_fifa_api_id, date;")
+
+    def test_insert_many(self):
+        self.assertEqual(3, self.connection.insert_many("Team_Attributes",
+                                                        [{"team_fifa_api_id": 1, "date": "d1"},
+                                                         {"team_fifa_api_id": 2, "date": "d1"},
+                                                         {"team_fifa_api_id": 3, "date": "d1",
+                                                          "buildUpPlaySpeed": 50}]))
+        self.assertEqual([(1, "d1", None, None), (2, "d1", None, None), (3, "d1", 50, None)], self.get_rows())
+
+    def test_upsert_many(self):
+        self.connection.insert_many("Team_Attributes", [{"team_fifa_api_id": 1, "date": "d1", "buildUpPlaySpeed": 50,
+                                                         "defencePressure": 40}])
+        rows = [{"team_fifa_api_id": 1, "date": "d1", "buildUpPlaySpeed": 60},
+                {"team_fifa_api_id": 1, "date": "d2", "buildUpPlaySpeed": 30},
+                # key already in the batch: updates the row inserted by the batch
+                {"team_fifa_api_id": 1, "date": "d2", "buildUpPlaySpeed": 35},
+                {"team_fifa_api_id": 2, "date": "d1", "buildUpPlaySpeed": 70, "defencePressure": 20}]
+        self.assertEqual((2, 2), self.connection.upsert_many("Team_Attributes", rows,
+                                                             ("team_fifa_api_id", "date")))
+        self.assertEqual([(1, "d1", 60, 40), (1, "d2", 35, None), (2, "d1", 70, 20)], self.get_rows())
+
+    def test_rollback(self):
+        self.connection.insert_many("Team_Attributes", [{"team_fifa_api_id": 1, "date": "d1"}])
+        with self.assertRaises(ValueError):
+            with self.connection.transaction():
+                self.connection.insert_many("Team_Attributes", [{"team_fifa_api_id": 2, "date": "d1"}])
+                # nested units of work join the outermost one
+                with self.connection.transaction():
+                    self.connection.upsert_many("Team_Attributes", [{"team_fifa_api_id": 1, "date": "d1",
+                                                                     "buildUpPlaySpeed": 60}],
+                                                ("team_fifa_api_id", "date"))
+                raise ValueError()
+        self.assertEqual([(1, "d1", None, None)], self.get_rows())
+        self.assertEqual(0, self.connection.transaction_depth)
+
+    def test_select_iter(self):
+        self.connection.insert_many("Team_Attributes", [{"team_fifa_api_id": 1, "date": "d1"},
+                                                        {"team_fifa_api_id": 2, "date": "d1"}])
+        rows = self.connection.select_iter("Team_Attributes", column_filter="team_fifa_api_id", batch_size=1)
+        self.assertEqual({"team_fifa_api_id": 1}, next(rows))
+        # the rows are read by a reader connection: the writer can be used while they are consumed
+        self.connection.insert_many("Team_Attributes", [{"team_fifa_api_id": 3, "date": "d1"}])
+        self.assertEqual([{"team_fifa_api_id": 2}], list(rows))
+
+        # in a unit of work the rows not committed yet are read
+        with self.connection.transaction():
+            self.connection.insert_many("Team_Attributes", [{"team_fifa_api_id": 4, "date": "d1"}])
+            self.assertEqual([1, 2, 3, 4], [row["team_fifa_api_id"] for row in
+                                            self.connection.select_iter("Team_Attributes",
+                                                                        column_filter="team_fifa_api_id")])
+
+    def test_after_commit(self):
+        calls = []
+        with self.connection.transaction():
+            self.connection.insert_many("Team_Attributes", [{"team_fifa_api_id": 1, "date": "d1"}])
+            self.connection.after_commit(lambda: calls.append("commit"))
+            self.assertEqual([], calls)
+        self.assertEqual(["commit"], calls)
+
+        with self.assertRaises(ValueError):
+            with self.connection.transaction():
+                self.connection.after_commit(lambda: calls.append("rollback"))
+                raise ValueError()
+        self.assertEqual(["commit"], calls)
+
+        # no unit of work open: called at once
+        self.connection.after_commit(lambda: calls.append("now"))
+        self.assertEqual(["commit", "now"], calls)
+
+    def test_buffered_writes(self):
+        calls = []
+        with self.assertRaises(RuntimeError):
+            with SQLLite.buffered_writes() as write_buffer:
+                self.assertIs(write_buffer, SQLLite.get_write_buffer())
+                write_buffer.insert("Team_Attributes", {"team_fifa_api_id": 1, "date": "d1"})
+                write_buffer.upsert("Team_Attributes", {"team_fifa_api_id": 2, "date": "d1", "buildUpPlaySpeed": 50},
+                                    ("team_fifa_api_id", "date"), callback=lambda: calls.append(2))
+                self.assertEqual([], self.get_rows())
+                # the crawl fails halfway: the rows collected until then are written anyway
+                raise RuntimeError()
+        self.assertIsNone(SQLLite.get_write_buffer())
+        self.assertEqual([(1, "d1", None, None), (2, "d1", 50, None)], self.get_rows())
+        self.assertEqual([2], calls)
+
+    def test_write_buffer_size(self):
+        write_buffer = SQLLite.WriteBuffer(self.connection, max_size=2)
+        write_buffer.insert("Team_Attributes", {"team_fifa_api_id": 1, "date": "d1"})
+        self.assertEqual([], self.get_rows())
+        write_buffer.insert("Team_Attributes", {"team_fifa_api_id": 2, "date": "d1"})
+        self.assertEqual(2, len(self.get_rows()))
+        self.assertEqual(0, write_buffer.size)
+
+    def test_write_team_attributes(self):
+        team = Team(100, 1)
+        Team_Attributes.write_team_attributes(team, {"buildUpPlaySpeed": 50}, date="d1")
+        # attributes crawled again the same day replace the ones of the day
+        Team_Attributes.write_team_attributes(team, {"buildUpPlaySpeed": 60}, date="d1")
+        with SQLLite.buffered_writes():
+            Team_Attributes.write_team_attributes(team, {"buildUpPlaySpeed": 70}, date="d2")
+            Team_Attributes.write_team_attributes(team, {"buildUpPlaySpeed": 75}, date="d2")
+        self.assertEqual([(1, "d1", 60, None), (1, "d2", 75, None)], self.get_rows())
+
+
+if __name__ == '__main__':
+    unittest.main()
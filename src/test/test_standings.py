@@ -0,0 +1,124 @@
+import operator
+import unittest
+
+import src.util.util as util
+import src.application.Domain.League as League
+import src.application.Domain.Standings as Standings
+import src.test.synthetic_database as synthetic_database
+from src.application.Exception.MLException import MLException
+
+
+def get_legacy_ranking(league, season):
+    """
+    League.get_ranking before the Standings: one loop over the finished matches of the season
+    """
+    ranking = {team.id: 0 for team in league.get_teams(season=season)}
+    for m in league.get_matches(season=season, finished=True):
+        result, winner = m.get_winner()
+        if not util.is_None(winner):
+            ranking[winner.id] += 3
+        else:
+            ranking[m.get_home_team().id] += 1
+            ranking[m.get_away_team().id] += 1
+    return [(p, team_id) for team_id, p in sorted(ranking.items(), key=operator.itemgetter(1))[::-1]]
+
+
+def get_legacy_training_ranking(league, season, stage_to_predict, stages_to_train, home=None):
+    """
+    League.get_training_ranking before the Standings: one loop over the training matches
+    """
+    matches = league.get_training_matches(season, stage_to_predict, stages_to_train)
+    teams = league.get_teams(season=season)
+    ranking = {team.id: 0 for team in teams}
+    num_matches = {team.id: 0 for team in teams}
+    for m in matches:
+        try:
+            result, winner = m.get_winner()
+            winner_id = None if result == 0 else winner.id
+            home_id = m.get_home_team().id
+            away_id = m.get_away_team().id
+        except AttributeError:
+            continue
+
+        if util.is_None(home):
+            util.increase_dict_entry(home_id, num_matches)
+            util.increase_dict_entry(away_id, num_matches)
+            if result != 0:
+                util.increase_dict_entry(winner_id, ranking, 3)
+            else:
+                util.increase_dict_entry(home_id, ranking, 1)
+                util.increase_dict_entry(away_id, ranking, 1)
+        elif home:
+            util.increase_dict_entry(home_id, num_matches)
+            if result == 1:
+                util.increase_dict_entry(winner_id, ranking, 3)
+            elif result == 0:
+                util.increase_dict_entry(home_id, ranking, 1)
+        else:
+            util.increase_dict_entry(away_id, num_matches)
+            if result == 2:
+                util.increase_dict_entry(winner_id, ranking, 3)
+            elif result == 0:
+                util.increase_dict_entry(away_id, ranking, 1)
+
+    norm_ranking = dict()
+    for team_id, points in ranking.items():
+        norm_ranking[team_id] = points / num_matches[team_id] if num_matches[team_id] > 0 else 0
+    return [(p, team_id) for team_id, p in sorted(norm_ranking.items(), key=operator.itemgetter(1))[::-1]]
+
+
+def get_training_ranking(get_ranking, *args, **kwargs):
+    try:
+        return get_ranking(*args, **kwargs)
+    except MLException as e:
+        return "MLException " + str(e.get_code())
+
+
+class TestStandings(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = synthetic_database.create()
+        cls.league = League.read_by_id(synthetic_database.league_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        synthetic_database.destroy(cls.directory)
+
+    def assert_rankings(self):
+        for season in synthetic_database.get_seasons():
+            with self.subTest(season=season):
+                self.assertEqual(get_legacy_ranking(self.league, season), Standings.get_ranking(self.league, season))
+            for stage_to_predict in range(1, 12):
+                for stages_to_train in (None, 1, 2, 3, 5, 9, 20):
+                    for home in (None, True, False):
+                        with self.subTest(season=season, stage=stage_to_predict, stages_to_train=stages_to_train,
+                                          home=home):
+                            ranking = get_training_ranking(Standings.get_training_ranking, self.league, season,
+                                                           stage_to_predict, stages_to_train, home=home)
+                            self.assertEqual(get_training_ranking(get_legacy_training_ranking, self.league, season,
+                                                                  stage_to_predict, stages_to_train, home=home),
+                                             ranking if isinstance(ranking, str) else ranking.ranking)
+
+    def test_training_ranking(self):
+        self.assert_rankings()
+
+    def test_incremental_standings(self):
+        import src.application.Domain.Match as Match
+
+        season = synthetic_database.get_seasons()[-1]
+        standings = Standings.get_season_standings(self.league, season)
+        n = standings.n
+        teams = sorted(team.team_api_id for team in self.league.get_teams(season=season))
+        Match.write_new_match({"league_id": synthetic_database.league_id, "season": season, "stage": 11,
+                               "date": "%d-09-20 00:00:00" % synthetic_database.last_year,
+                               "home_team_api_id": teams[0], "away_team_api_id": teams[1],
+                               "home_team_goal": 3, "away_team_goal": 0})
+        updated_standings = Standings.get_season_standings(self.league, season)
+        # the new result is the last one: added to the standings already built
+        self.assertIs(standings, updated_standings)
+        self.assertEqual(n + 1, updated_standings.n)
+        self.assert_rankings()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+
+import src.util.util as util
+import src.application.Domain.Team as Team
+import src.test.synthetic_database as synthetic_database
+from src.application.Exception.MLException import MLException
+
+
+def get_legacy_training_matches(team, season, stage_to_predict, stages_to_train, consider_last=False, home=None):
+    """
+    Team.get_training_matches before the TeamFormIndex: the matches of the past seasons read by recursion
+    """
+    if util.is_None(stages_to_train):
+        training_matches = [m for m in team.get_matches(season=season, ordered=True, home=home, finished=True)
+                            if m.stage < stage_to_predict]
+        if len(training_matches) == 0 and stage_to_predict == 1:
+            raise MLException(0)
+        return training_matches
+
+    if consider_last:
+        training_matches = [m for m in team.get_matches(season=season, ordered=True, finished=True, home=home)]
+        training_matches = training_matches[::-1]
+        if len(training_matches) == 0 and season < '2006/2007':
+            raise MLException(1)
+    else:
+        training_matches = [m for m in team.get_matches(season=season, ordered=True, finished=True, home=home)
+                            if not util.is_None(m.stage) and m.stage < stage_to_predict]
+
+    stages_training = set([(m.stage, m.season) for m in training_matches])
+    if len(stages_training) < stages_to_train:
+        past_training_matches = get_legacy_training_matches(team, util.get_previous_season(season), 0,
+                                                            stages_to_train - len(stages_training),
+                                                            consider_last=True)
+        training_matches.extend(past_training_matches)
+
+    if len(training_matches) > stages_to_train:
+        if consider_last:
+            return training_matches[:stages_to_train][::-1]
+        return training_matches[-stages_to_train:]
+    return training_matches
+
+
+def get_match_ids(get_training_matches, *args, **kwargs):
+    try:
+        return [match.id for match in get_training_matches(*args, **kwargs)]
+    except MLException as e:
+        return "MLException " + str(e.get_code())
+
+
+class TestTeamFormIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = synthetic_database.create()
+
+    @classmethod
+    def tearDownClass(cls):
+        synthetic_database.destroy(cls.directory)
+
+    def test_training_matches(self):
+        for team_number in range(1, synthetic_database.n_teams + 1):
+            team = Team.read_by_team_api_id(synthetic_database.get_team_api_id(team_number))
+            for season in synthetic_database.get_seasons():
+                for stage_to_predict in range(1, 12):
+                    for stages_to_train in (None, 1, 3, 5, 20):
+                        for home in (None, True, False):
+                            with self.subTest(team=team.team_api_id, season=season, stage=stage_to_predict,
+                                              stages_to_train=stages_to_train, home=home):
+                                self.assertEqual(get_match_ids(get_legacy_training_matches, team, season,
+                                                               stage_to_predict, stages_to_train, home=home),
+                                                 get_match_ids(team.get_training_matches, season,
+                                                               stage_to_predict, stages_to_train, home=home))
+
+    def test_points_and_goals(self):
+        for team_number in range(1, synthetic_database.n_teams + 1):
+            team = Team.read_by_team_api_id(synthetic_database.get_team_api_id(team_number))
+            for season in synthetic_database.get_seasons()[1:]:
+                for stage_to_predict in (1, 4, 9):
+                    with self.subTest(team=team.team_api_id, season=season, stage=stage_to_predict):
+                        try:
+                            matches = get_legacy_training_matches(team, season, stage_to_predict, 3)
+                        except MLException:
+                            continue
+                        points = 0
+                        goals_done = 0
+                        goals_received = 0
+                        for match in matches:
+                            home = match.home_team_api_id == team.team_api_id
+                            done = match.home_team_goal if home else match.away_team_goal
+                            received = match.away_team_goal if home else match.home_team_goal
+                            goals_done += done
+                            goals_received += received
+                            points += 3 if done > received else 1 if done == received else 0
+                        self.assertEqual((points, len(matches)),
+                                         tuple(team.get_points_by_train_matches(season, stage_to_predict, 3)))
+                        self.assertEqual((goals_done, goals_received, len(matches)),
+                                         tuple(team.get_goals_by_train_matches(season, stage_to_predict, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+import src.util.util as util
+import src.application.Domain.League as League
+import src.application.Domain.TrainingWindow as TrainingWindow
+import src.test.synthetic_database as synthetic_database
+from src.application.Exception.MLException import MLException
+
+
+def get_legacy_training_matches(league, season, stage_to_predict, stages_to_train, consider_last=False):
+    """
+    League.get_training_matches before the TrainingWindow resolver: the matches of the past seasons read by recursion
+    """
+    if util.is_None(stages_to_train):
+        return [m for m in league.get_matches(season=season, ordered=True, finished=True)
+                if m.stage < stage_to_predict]
+
+    if consider_last:
+        training_matches = [m for m in league.get_matches(season=season, ordered=True, finished=True)]
+        training_matches = training_matches[::-1]
+    else:
+        training_matches = [m for m in league.get_matches(season=season, ordered=True, finished=True)
+                            if m.stage < stage_to_predict]
+
+    if len(training_matches) == 0 and season < '2006/2007':
+        raise MLException(0)
+
+    stages_training = set([(m.stage, m.season) for m in training_matches])
+    if len(stages_training) < stages_to_train:
+        past_training_matches = get_legacy_training_matches(league, util.get_previous_season(season), 0,
+                                                            stages_to_train - len(stages_training),
+                                                            consider_last=True)
+        training_matches.extend(past_training_matches)
+
+    n_matches_in_stage = int(len(league.get_teams_current_season()) / 2)
+    if len(training_matches) / n_matches_in_stage > stages_to_train:
+        if consider_last:
+            return training_matches[:stages_to_train * n_matches_in_stage][::-1]
+        return training_matches[-stages_to_train * n_matches_in_stage:]
+    return training_matches
+
+
+def get_match_ids(get_training_matches, *args):
+    try:
+        return [match.id for match in get_training_matches(*args)]
+    except MLException as e:
+        return "MLException " + str(e.get_code())
+
+
+class TestTrainingWindow(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = synthetic_database.create()
+        cls.league = League.read_by_id(synthetic_database.league_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        synthetic_database.destroy(cls.directory)
+
+    def get_cases(self):
+        for season in synthetic_database.get_seasons():
+            for stage_to_predict in range(1, 12):
+                for stages_to_train in (None, 1, 2, 3, 5, 9, 20):
+                    yield season, stage_to_predict, stages_to_train
+
+    def test_training_matches(self):
+        for season, stage_to_predict, stages_to_train in self.get_cases():
+            with self.subTest(season=season, stage=stage_to_predict, stages_to_train=stages_to_train):
+                self.assertEqual(get_match_ids(get_legacy_training_matches, self.league, season, stage_to_predict,
+                                               stages_to_train),
+                                 get_match_ids(self.league.get_training_matches, season, stage_to_predict,
+                                               stages_to_train))
+
+    def test_resolve_window(self):
+        for season, stage_to_predict, stages_to_train in self.get_cases():
+            if util.is_None(stages_to_train):
+                continue
+            for consider_last in (False, True):
+                with self.subTest(season=season, stage=stage_to_predict, stages_to_train=stages_to_train,
+                                  consider_last=consider_last):
+                    try:
+                        match_ids = TrainingWindow.resolve_window(self.league, season, stage_to_predict,
+                                                                  stages_to_train, consider_last)
+                    except MLException as e:
+                        match_ids = "MLException " + str(e.get_code())
+                    self.assertEqual(get_match_ids(get_legacy_training_matches, self.league, season,
+                                                   stage_to_predict, stages_to_train, consider_last),
+                                     match_ids)
+
+    def test_window_after_new_match(self):
+        import src.application.Domain.Match as Match
+
+        season = synthetic_database.get_seasons()[-1]
+        before = get_match_ids(self.league.get_training_matches, season, 11, 3)
+        teams = sorted(team.team_api_id for team in self.league.get_teams(season=season))
+        Match.write_new_match({"league_id": synthetic_database.league_id, "season": season, "stage": 8,
+                               "date": "%d-09-15 00:00:00" % synthetic_database.last_year,
+                               "home_team_api_id": teams[0], "away_team_api_id": teams[1],
+                               "home_team_goal": 1, "away_team_goal": 0})
+        after = get_match_ids(self.league.get_training_matches, season, 11, 3)
+        self.assertNotEqual(before, after)
+        self.assertEqual(get_match_ids(get_legacy_training_matches, self.league, season, 11, 3), after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+
+import src.application.Domain.League as League
+import src.application.MachineLearning.MachineLearningInput as MachineLearningInput
+import src.application.MachineLearning.WalkForwardDataset as WalkForwardDataset
+import src.test.synthetic_database as synthetic_database
+from src.application.Exception.MLException import MLException
+
+# stages of the walk: forward over the season, then back to previous stages (the buffer is filled again)
+stages = list(range(1, 11)) + [3, 9, 1]
+
+
+def get_input_to_train(get_input, *args, **kwargs):
+    """
+    Input to train, as values comparable between the two paths
+    """
+    try:
+        return tuple((x.dtype.str, x.shape, x.tolist()) if isinstance(x, np.ndarray) else (type(x).__name__, x)
+                     for x in get_input(*args, **kwargs))
+    except MLException as e:
+        return "MLException " + str(e.get_code())
+    except Exception as e:
+        return type(e).__name__
+
+
+def is_shifted(previous_stage, stage, stages_to_train):
+    """
+    True if the window of the stage is the one of the previous stage shifted by one stage, in the same season (the
+    windows reaching the past seasons start with the matches of the season)
+    """
+    return previous_stage is not None and stage == previous_stage + 1 and stages_to_train is not None \
+        and 1 < stages_to_train < previous_stage
+
+
+class CountingDataset(WalkForwardDataset.WalkForwardDataset):
+    """
+    WalkForwardDataset counting the rows kept from the window of the previous stage
+    """
+    def clear(self):
+        super().clear()
+        self.n_kept = 0
+
+    def get_overlap(self, match_ids):
+        n_kept = super().get_overlap(match_ids)
+        self.n_kept = n_kept
+        return n_kept
+
+
+class TestWalkForwardDataset(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = synthetic_database.create()
+        cls.league = League.read_by_id(synthetic_database.league_id)
+        # a small buffer, so that the walk wraps around it and doubles it
+        cls.initial_capacity = WalkForwardDataset.initial_capacity
+        WalkForwardDataset.initial_capacity = 4
+
+    @classmethod
+    def tearDownClass(cls):
+        WalkForwardDataset.initial_capacity = cls.initial_capacity
+        synthetic_database.destroy(cls.directory)
+
+    def test_walk(self):
+        n_wrapped = 0
+        n_grown = 0
+        for season in synthetic_database.get_seasons():
+            for stages_to_train in (None, 1, 3, 5, 12):
+                for ml_train_input_id in (1, 2, 3, 4):
+                    for representation in ((1, 2, 3, 4) if ml_train_input_id in (1, 2) else (None,)):
+                        dataset = CountingDataset(ml_train_input_id, self.league, representation, stages_to_train,
+                                                  season)
+                        previous_stage = None
+                        for stage in stages:
+                            size = dataset.size
+                            with self.subTest(ml_train_input_id=ml_train_input_id, representation=representation,
+                                              stage=stage, stages_to_train=stages_to_train, season=season):
+                                self.assertEqual(
+                                    get_input_to_train(MachineLearningInput.get_input_to_train, ml_train_input_id,
+                                                       self.league, representation, stage, stages_to_train, season),
+                                    get_input_to_train(dataset.get_input_to_train, stage))
+                                if is_shifted(previous_stage, stage, stages_to_train) and size > 0:
+                                    self.assertGreater(dataset.n_kept, 0)
+                            previous_stage = stage
+                            if dataset.start + dataset.size > dataset.capacity:
+                                n_wrapped += 1
+                            if dataset.capacity > WalkForwardDataset.initial_capacity:
+                                n_grown += 1
+        self.assertGreater(n_wrapped, 0)
+        self.assertGreater(n_grown, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,114 +1,325 @@
-import gc
-import logging
+import os
 import sys
 import copy
-import heapq
-
-from threading import Thread
-from time import sleep
+import time
+import atexit
+import logging
+import sqlite3
+import threading
+from types import MappingProxyType
+from collections import OrderedDict
 
-import src.util.util as util
+log = logging.getLogger(__name__)
 
-cache_elements = {}
-cache_time_elements = []
+# memory budget of the whole cache: when exceeded, the least recently used elements are evicted
 max_cache_size = 1024*1024*512      # 512 MB
-log = logging.getLogger(__name__)
-block_caching_operation = False
+cache_size = 0                      # bytes accounted for the elements in cache
+# KEY: type, VALUE: Namespace
+namespaces = {}
+# reverse index of the entities, KEY: tag <entity, id> (EX: ("TEAM_API_ID", "8634")), VALUE: set of <type, element id>
+tags_index = {}
+lock = threading.RLock()
+# logical clock of the accesses: the global LRU element is the one with the smallest tick
+clock = 0
+# KEY: class, VALUE: names of its slots (of the class and of its bases), to measure the slotted entities
+slots_by_type = {}
+# snapshot mode: collections are stored read-only (tuple, frozenset, mapping proxy) and returned without copying;
+# who needs to modify a cached collection asks for a copy with copy_on_write
+# otherwise elements are copied when added and at each read
+snapshot_mode = True
+# second tier: the elements of the persistent namespaces are written in a SQLite file shared by all the processes
+# (GUI, crawler, experiments), so a warm start reads them from disk instead of rebuilding them from the DB
+persistent_cache = None
+persistent_cache_path = "data/cache/cache.sqlite"
+persistent_namespaces = {"MATCH_BY_ID", "MATCH_BY_API_ID", "MATCH_BY_LEAGUE", "MATCH_HOME", "MATCH_AWAY",
+                         "MATCH_BY_PLAYER_API_ID", "MATCH_GET_PLAYERS_BY_TEAM_API_ID",
+                         "TEAM_BY_ID", "TEAM_BY_API_ID", "TEAM_BY_LONG_NAME", "TEAM_BY_FIFA_API_ID", "TEAMS_BY_LEAGUE",
+                         "PLAYER_BY_ID", "PLAYER_BY_API_ID", "PLAYER_BY_NAME", "PLAYER_BY_FIFA_API_ID",
+                         "PLAYER_BY_TEAM_API_ID", "PLAYER_CURRENT_TEAM",
+                         "LEAGUE_BY_ID", "LEAGUE_BY_COUNTRY", "SEASONS_BY_LEAGUE",
+                         "TEAM_ATTRIBUTES", "PLAYER_ATTRIBUTES",
+                         "SHOTON_BY_MATCH_API_ID", "SHOTOFF_BY_MATCH_API_ID"}
 
 
-def get_cache_size():
-    global block_caching_operation
+class CacheEntry(object):
+    __slots__ = ["element", "size", "expire_at", "tick", "tags"]
 
-    block_caching_operation = True
-    cache_size = 0
-    for k, v in cache_elements.items():
-        cache_size += sys.getsizeof(k) + sys.getsizeof(v)  # byte
-    block_caching_operation = False
+    def __init__(self, element, size, expire_at, tick, tags):
+        self.element = element
+        self.size = size
+        self.expire_at = expire_at
+        self.tick = tick
+        self.tags = tags
+
+
+class Namespace(object):
+    """
+    Elements of one type, in LRU order (the least recently used first)
+    Optionally with a maximum number of elements and a time to live (seconds)
+    """
+    def __init__(self, type, max_elements=None, ttl=None):
+        self.type = type
+        self.max_elements = max_elements
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+
+
+def set_namespace(type, max_elements=None, ttl=None):
+    """
+    Configure the cache of type type
+    :param type:
+    :param max_elements: maximum number of elements kept, None for no limit
+    :param ttl: seconds an element stays valid after being added, None for no expiration
+    :return:
+    """
+    with lock:
+        namespace = get_namespace(type)
+        namespace.max_elements = max_elements
+        namespace.ttl = ttl
+        while max_elements is not None and len(namespace.entries) > max_elements:
+            remove_lru(namespace)
+
+
+def get_namespace(type):
+    try:
+        return namespaces[type]
+    except KeyError:
+        namespace = Namespace(type)
+        namespaces[type] = namespace
+        return namespace
+
+
+def snapshot(element):
+    """
+    Return the read-only version of the collection in input
+    :param element:
+    :return:
+    """
+    if type(element) is list:
+        return tuple(element)
+    if type(element) is set:
+        return frozenset(element)
+    if type(element) is dict:
+        return MappingProxyType(dict(element))
+    return element
 
-    if cache_size > 1024*1024:
-        cache_size_str = str(cache_size // (1024*1024))
-        measure = "MB"
-    elif cache_size > 1024:
-        cache_size_str = str(cache_size // (1024))
-        measure = "KB"
-    else:
-        cache_size_str = str(cache_size)
-        measure = "Byte"
 
+def copy_on_write(element):
+    """
+    Return a copy of the cached element that can be modified (EX: a list for a tuple)
+    :param element:
+    :return:
+    """
+    if type(element) is tuple:
+        return list(element)
+    if type(element) is frozenset:
+        return set(element)
+    if type(element) is MappingProxyType:
+        return dict(element)
+    return copy.copy(element)
 
-    return cache_size, cache_size_str, measure
 
+def get_size(element):
+    """
+    Estimate of the bytes taken by the element: the element itself, its attributes and the items it contains
+    (only the first level: domain objects shared among elements are counted once for each element)
+    :param element:
+    :return:
+    """
+    size = get_object_size(element)
+    if isinstance(element, (list, tuple, set, frozenset)):
+        for item in element:
+            size += get_object_size(item)
+    elif isinstance(element, (dict, MappingProxyType)):
+        for k, v in element.items():
+            size += sys.getsizeof(k) + sys.getsizeof(v)
+    return size
 
-def threaded_function(arg):
-    while True:
-        cache_size, cache_size_str, measure = get_cache_size()
-        log.debug("Size of the cache ["+cache_size_str+" "+measure+"]")
 
-        if cache_size > max_cache_size:
-            log.debug("Cache too big --> removing old elements")
-            n_elemenent_removed = 0
-            while cache_size > max_cache_size // 2 and len(cache_time_elements)>0:
-                time, remove_id = heapq.heappop(cache_time_elements)
-                del (cache_elements[remove_id])
-                n_elemenent_removed += 1
+def get_object_size(obj):
+    """
+    Bytes taken by the object and by the values of its attributes, in the __dict__ or in the slots (the entities)
+    :param obj:
+    :return:
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    for slot in get_slots(type(obj)):
+        try:
+            size += sys.getsizeof(getattr(obj, slot))
+        except AttributeError:
+            # slot not set
+            continue
+    return size
+
+
+def get_slots(cls):
+    """
+    Names of the slots of the class and of its bases
+    :param cls:
+    :return: tuple of slot names
+    """
+    try:
+        return slots_by_type[cls]
+    except KeyError:
+        pass
+    slots = []
+    for klass in cls.__mro__:
+        klass_slots = klass.__dict__.get("__slots__", ())
+        if isinstance(klass_slots, str):
+            klass_slots = (klass_slots, )
+        slots.extend(s for s in klass_slots if s not in ("__dict__", "__weakref__") and s not in slots)
+    slots_by_type[cls] = tuple(slots)
+    return slots_by_type[cls]
+
 
-                gc.collect()
-                cache_size, cache_size_str, measure = get_cache_size()
+def get_cache_size():
+    with lock:
+        size = cache_size
 
-            log.debug("Removed ["+n_elemenent_removed+"] elements")
-            log.debug("New size of the cache [" + cache_size_str + " " + measure + "]")
+    if size > 1024*1024:
+        cache_size_str = str(size // (1024*1024))
+        measure = "MB"
+    elif size > 1024:
+        cache_size_str = str(size // 1024)
+        measure = "KB"
+    else:
+        cache_size_str = str(size)
+        measure = "Byte"
 
-        sleep(60)
+    return size, cache_size_str, measure
 
 
-def init_cache():
-    thread = Thread(target=threaded_function, args=(10,))
-    thread.start()
+def get_tags(tags):
+    """
+    Normalize the tags <entity, id>: ids as strings, tags without id discarded
+    :param tags:
+    :return:
+    """
+    return tuple(set((entity, str(id)) for entity, id in tags if id is not None and str(id) not in ("", "None")))
 
 
-def add_element(element_id, element, type = "DEFAULT"):
+def add_element(element_id, element, type="DEFAULT", tags=()):
     '''
     Add the element with the element_id in the cache of type type
     If no type is specified, the default cache is used
     :param element_id:
     :param element:
     :param type:
-    :return:
+    :param tags: the entities the element depends on, as <entity, id> (EX: ("TEAM_API_ID", 8634)):
+                 invalidate(tag) removes it
+    :return: the element as stored in cache (in snapshot mode, the read-only version of the collections)
     '''
-    global block_caching_operation
+    if snapshot_mode:
+        element = snapshot(element)
+    else:
+        element = copy.copy(element)
+    if not element_id:
+        return element
+    key = str(element_id)
+    log.debug(msg="CACHE > adding element with ID [" + key + "_" + type + "]")
+    tags = get_tags(tags)
+
+    with lock:
+        namespace = get_namespace(type)
+        add_entry(namespace, key, element, tags)
+    if is_persistent(namespace):
+        if isinstance(element, MappingProxyType):
+            persistent_cache.add(type, key, dict(element), tags)
+        else:
+            persistent_cache.add(type, key, element, tags)
+    return element
+
+
+def add_entry(namespace, key, element, tags):
+    """
+    Store the element in the namespace, evicting the least recently used elements if needed (the lock must be held)
+    :param namespace:
+    :param key:
+    :param element:
+    :param tags: normalized tags
+    :return:
+    """
+    global cache_size, clock
+
+    size = get_size(element)
+    remove_entry(namespace, key)
+
+    expire_at = None
+    if namespace.ttl is not None:
+        expire_at = time.monotonic() + namespace.ttl
+    clock += 1
+    namespace.entries[key] = CacheEntry(element, size, expire_at, clock, tags)
+    namespace.size += size
+    cache_size += size
+    for tag in tags:
+        try:
+            tags_index[tag].add((namespace.type, key))
+        except KeyError:
+            tags_index[tag] = {(namespace.type, key)}
+
+    if namespace.max_elements is not None and len(namespace.entries) > namespace.max_elements:
+        remove_lru(namespace)
+    while cache_size > max_cache_size:
+        if not remove_global_lru():
+            break
 
-    while block_caching_operation:
-        pass
-    if element_id:
-        id = str(element_id)+"_"+type
-        log.debug(msg="CACHE > adding element with ID ["+id+"]")
-        cache_elements[id] = copy.copy(element)
-        heapq.heappush(cache_time_elements, (util.get_curr_time_millis(), id))
 
 def get_element(element_id, type="DEFAULT"):
     '''
     Return an element in the cache, identified by element_id
     If no type is defined, the default cache are used
+    Elements of the persistent namespaces not in memory are read from the persistent cache
     Throw a KeyError if no element is in the cache
     :param element_id:
     :param type:
     :return:
     '''
-    if element_id:
-        log.debug(msg="get_element with ID [" + str(element_id) + "_" + type + "]")
-        return copy.copy(cache_elements[str(element_id)+"_"+type])
-    else:
+    global clock
+
+    if not element_id:
         log.debug(msg="get_element with None ID --> raising KeyError")
         raise KeyError
 
+    key = str(element_id)
+    with lock:
+        namespace = get_namespace(type)
+        entry = namespace.entries.get(key)
+        if entry is not None and entry.expire_at is not None and entry.expire_at < time.monotonic():
+            remove_entry(namespace, key)
+            entry = None
+        if entry is not None:
+            namespace.entries.move_to_end(key)
+            clock += 1
+            entry.tick = clock
+            element = entry.element
+        elif is_persistent(namespace):
+            # miss in memory --> element written by a previous run or by another process
+            element, tags = persistent_cache.get(type, key)
+            if snapshot_mode:
+                element = snapshot(element)
+            add_entry(namespace, key, element, tags)
+        else:
+            raise KeyError(key)
+    if snapshot_mode:
+        return element
+    return copy.copy(element)
+
+
+def del_element(element_id, type="DEFAULT"):
+    if not element_id:
+        return
+    log.debug(msg="CACHE > deleting element with ID [" + str(element_id) + "_" + type + "]")
+    with lock:
+        try:
+            remove_entry(namespaces[type], str(element_id))
+        except KeyError:
+            pass
+        if is_persistent(get_namespace(type)):
+            persistent_cache.delete(type, str(element_id))
 
-def del_element(element_id, type = "DEFAULT"):
-    try:
-        if element_id:
-            log.debug(msg="CACHE > deleting element with ID [" + str(element_id) + "_" + type + "]")
-            del(cache_elements[str(element_id)+"_"+type])
-    except KeyError:
-        pass
 
 def reset(type="DEFAULT"):
     '''
@@ -116,13 +327,151 @@ def reset(type="DEFAULT"):
     :param type:
     :return:
     '''
+    global cache_size
+
     log.debug("CACHE > resetting element of type [" + type + "]")
-    for k,v in cache_elements.items():
-        if k.endswith(type):
-            del(cache_elements[k])
+    with lock:
+        namespace = get_namespace(type)
+        if is_persistent(namespace):
+            persistent_cache.reset(type)
+        for key, entry in namespace.entries.items():
+            remove_tags(type, key, entry)
+        cache_size -= namespace.size
+        namespace.entries = OrderedDict()
+        namespace.size = 0
+
+
+def invalidate(*tags):
+    '''
+    Delete all the elements depending on the entities in input, whatever their type
+    :param tags: <entity, id> (EX: ("TEAM_API_ID", 8634))
+    :return: number of elements deleted
+    '''
+    n_removed = 0
+    tags = get_tags(tags)
+    with lock:
+        if persistent_cache is not None:
+            persistent_cache.invalidate(tags)
+        for tag in tags:
+            log.debug("CACHE > invalidating elements of [" + tag[0] + " " + tag[1] + "]")
+            for type, key in tags_index.pop(tag, ()):
+                try:
+                    namespace = namespaces[type]
+                except KeyError:
+                    continue
+                if key in namespace.entries:
+                    remove_entry(namespace, key)
+                    n_removed += 1
+    return n_removed
+
+
+def is_persistent(namespace):
+    return persistent_cache is not None and namespace.type in persistent_namespaces and namespace.ttl is None
+
+
+def init_persistent_cache(database_path=None, data_path=None):
+    """
+    Enable the persistent tier of the cache
+    :param database_path: SQLite file of the persistent cache, relative to the project directory
+    :param data_path: DB the elements are read from (the one of SQLLite by default)
+    :return: False if the persistent cache is not available
+    """
+    global persistent_cache
+
+    import src.util.util as util
+    import src.util.SQLLite as SQLLite
+    import src.util.PersistentCache as PersistentCache
+
+    if database_path is None:
+        database_path = persistent_cache_path
+    if not os.path.isabs(database_path):
+        database_path = util.get_project_directory() + database_path
+    if data_path is None:
+        data_path = SQLLite.get_connection().database_path
+    try:
+        os.makedirs(os.path.dirname(database_path), exist_ok=True)
+        persistent_cache = PersistentCache.PersistentCache(database_path, data_path)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("Persistent cache not available: " + str(e))
+        persistent_cache = None
+        return False
+    return True
+
+
+@atexit.register
+def flush():
+    """
+    Write on disk the elements of the persistent namespaces still in memory
+    :return:
+    """
+    if persistent_cache is not None:
+        persistent_cache.flush()
+
+
+def remove_entry(namespace, key):
+    """
+    Remove the element from the namespace, if any (the lock must be held)
+    :param namespace:
+    :param key:
+    :return:
+    """
+    global cache_size
+
+    entry = namespace.entries.pop(key, None)
+    if entry is not None:
+        namespace.size -= entry.size
+        cache_size -= entry.size
+        remove_tags(namespace.type, key, entry)
+
+
+def remove_tags(type, key, entry):
+    """
+    Remove the element from the reverse index (the lock must be held)
+    :param type:
+    :param key:
+    :param entry:
+    :return:
+    """
+    for tag in entry.tags:
+        try:
+            keys = tags_index[tag]
+        except KeyError:
+            continue
+        keys.discard((type, key))
+        if len(keys) == 0:
+            del tags_index[tag]
+
+
+def remove_lru(namespace):
+    key = next(iter(namespace.entries))
+    log.debug("CACHE > evicting element with ID [" + key + "_" + namespace.type + "]")
+    remove_entry(namespace, key)
+
+
+def remove_global_lru():
+    """
+    Evict the least recently used element of the whole cache (the lock must be held)
+    Each namespace is in LRU order, so only the first element of each namespace is compared
+    :return: False if the cache is empty
+    """
+    lru_namespace = None
+    lru_tick = None
+    for namespace in namespaces.values():
+        if len(namespace.entries) == 0:
+            continue
+        tick = next(iter(namespace.entries.values())).tick
+        if lru_tick is None or tick < lru_tick:
+            lru_namespace = namespace
+            lru_tick = tick
+    if lru_namespace is None:
+        return False
+    remove_lru(lru_namespace)
+    return True
+
 
 def print_status():
-    print(sys.getsizeof(cache_elements), "Bytes")
-    for k,v in cache_elements.items():
-        if type(v)==list:
-            print(k, len(v))
\ No newline at end of file
+    size, cache_size_str, measure = get_cache_size()
+    print("Cache size:", cache_size_str, measure)
+    with lock:
+        for type, namespace in namespaces.items():
+            print(type, len(namespace.entries), "elements", namespace.size, "Bytes")
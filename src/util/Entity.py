@@ -0,0 +1,153 @@
+import logging
+
+import src.util.SQLLite as SQLLite
+import src.util.util as util
+
+log = logging.getLogger(__name__)
+
+# Domain entities with __slots__ generated from the schema in SQLLite.ini: one slot for each column, no __dict__
+# Rarely used columns are organized in lazy groups: they are not read with the entity, but from the DB on first
+# access of one column of the group (all the columns of the group together)
+schema_file = "src/util/SQLLite.ini"
+# KEY: table, VALUE: columns in the schema
+columns_by_table = {}
+
+
+class Entity(object):
+    __slots__ = ()
+    # table of the entity, and the columns read on first access
+    table = None
+    lazy_columns = frozenset()
+
+    def set_columns(self, sqllite_row):
+        """
+        Set the attributes of the row (dictionary column --> value); columns not in the schema are discarded
+        :param sqllite_row:
+        :return:
+        """
+        for attribute, value in sqllite_row.items():
+            try:
+                setattr(self, attribute, value)
+            except AttributeError:
+                log.debug(type(self).__name__ + " :: column not in the schema [" + attribute + "]")
+
+    def load_columns(self, columns):
+        """
+        Read the columns in input from the DB, setting the attributes (None if the entity is not in the DB)
+        :param columns:
+        :return:
+        """
+        connection = SQLLite.get_connection()
+        table_columns = set(connection.getColumnFromTable(self.table))
+        db_columns = [column for column in columns if column in table_columns]
+        values = {}
+        entity_id = getattr(self, "id", None)
+        if len(db_columns) > 0 and not util.is_None(entity_id):
+            sqllite_rows = connection.execute_select("SELECT " + ", ".join(db_columns) + " FROM " + self.table
+                                                     + " WHERE id = ?;", [str(entity_id)])
+            if len(sqllite_rows) > 0:
+                values = dict(zip(db_columns, sqllite_rows[0]))
+        for column in columns:
+            setattr(self, column, values.get(column))
+
+
+class LazyColumn(object):
+    """
+    Descriptor of a column of a lazy group: the value is kept in the slot "_<column>"
+    """
+    def __init__(self, name, slot, group):
+        self.name = name
+        self.slot = slot
+        self.group = group
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return self.slot.__get__(instance, owner)
+        except AttributeError:
+            pass
+        instance.load_columns(self.group)
+        return self.slot.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        self.slot.__set__(instance, value)
+
+    def __delete__(self, instance):
+        self.slot.__delete__(instance)
+
+
+def get_columns(table):
+    """
+    Return the columns of the table, as defined in the schema
+    :param table:
+    :return:
+    """
+    try:
+        return columns_by_table[table]
+    except KeyError:
+        pass
+    columns = tuple(util.read_config_file(schema_file, table).keys())
+    columns_by_table[table] = columns
+    return columns
+
+
+def get_slots(table, lazy_groups=(), extra=()):
+    """
+    Return the __slots__ of the entity of the table: the lazy columns are stored in the slots "_<column>"
+    :param table:
+    :param lazy_groups: tuples of columns read together on first access
+    :param extra: slots not in the schema
+    :return:
+    """
+    lazy_columns = set(column for group in lazy_groups for column in group)
+    return tuple("_" + column if column in lazy_columns else column for column in get_columns(table)) + tuple(extra)
+
+
+def init_lazy_columns(entity_class, lazy_groups):
+    """
+    Install the LazyColumn descriptors of the lazy groups in the entity class (after the class is created: a slot
+    cannot have the same name of a class attribute)
+    :param entity_class:
+    :param lazy_groups:
+    :return:
+    """
+    for group in lazy_groups:
+        for column in group:
+            setattr(entity_class, column, LazyColumn(column, getattr(entity_class, "_" + column), tuple(group)))
+    entity_class.lazy_columns = frozenset(column for group in lazy_groups for column in group)
+
+
+def get_row_factory(entity_class):
+    """
+    Return the row_factory (SQLiteConnection.select_iter) building the objects of the class directly from the row
+    tuples, without intermediate dictionaries; for entities, the columns not in the schema are discarded
+    :param entity_class: class whose constructor takes the id
+    :return:
+    """
+    def row_factory(column_names):
+        id_index = column_names.index("id")
+        if issubclass(entity_class, Entity):
+            schema_columns = set(get_columns(entity_class.table))
+            column_names = [column if column in schema_columns else None for column in column_names]
+        attributes = [(i, column) for i, column in enumerate(column_names) if column is not None]
+
+        def build(sqllite_row):
+            entity = entity_class(sqllite_row[id_index])
+            for i, column in attributes:
+                setattr(entity, column, sqllite_row[i])
+            return entity
+        return build
+    return row_factory
+
+
+def get_select_columns(entity_class):
+    """
+    Return the column filter reading the columns of the entity, but the lazy ones
+    :param entity_class:
+    :return:
+    """
+    table_columns = SQLLite.get_connection().getColumnFromTable(entity_class.table)
+    schema_columns = set(get_columns(entity_class.table))
+    return ",".join(column for column in table_columns
+                    if column in schema_columns and column not in entity_class.lazy_columns)
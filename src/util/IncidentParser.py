@@ -0,0 +1,272 @@
+import io
+import os
+import atexit
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+from src.util import util
+from bs4 import BeautifulSoup
+
+try:
+    # lxml is used when installed, the standard library parser otherwise
+    from lxml.etree import iterparse, XMLSyntaxError as ParseError
+except ImportError:
+    from xml.etree.ElementTree import iterparse, ParseError
+
+log = logging.getLogger(__name__)
+
+# Parser of the incident columns of Match (goal, shoton, shotoff, ...), XML strings as:
+#   <shoton><value><stats><shoton>1</shoton></stats><elapsed>3</elapsed>...<coordinates><value>11</value>
+#   <value>9</value></coordinates>...</value>...</shoton>
+# Each <value> becomes an Incident; missing tags are None, stats are a tuple of pairs <name, value>
+Incident = namedtuple("Incident", ["id", "type", "subtype", "team", "player1", "player2", "elapsed", "elapsed_plus",
+                                   "x", "y", "n", "sortorder", "event_incident_typefk", "del_", "stats"],
+                      defaults=(None,) * 15)
+# KEY: tag, VALUE: field of Incident
+field_by_tag = {field: field for field in Incident._fields if field not in ("x", "y", "del_", "stats")}
+field_by_tag["del"] = "del_"
+
+# parsed incidents persisted across runs, KEY: <match_api_id, incident type, hash of the string>
+disk_cache_path = "data/cache/incidents.sqlite"
+# number of parsed strings kept in memory before writing them in the disk cache
+disk_cache_flush_size = 200
+# seconds waited on the disk cache locked by another process (the workers of a backtest write it concurrently)
+disk_cache_timeout = 30
+disk_caches = {}
+lock = threading.Lock()
+
+
+def parse(incidents_str):
+    """
+    Parse the XML string of an incident column
+    :param incidents_str:
+    :return: list of Incident
+    """
+    if util.is_None(incidents_str) or len(incidents_str) == 0:
+        return []
+    try:
+        return parse_stream(incidents_str)
+    except ParseError:
+        # not well-formed string --> lenient parser
+        log.debug("Incidents not well-formed, lenient parsing")
+        return parse_lenient(incidents_str)
+
+
+def parse_stream(incidents_str):
+    """
+    Streaming parse: the incidents are built while the tags are read, each <value> is dropped once converted
+    :param incidents_str:
+    :return:
+    """
+    incidents = []
+    depth = 0
+    fields = None
+    coordinates = None
+    stats = None
+    for event, element in iterparse(io.BytesIO(incidents_str.encode("utf-8")), events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 2:
+                fields = {}
+            elif depth == 3:
+                if element.tag == "coordinates":
+                    coordinates = []
+                elif element.tag == "stats":
+                    stats = []
+            continue
+
+        if depth == 4:
+            # <value> of the coordinates, or a stat
+            if coordinates is not None:
+                coordinates.append(get_text(element))
+            elif stats is not None:
+                stats.append((element.tag, get_text(element)))
+        elif depth == 3:
+            tag = element.tag
+            if tag == "coordinates":
+                if len(coordinates) == 2:
+                    fields["x"], fields["y"] = coordinates
+                coordinates = None
+            elif tag == "stats":
+                fields["stats"] = tuple(stats)
+                stats = None
+            elif tag in field_by_tag:
+                fields[field_by_tag[tag]] = get_text(element)
+            else:
+                log.debug("Incident tag not managed [ " + str(tag) + " ]")
+        elif depth == 2:
+            incidents.append(Incident(**fields))
+            element.clear()
+        depth -= 1
+    return incidents
+
+
+def get_text(element):
+    if element.text is None:
+        return None
+    return element.text.strip()
+
+
+def parse_lenient(incidents_str):
+    """
+    Parse with html.parser, that accepts not well-formed strings
+    :param incidents_str:
+    :return:
+    """
+    incidents = []
+    bs = BeautifulSoup(incidents_str, "html.parser")
+    if len(bs.contents) == 0 or not hasattr(bs.contents[0], "find_all"):
+        return incidents
+    for value in bs.contents[0].find_all("value", recursive=False):
+        fields = {}
+        for tag in value.find_all(True, recursive=False):
+            if tag.name == "coordinates":
+                coordinates = [str(coordinate.string).strip() for coordinate in tag.find_all("value")]
+                if len(coordinates) == 2:
+                    fields["x"], fields["y"] = coordinates
+            elif tag.name == "stats":
+                fields["stats"] = tuple((stat.name, str(stat.string).strip())
+                                        for stat in tag.find_all(True, recursive=False))
+            elif tag.name in field_by_tag:
+                fields[field_by_tag[tag.name]] = None if tag.string is None else str(tag.string).strip()
+        incidents.append(Incident(**fields))
+    return incidents
+
+
+def from_dict(incident):
+    """
+    Return the Incident of a crawled incident (dictionary as read from the json of enetscores)
+    :param incident:
+    :return:
+    """
+    fields = {}
+    for tag, value in incident.items():
+        if tag == "coordinates":
+            if type(value) is list and len(value) == 2:
+                fields["x"], fields["y"] = [str(coordinate) for coordinate in value]
+        elif tag == "stats":
+            if type(value) is dict:
+                fields["stats"] = tuple((name, str(stat)) for name, stat in value.items())
+        elif tag in field_by_tag and value is not None:
+            fields[field_by_tag[tag]] = str(value)
+    return Incident(**fields)
+
+
+def read_incidents(match_api_id, incident_type, incidents_str):
+    """
+    Return the incidents of the match, parsing the string only if it is not in the disk cache
+    :param match_api_id:
+    :param incident_type: name of the incident column of Match
+    :param incidents_str:
+    :return: list of Incident
+    """
+    if util.is_None(incidents_str):
+        return []
+
+    digest = hashlib.sha1(incidents_str.encode("utf-8")).hexdigest()
+    disk_cache = get_disk_cache()
+    if disk_cache is not None:
+        try:
+            return disk_cache.get(str(match_api_id), incident_type, digest)
+        except KeyError:
+            pass
+
+    incidents = parse(incidents_str)
+    if disk_cache is not None:
+        disk_cache.add(str(match_api_id), incident_type, digest, incidents)
+    return incidents
+
+
+class IncidentDiskCache(object):
+    """
+    Parsed incidents stored in a SQLite file, one row for each <match, incident type>
+    A row is valid only for the string with the same hash: a re-crawled match is parsed again
+    """
+    def __init__(self, database_path):
+        self.connection = sqlite3.connect(database_path, timeout=disk_cache_timeout, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS Parsed_Incident(match_api_id TEXT, incident_type TEXT, "
+                                "hash TEXT, incidents BLOB, PRIMARY KEY (match_api_id, incident_type))")
+        self.connection.commit()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get(self, match_api_id, incident_type, digest):
+        key = (match_api_id, incident_type)
+        with self.lock:
+            try:
+                pending_digest, incidents = self.pending[key]
+                if pending_digest == digest:
+                    return incidents
+            except KeyError:
+                pass
+            row = self.connection.execute("SELECT hash, incidents FROM Parsed_Incident "
+                                          "WHERE match_api_id = ? AND incident_type = ?;", key).fetchone()
+        if row is None or row[0] != digest:
+            raise KeyError(key)
+        return [Incident._make(fields) for fields in pickle.loads(row[1])]
+
+    def add(self, match_api_id, incident_type, digest, incidents):
+        with self.lock:
+            self.pending[(match_api_id, incident_type)] = (digest, incidents)
+            if len(self.pending) >= disk_cache_flush_size:
+                self.flush_pending()
+
+    def flush(self):
+        with self.lock:
+            self.flush_pending()
+
+    def flush_pending(self):
+        if len(self.pending) == 0:
+            return
+        rows = [(match_api_id, incident_type, digest,
+                 pickle.dumps([tuple(incident) for incident in incidents], pickle.HIGHEST_PROTOCOL))
+                for (match_api_id, incident_type), (digest, incidents) in self.pending.items()]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO Parsed_Incident VALUES (?, ?, ?, ?);", rows)
+        self.pending = {}
+
+
+def get_disk_cache():
+    """
+    Return the disk cache of the current process, None if it is disabled or not available
+    :return:
+    """
+    if disk_cache_path is None:
+        return None
+    pid = os.getpid()
+    try:
+        return disk_caches[pid]
+    except KeyError:
+        pass
+
+    with lock:
+        if pid not in disk_caches:
+            if os.path.isabs(disk_cache_path):
+                database_path = disk_cache_path
+            else:
+                database_path = util.get_project_directory() + disk_cache_path
+            try:
+                os.makedirs(os.path.dirname(database_path), exist_ok=True)
+                disk_caches[pid] = IncidentDiskCache(database_path)
+            except (OSError, sqlite3.Error) as e:
+                log.warning("Incident disk cache not available: " + str(e))
+                disk_caches[pid] = None
+    return disk_caches[pid]
+
+
+@atexit.register
+def flush():
+    """
+    Write the parsed incidents still in memory in the disk cache
+    Registered at exit, and called by the forked processes that do not run the exit handlers (Backtest workers)
+    :return:
+    """
+    disk_cache = disk_caches.get(os.getpid())
+    if disk_cache is not None:
+        disk_cache.flush()
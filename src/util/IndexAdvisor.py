@@ -0,0 +1,98 @@
+import logging
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# the filters are recorded only when the advisor is enabled (it costs a lock on every select)
+enabled = False
+# KEY: <table, filtered columns, operator>, VALUE: number of times the filter has been used
+filters_used = OrderedDict()
+lock = threading.Lock()
+# the statements built while explaining the filters must not be recorded
+explaining = threading.local()
+
+
+def record(table_name, columns, operator):
+    """
+    Keep track of a filter used by a select
+    :param table_name:
+    :param columns: tuple of the columns in the WHERE clause
+    :param operator: AND, OR, LIKE, PREFIX or IN
+    :return:
+    """
+    if not enabled or len(columns) == 0 or getattr(explaining, "active", False):
+        return
+    key = (table_name, tuple(columns), operator)
+    with lock:
+        filters_used[key] = filters_used.get(key, 0) + 1
+
+
+def reset():
+    with lock:
+        filters_used.clear()
+
+
+def get_report(connection=None):
+    """
+    Ask the query planner how each recorded filter is answered
+    A filter answered by a full scan of the table is reported as a missing index
+    :param connection: SQLiteConnection, the one of the current process by default
+    :return: list of dict <table, columns, operator, count, plan, missing_index, suggestion>
+    """
+    if connection is None:
+        import src.util.SQLLite as SQLLite
+        connection = SQLLite.get_connection()
+
+    with lock:
+        filters = list(filters_used.items())
+
+    report = []
+    for (table_name, columns, operator), count in filters:
+        explaining.active = True
+        try:
+            select, params = connection.get_select_statement(table_name, "*",
+                                                             OrderedDict((column, [""] if operator == "IN" else "")
+                                                                         for column in columns),
+                                                             operator)
+        finally:
+            explaining.active = False
+        try:
+            plan = [row[-1] for row in connection.execute_select("EXPLAIN QUERY PLAN " + select, params)]
+        except Exception as e:
+            log.warning("Impossible to explain the filter on [" + table_name + "]: " + str(e))
+            continue
+
+        missing_index = any(detail.startswith("SCAN") and "USING" not in detail for detail in plan)
+        suggestion = None
+        if missing_index and operator != "LIKE":
+            suggestion = "CREATE INDEX idx_" + table_name.lower() + "_" + "_".join(columns) \
+                         + " ON " + table_name + "(" + ",".join(columns) + ");"
+
+        report.append({"table": table_name,
+                       "columns": columns,
+                       "operator": operator,
+                       "count": count,
+                       "plan": plan,
+                       "missing_index": missing_index,
+                       "suggestion": suggestion})
+
+    report.sort(key=lambda r: (not r["missing_index"], -r["count"]))
+    return report
+
+
+def print_report(connection=None):
+    """
+    Print the filters used so far, the ones answered by full table scans first
+    :param connection:
+    :return:
+    """
+    print("> Index advisor")
+    for r in get_report(connection):
+        status = "FULL SCAN" if r["missing_index"] else "ok"
+        print("\t[" + status + "]", r["table"], "(" + (" " + r["operator"] + " ").join(r["columns"]) + ")",
+              "used", r["count"], "times")
+        for detail in r["plan"]:
+            print("\t\t", detail)
+        if r["suggestion"] is not None:
+            print("\t\t-->", r["suggestion"])
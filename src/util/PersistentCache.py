@@ -0,0 +1,269 @@
+import os
+import pickle
+import hashlib
+import sqlite3
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# bump when the domain classes change: the elements pickled by a previous version are not read anymore
+persistent_cache_version = 2
+# number of elements kept in memory before writing them on disk
+flush_size = 100
+# invalidations kept in the log (Cache_Invalidation) after a vacuum: the elements in memory computed before the
+# invalidations no longer in the log are not written
+invalidation_log_size = 10000
+
+
+class PersistentCache(object):
+    """
+    Second tier of the Cache: elements pickled in a SQLite file, shared by all the processes of the application
+    (GUI, crawler, experiments) and kept across restarts
+
+    Keys are versioned: an element is valid only with the current version of its namespace, so resetting a
+    namespace is a single update; the tags of the elements are mirrored on disk to invalidate them by entity
+    The elements are valid only for the DB they have been read from (its identity is stored as the version of the
+    namespace __DATABASE__), and every invalidation is logged, so that the elements still in memory are not written
+    when another process has invalidated them in the meantime
+    """
+    def __init__(self, database_path, data_path=None):
+        self.database_path = database_path
+        self.connections = {}
+        self.lock = threading.RLock()
+        # KEY: <type, key>, VALUE: <pickled element, tags>, not written yet
+        self.pending = {}
+        # last invalidation in the log when the first pending element has been added
+        self.pending_since = 0
+        self.data_identity = get_data_identity(data_path)
+
+        connection = self.get_connection()
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS Cache_Element(type TEXT, key TEXT, version INTEGER, "
+                               "value BLOB, PRIMARY KEY (type, key))")
+            connection.execute("CREATE TABLE IF NOT EXISTS Cache_Tag(entity TEXT, id TEXT, type TEXT, key TEXT)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_cache_tag ON Cache_Tag(entity, id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_cache_tag_element ON Cache_Tag(type, key)")
+            connection.execute("CREATE TABLE IF NOT EXISTS Namespace_Version(type TEXT PRIMARY KEY, version INTEGER)")
+            connection.execute("CREATE TABLE IF NOT EXISTS Cache_Invalidation(seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "entity TEXT, id TEXT)")
+            connection.execute("INSERT OR IGNORE INTO Namespace_Version VALUES ('__CACHE__', ?)",
+                               (persistent_cache_version,))
+            stored_version = connection.execute("SELECT version FROM Namespace_Version "
+                                                "WHERE type = '__CACHE__'").fetchone()[0]
+            stored_identity = connection.execute("SELECT version FROM Namespace_Version "
+                                                 "WHERE type = '__DATABASE__'").fetchone()
+        if stored_version != persistent_cache_version:
+            log.debug("Persistent cache of a previous version --> cleared")
+            self.clear()
+        elif self.data_identity is not None and (stored_identity is None or stored_identity[0] != self.data_identity):
+            log.debug("Persistent cache of another DB --> cleared")
+            self.clear()
+
+    def get_connection(self):
+        """
+        Return the connection of the current process (connections cannot be shared by forked processes)
+        :return:
+        """
+        pid = os.getpid()
+        try:
+            return self.connections[pid]
+        except KeyError:
+            pass
+        connection = sqlite3.connect(self.database_path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self.connections[pid] = connection
+        return connection
+
+    def get(self, type, key):
+        """
+        Return the element and its tags
+        Throw a KeyError if the element is not on disk, or it is of a previous version of its namespace
+        :param type:
+        :param key:
+        :return:
+        """
+        with self.lock:
+            try:
+                value = self.pending[(type, key)][0]
+            except KeyError:
+                row = self.get_connection().execute("SELECT E.value FROM Cache_Element E "
+                                                    "JOIN Namespace_Version V ON V.type = E.type "
+                                                    "AND V.version = E.version "
+                                                    "WHERE E.type = ? AND E.key = ?", (type, key)).fetchone()
+                if row is None:
+                    raise KeyError(key)
+                value = row[0]
+        return pickle.loads(value)
+
+    def add(self, type, key, element, tags):
+        """
+        Write-through of an element added in the memory tier
+        :param type:
+        :param key:
+        :param element:
+        :param tags: normalized tags <entity, id>
+        :return:
+        """
+        try:
+            value = pickle.dumps((element, tags), pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            log.debug("Element [" + key + "_" + type + "] not persisted: " + str(e))
+            return
+        with self.lock:
+            if len(self.pending) == 0:
+                self.pending_since = self.get_last_invalidation()
+            self.pending[(type, key)] = (value, tags)
+            if len(self.pending) >= flush_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Write on disk the elements still in memory, except the ones invalidated by other processes after they
+        have been added
+        :return:
+        """
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+            connection = self.get_connection()
+            with connection:
+                # the invalidations of the other processes wait until the elements are written
+                connection.execute("BEGIN IMMEDIATE")
+                for type, key in self.get_invalidated_pending(connection):
+                    log.debug("Element [" + key + "_" + type + "] invalidated by another process, not persisted")
+                    del self.pending[(type, key)]
+                for (type, key), (value, tags) in self.pending.items():
+                    connection.execute("INSERT OR IGNORE INTO Namespace_Version VALUES (?, 0)", (type,))
+                    connection.execute("INSERT OR REPLACE INTO Cache_Element SELECT ?, ?, version, ? "
+                                       "FROM Namespace_Version WHERE type = ?", (type, key, value, type))
+                    connection.execute("DELETE FROM Cache_Tag WHERE type = ? AND key = ?", (type, key))
+                    connection.executemany("INSERT INTO Cache_Tag VALUES (?, ?, ?, ?)",
+                                           [(entity, id, type, key) for entity, id in tags])
+            self.pending = {}
+
+    def delete(self, type, key):
+        with self.lock:
+            self.pending.pop((type, key), None)
+            connection = self.get_connection()
+            with connection:
+                connection.execute("DELETE FROM Cache_Element WHERE type = ? AND key = ?", (type, key))
+                connection.execute("DELETE FROM Cache_Tag WHERE type = ? AND key = ?", (type, key))
+
+    def get_last_invalidation(self, connection=None):
+        """
+        Return the sequence number of the last invalidation in the log
+        :param connection:
+        :return:
+        """
+        if connection is None:
+            connection = self.get_connection()
+        row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'Cache_Invalidation'").fetchone()
+        return 0 if row is None else row[0]
+
+    def get_invalidated_pending(self, connection):
+        """
+        Return the elements in memory invalidated (by entity, by reset of their namespace or by clear) after the
+        first of them has been added
+        :param connection:
+        :return: list of <type, key>
+        """
+        invalidations = connection.execute("SELECT seq, entity, id FROM Cache_Invalidation WHERE seq > ? "
+                                           "ORDER BY seq", (self.pending_since,)).fetchall()
+        if len(invalidations) == 0:
+            return []
+        if invalidations[0][0] > self.pending_since + 1:
+            # the sequence numbers have no holes: the log has been vacuumed since, the invalidations in between are
+            # unknown
+            return list(self.pending.keys())
+
+        tags = set((entity, id) for seq, entity, id in invalidations)
+        if ("__ALL__", "") in tags:
+            return list(self.pending.keys())
+        return [(type, key) for (type, key), (value, element_tags) in self.pending.items()
+                if ("__NAMESPACE__", type) in tags or not tags.isdisjoint(element_tags)]
+
+    def invalidate(self, tags):
+        """
+        Delete the elements depending on the entities in input
+        :param tags: normalized tags <entity, id>
+        :return:
+        """
+        with self.lock:
+            self.flush()
+            connection = self.get_connection()
+            with connection:
+                for entity, id in tags:
+                    connection.execute("DELETE FROM Cache_Element WHERE EXISTS (SELECT 1 FROM Cache_Tag T "
+                                       "WHERE T.entity = ? AND T.id = ? AND T.type = Cache_Element.type "
+                                       "AND T.key = Cache_Element.key)", (entity, id))
+                    connection.execute("DELETE FROM Cache_Tag WHERE entity = ? AND id = ?", (entity, id))
+                connection.executemany("INSERT INTO Cache_Invalidation(entity, id) VALUES (?, ?)", tags)
+
+    def reset(self, type):
+        """
+        Invalidate all the elements of the namespace, increasing its version
+        The elements of the previous version are removed by vacuum
+        :param type:
+        :return:
+        """
+        with self.lock:
+            for pending_type, pending_key in list(self.pending.keys()):
+                if pending_type == type:
+                    del self.pending[(pending_type, pending_key)]
+            connection = self.get_connection()
+            with connection:
+                connection.execute("INSERT OR IGNORE INTO Namespace_Version VALUES (?, 0)", (type,))
+                connection.execute("UPDATE Namespace_Version SET version = version + 1 WHERE type = ?", (type,))
+                connection.execute("INSERT INTO Cache_Invalidation(entity, id) VALUES ('__NAMESPACE__', ?)", (type,))
+
+    def vacuum(self):
+        """
+        Remove the elements of previous versions of their namespace
+        :return:
+        """
+        with self.lock:
+            connection = self.get_connection()
+            with connection:
+                connection.execute("DELETE FROM Cache_Element WHERE NOT EXISTS (SELECT 1 FROM Namespace_Version V "
+                                   "WHERE V.type = Cache_Element.type AND V.version = Cache_Element.version)")
+                connection.execute("DELETE FROM Cache_Tag WHERE NOT EXISTS (SELECT 1 FROM Cache_Element E "
+                                   "WHERE E.type = Cache_Tag.type AND E.key = Cache_Tag.key)")
+                connection.execute("DELETE FROM Cache_Invalidation WHERE seq <= ?",
+                                   (self.get_last_invalidation(connection) - invalidation_log_size,))
+
+    def clear(self):
+        with self.lock:
+            self.pending = {}
+            connection = self.get_connection()
+            with connection:
+                connection.execute("DELETE FROM Cache_Element")
+                connection.execute("DELETE FROM Cache_Tag")
+                connection.execute("DELETE FROM Namespace_Version")
+                connection.execute("INSERT INTO Namespace_Version VALUES ('__CACHE__', ?)",
+                                   (persistent_cache_version,))
+                if self.data_identity is not None:
+                    connection.execute("INSERT INTO Namespace_Version VALUES ('__DATABASE__', ?)",
+                                       (self.data_identity,))
+                connection.execute("INSERT INTO Cache_Invalidation(entity, id) VALUES ('__ALL__', '')")
+
+
+def get_data_identity(data_path):
+    """
+    Return the identity of the DB file the cached elements are read from: its path and its inode, so that a DB
+    replaced by another one (EX: a new import) does not find the elements of the previous one
+    The modification time is not part of it: the writes of the application invalidate their elements themselves
+    :param data_path:
+    :return: integer, None if the DB is unknown
+    """
+    if data_path is None:
+        return None
+    data_path = os.path.realpath(data_path)
+    try:
+        stat = os.stat(data_path)
+    except OSError:
+        return None
+    identity = data_path + ":" + str(stat.st_dev) + ":" + str(stat.st_ino)
+    # fits in a signed 64-bit integer
+    return int(hashlib.sha1(identity.encode()).hexdigest()[:15], 16)
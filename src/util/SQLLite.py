@@ -1,18 +1,197 @@
 import os
+import queue
+import threading
 import sqlite3
 import logging
+from collections import OrderedDict
+from contextlib import contextmanager
 
 from src.util import util
 import src.util.Cache as Cache
+import src.util.IndexAdvisor as IndexAdvisor
 
 sqllite_connections = dict()
+# KEY: pid, VALUE: WriteBuffer of the process (see buffered_writes)
+write_buffers = dict()
 log = logging.getLogger(__name__)
 
+# pragmas of every connection: WAL lets the readers (other processes, the read-only connections) go on while the
+# writer writes; synchronous=NORMAL is durable in WAL mode except for the last transactions on power loss
+pragmas = OrderedDict([
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    # pages of the page cache (negative: KB), for each connection
+    ("cache_size", -64 * 1024),
+    # bytes of the DB read through memory mapping
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    # milliseconds waited on a locked DB before "database is locked"
+    ("busy_timeout", 10000),
+])
+# pragmas that only the writer connection can set
+writer_pragmas = ("journal_mode",)
+# read-only connections of each writer connection: its selects run on them (outside a unit of work), so the threads
+# reading do not share the cursor of the writer
+read_pool_size = 4
+
+# maximum number of statements kept compiled by each connection
+statement_cache_size = 256
+# maximum number of values of a select_in statement (SQLite allows 999 parameters by default)
+max_in_values = 500
+# rows fetched at a time by the streaming selects (select_iter)
+fetch_batch_size = 1000
+# rows of a WriteBuffer written at a time
+write_buffer_size = 1000
+
+# secondary indexes created by the schema migration
+# KEY: index name, VALUE: <table, indexed columns>
+# The columns read by the narrow selects follow the filtered ones, so that those selects are answered by the index
+# alone (covering); the selects of whole Match rows (SELECT *) read the table anyway, their indexes stay on the
+# filtered columns only (the rowid, Match.id, is in every index)
+indexes = OrderedDict([
+    # Match.read_matches_by_home_team / read_matches_by_away_team (with or without season); covering for the join
+    # of Match_Lineup.read_players_api_id_by_team_api_id
+    ("idx_match_home_team_season", ("Match", ("home_team_api_id", "season"))),
+    ("idx_match_away_team_season", ("Match", ("away_team_api_id", "season"))),
+    # Match.read_matches_by_league; covering for Team.read_teams_by_league and League.get_seasons
+    ("idx_match_league_season", ("Match", ("league_id", "season", "home_team_api_id"))),
+    # Match.read_by_match_api_id
+    ("idx_match_api_id", ("Match", ("match_api_id",))),
+    # Match.read_by_match_date
+    ("idx_match_date", ("Match", ("date",))),
+    ("idx_team_api_id", ("Team", ("team_api_id",))),
+    ("idx_team_fifa_api_id", ("Team", ("team_fifa_api_id",))),
+    ("idx_player_api_id", ("Player", ("player_api_id",))),
+    ("idx_player_fifa_api_id", ("Player", ("player_fifa_api_id",))),
+    # reads of the attributes of a player/team; covering for the key lookup of the upserts of the crawler
+    ("idx_player_attributes_fifa_api_id", ("Player_Attributes", ("player_fifa_api_id", "date"))),
+    ("idx_team_attributes_fifa_api_id", ("Team_Attributes", ("team_fifa_api_id", "date"))),
+    ("idx_match_event_match_id", ("Match_Event", ("match_id",))),
+    ("idx_bet_event_match_event", ("Bet_Event", ("match_event_id", "event_name"))),
+    # Match.read_by_player_api_id; covering for Match_Lineup.read_last_team_api_id_by_player_api_id
+    ("idx_match_lineup_player", ("Match_Lineup", ("player_api_id", "match_id", "side"))),
+    # covering for Match_Lineup.read_players_api_id_by_team_api_id
+    ("idx_match_lineup_match", ("Match_Lineup", ("match_id", "side", "player_api_id"))),
+    # covering for the counts of Match_Incident over the matches of a team/player (count_incidents with any filter,
+    # count_incidents_by_match)
+    ("idx_match_incident_match", ("Match_Incident", ("match_id", "type", "team", "player1", "player2"))),
+])
+
+# changes of the tables counted by triggers (schema migration), for the structures built over their rows: unlike
+# PRAGMA data_version they are stored in the DB, so they tell if the rows changed since any past read
+# KEY: table name, VALUE: column the changes are counted by (None: the table as a whole)
+change_counters = OrderedDict([
+    # the changes of each season tell if the past seasons changed (HistoricalStore)
+    ("Match", "season"),
+    ("Match_Incident", None),
+    ("Team", None),
+    ("Team_Attributes", None),
+])
+
+
+class StatementCache(object):
+    """
+    Bounded LRU of the SQL text built for a statement shape
+    KEY: (operation, table, column filter, filtered columns, operator, order)
+    VALUE: SQL text with ? placeholders
+    Since the text of a shape never changes, sqlite3 finds the statement already compiled in its own cache
+    """
+    def __init__(self, max_size=statement_cache_size):
+        self.max_size = max_size
+        self.statements = OrderedDict()
+
+    def get(self, key):
+        """
+        Return the SQL text of the shape, raise a KeyError if it has not been built yet
+        :param key:
+        :return:
+        """
+        statement = self.statements[key]
+        self.statements.move_to_end(key)
+        return statement
+
+    def add(self, key, statement):
+        self.statements[key] = statement
+        self.statements.move_to_end(key)
+        if len(self.statements) > self.max_size:
+            self.statements.popitem(last=False)
+
+    def __len__(self):
+        return len(self.statements)
+
 
 class SQLiteConnection(object):
-    def __init__(self, database_path="data/db/database.sqlite"):
-        self.connection = sqlite3.connect(util.get_project_directory()+database_path, check_same_thread=False)
+    def __init__(self, database_path="data/db/database.sqlite", read_only=False):
+        if not os.path.isabs(database_path):
+            database_path = util.get_project_directory()+database_path
+        self.database_path = database_path
+        self.read_only = read_only
+        if read_only:
+            self.connection = sqlite3.connect("file:" + database_path + "?mode=ro", uri=True,
+                                              check_same_thread=False,
+                                              cached_statements=statement_cache_size)
+        else:
+            self.connection = sqlite3.connect(database_path,
+                                              check_same_thread=False,
+                                              cached_statements=statement_cache_size)
         self.cursor = self.connection.cursor()
+        self.statements = StatementCache(statement_cache_size)
+        self.transaction_depth = 0
+        # thread of the unit of work open
+        self.transaction_thread = None
+        # units of work committed by this connection: with PRAGMA data_version (the commits of the other connections)
+        # they tell if the DB has changed since a past read
+        self.n_commits = 0
+        self.commit_callbacks = []
+        # ConnectionPool of the selects of the writer, opened at the first select
+        self.read_pool = None
+        self.read_pool_lock = threading.Lock()
+        self.set_pragmas()
+
+    def set_pragmas(self):
+        """
+        Apply the pragmas of the module; a pragma not supported (EX: WAL on a network file system) is only logged
+        :return:
+        """
+        for pragma, value in pragmas.items():
+            if self.read_only and pragma in writer_pragmas:
+                continue
+            try:
+                self.cursor.execute("PRAGMA " + pragma + " = " + str(value) + ";").fetchall()
+            except sqlite3.DatabaseError as e:
+                log.warning("PRAGMA " + pragma + " not applied: " + str(e))
+
+    @contextmanager
+    def reader(self):
+        """
+        Return the connection running a select, to be used in a with block: a read-only connection of the pool of this
+        connection, unless this connection is read-only or the current thread has a unit of work open on it (its rows
+        not committed yet are visible only to this connection)
+        :return:
+        """
+        if self.read_only or (self.transaction_depth > 0 and self.transaction_thread == threading.get_ident()):
+            yield self
+            return
+        with self.get_read_pool().connection() as connection:
+            yield connection
+
+    def get_read_pool(self):
+        """
+        Return the ConnectionPool of the read-only connections of this connection
+        :return:
+        """
+        if self.read_pool is None:
+            with self.read_pool_lock:
+                if self.read_pool is None:
+                    self.read_pool = ConnectionPool(self.database_path)
+        return self.read_pool
+
+    def get_data_version(self):
+        """
+        Return the data version of this connection (PRAGMA data_version): it changes when another connection commits
+        :return:
+        """
+        return self.cursor.execute("PRAGMA data_version;").fetchone()[0]
 
     def getTableNameDataBase(self):
         tables = []
@@ -30,8 +209,7 @@ class SQLiteConnection(object):
         for r in self.cursor.execute("PRAGMA table_info("+table_name+");"):
             columns.append(r[1])
 
-        Cache.add_element(table_name, columns, "SQLLITE_COLUMN_TABLE")
-        return columns
+        return Cache.add_element(table_name, columns, "SQLLITE_COLUMN_TABLE")
 
     def list_constraints(self):
         for l in self.cursor.execute("select sql from sqlite_master where type='table'"):
@@ -39,206 +217,479 @@ class SQLiteConnection(object):
 
 
     def select(self, table_name, column_filter='*', **id):
-        id_condition = ""
-        if len(id) > 0:
-            id_condition = "WHERE "
-
-            for attrbiute, value in id.items():
-                id_condition += attrbiute+"='"+str(value).replace("'","''")+"' AND "
-            id_condition = id_condition[0:-4]
-
-        if column_filter=='*':
-            column_names = self.getColumnFromTable(table_name)
-        else:
-            column_names = column_filter.split(",")
-
-        row_results = []
-        select = "SELECT "+column_filter+" FROM "+table_name+" "+id_condition+";"
-        log.debug("select ["+select+"]")
-        for sqllite_row in self.cursor.execute(select):
-            if sqllite_row is None:
-                continue
-            row = {}
-            for i, name in enumerate(column_names):
-                row[name] = sqllite_row[i]
-            row_results.append(row)
-
-        log.debug("Rows found: "+str(len(row_results)))
-        return row_results
+        select, params = self.get_select_statement(table_name, column_filter, id, "AND")
+        return self.fetch_rows(select, params, self.get_column_names(table_name, column_filter))
 
     def select_or(self, table_name, column_filter='*', **or_conditions):
-        or_condition = ""
-        if len(or_conditions) > 0:
-            or_condition = "WHERE "
+        select, params = self.get_select_statement(table_name, column_filter, or_conditions, "OR")
+        return self.fetch_rows(select, params, self.get_column_names(table_name, column_filter))
 
-            for attrbiute, value in or_conditions.items():
-                or_condition += attrbiute+"='"+str(value).replace("'","''")+"' OR "
-            or_condition = or_condition[0:-3]
+    def select_like(self, table_name, column_filter='*', columns_order=None, **id):
+        select_like, params = self.get_select_statement(table_name, column_filter, id, "LIKE", columns_order)
+        return self.fetch_rows(select_like, params, self.get_column_names(table_name, column_filter))
+
+    def select_prefix(self, table_name, column_filter='*', columns_order=None, **id):
+        """
+        Select the rows whose columns start with the values in input (EX: date=2017-03-18)
+        Unlike select_like, the condition is a range, so it can be answered by an index
+        :param table_name:
+        :param column_filter:
+        :param columns_order:
+        :param id:
+        :return:
+        """
+        select_prefix, params = self.get_select_statement(table_name, column_filter, id, "PREFIX", columns_order)
+        return self.fetch_rows(select_prefix, params, self.get_column_names(table_name, column_filter))
+
+    def select_in(self, table_name, column, values, column_filter='*'):
+        """
+        Select the rows whose column has one of the values in input (EX: team_api_id in [8634, 9825])
+        One query for each max_in_values values
+        :param table_name:
+        :param column:
+        :param values:
+        :param column_filter:
+        :return:
+        """
+        values = list(values)
+        column_names = self.get_column_names(table_name, column_filter)
+        rows = []
+        for i in range(0, len(values), max_in_values):
+            select_in, params = self.get_select_statement(table_name, column_filter,
+                                                          {column: values[i:i + max_in_values]}, "IN")
+            rows.extend(self.fetch_rows(select_in, params, column_names))
+        return rows
 
+    def select_iter(self, table_name, column_filter='*', row_factory=None, batch_size=None, **id):
+        """
+        Same rows of select, but returned lazily: they are fetched batch_size at a time
+        :param table_name:
+        :param column_filter:
+        :param row_factory: function <column names> --> function <row tuple> --> element;
+                            by default the elements are dictionaries column --> value
+        :param batch_size: rows fetched at a time, fetch_batch_size by default
+        :param id:
+        :return: generator of the elements
+        """
+        select, params = self.get_select_statement(table_name, column_filter, id, "AND")
+        return self.fetch_iter(select, params, self.get_column_names(table_name, column_filter), row_factory,
+                               batch_size)
+
+    def get_column_names(self, table_name, column_filter='*'):
+        """
+        Return the names of the columns returned by a select with the column_filter in input
+        :param table_name:
+        :param column_filter:
+        :return:
+        """
         if column_filter == '*':
-            column_names = self.getColumnFromTable(table_name)
+            return self.getColumnFromTable(table_name)
+        return column_filter.split(",")
+
+    def get_select_statement(self, table_name, column_filter, conditions, operator, columns_order=None):
+        """
+        Return the pair <SQL text, parameters> of the select
+        The SQL text has a ? placeholder for each condition, and it is built once for each shape
+        :param table_name:
+        :param column_filter:
+        :param conditions: dictionary column --> value (list of values for IN)
+        :param operator: AND, OR, LIKE, PREFIX or IN (LIKE, PREFIX and IN conditions are in AND)
+        :param columns_order:
+        :return:
+        """
+        columns = tuple(conditions.keys())
+        if IndexAdvisor.enabled:
+            IndexAdvisor.record(table_name, columns, operator)
+        if operator == "LIKE":
+            params = ["%"+str(value)+"%" for value in conditions.values()]
+        elif operator == "PREFIX":
+            params = []
+            for value in conditions.values():
+                params.extend([str(value), str(value)+"\uffff"])
+        elif operator == "IN":
+            params = [str(value) for values in conditions.values() for value in values]
         else:
-            column_names = column_filter.split(",")
-
-        row_results = []
-        select = "SELECT "+column_filter+" FROM "+table_name+" "+or_condition+";"
-        log.debug("select ["+select+"]")
-        for sqllite_row in self.cursor.execute(select):
-            if sqllite_row is None:
-                continue
-            row = {}
-            for i, name in enumerate(column_names):
-                row[name] = sqllite_row[i]
-            row_results.append(row)
-
-        log.debug("Rows found: "+str(len(row_results)))
-        return row_results
-
-    def select_like(self, table_name, column_filter='*', columns_order=None, **id):
-        id_condition = ""
-        if len(id) > 0:
-            id_condition = "WHERE "
+            params = [str(value) for value in conditions.values()]
 
-            for attrbiute, value in id.items():
-                id_condition += attrbiute+" like '%"+str(value).replace("'","''")+"%' AND "
-            id_condition = id_condition[0:-4]
+        key = ("SELECT", table_name, column_filter, columns, operator, columns_order)
+        if operator == "IN":
+            # one text for each number of values
+            key += (tuple(len(values) for values in conditions.values()),)
+        try:
+            return self.statements.get(key), params
+        except KeyError:
+            pass
 
-        if column_filter=='*':
-            column_names = self.getColumnFromTable(table_name)
+        if operator == "LIKE":
+            where = " AND ".join([column+" like ?" for column in columns])
+        elif operator == "PREFIX":
+            where = " AND ".join([column+" >= ? AND "+column+" < ?" for column in columns])
+        elif operator == "IN":
+            where = " AND ".join([column+" IN ("+",".join(["?"]*len(values))+")"
+                                  for column, values in conditions.items()])
         else:
-            column_names = column_filter.split(",")
+            where = (" "+operator+" ").join([column+"=?" for column in columns])
+
+        select = "SELECT "+column_filter+" FROM "+table_name
+        if len(columns) > 0:
+            select += " WHERE "+where
+        if not util.is_None(columns_order):
+            select += " ORDER BY "+columns_order
+        select += ";"
+
+        self.statements.add(key, select)
+        return select, params
+
+    def fetch_rows(self, select, params, column_names):
+        """
+        Execute the select and return the rows as dictionary column --> value
+        :param select:
+        :param params:
+        :param column_names:
+        :return:
+        """
+        with self.reader() as connection:
+            row_results = [dict(zip(column_names, sqllite_row))
+                           for sqllite_row in connection.cursor.execute(select, params)]
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("select [" + select + "] " + str(params) + ": " + str(len(row_results)) + " rows")
+        return row_results
 
-        if util.is_None(columns_order):
-            order_by = ""
+    def fetch_iter(self, select, params, column_names, row_factory=None, batch_size=None):
+        """
+        Execute the select and return the generator of its rows, built by the row_factory
+        The rows are read by a cursor of their own on a reader connection (see reader), so the connection can be used
+        while they are consumed
+        :param select:
+        :param params:
+        :param column_names:
+        :param row_factory: function <column names> --> function <row tuple> --> element
+        :param batch_size:
+        :return:
+        """
+        if row_factory is None:
+            build = lambda sqllite_row: dict(zip(column_names, sqllite_row))
         else:
-            order_by = " ORDER BY "+columns_order
-
-
-        row_results = []
-        select_like = "SELECT "+column_filter+" FROM "+table_name+" "+id_condition+order_by+";"
-        log.debug("Select like ["+select_like+"]")
-        for sqllite_row in self.cursor.execute(select_like):
-            if sqllite_row is None:
-                continue
-            row = {}
-            for i, name in enumerate(column_names):
-                row[name] = sqllite_row[i]
-            row_results.append(row)
-        return row_results
+            build = row_factory(column_names)
+        if batch_size is None:
+            batch_size = fetch_batch_size
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("select iter [" + select + "] " + str(params))
+        with self.reader() as connection:
+            cursor = connection.connection.cursor()
+            try:
+                cursor.execute(select, params)
+                while True:
+                    sqllite_rows = cursor.fetchmany(batch_size)
+                    if len(sqllite_rows) == 0:
+                        break
+                    for sqllite_row in sqllite_rows:
+                        yield build(sqllite_row)
+            finally:
+                cursor.close()
 
     def insert(self, table_name, attributes):
-        insert = "INSERT INTO "+table_name+" "
-
-        columns = "("
-        values  = "VALUES ("
-        for column, value in attributes.items():
-            columns += column+","
-            values += "'"+str(value).replace("'","''")+"',"
-
-        columns = columns[:-1]+")"
-        values = values[:-1] + ")"
-
-        insert += columns+" "+values+";"
-
-        log.debug("Begin transaction insert [" + insert + "]")
-
-        old_isolation_level = self.connection.isolation_level
-        self.connection.isolation_level = None
+        insert = self.get_insert_statement(table_name, tuple(attributes.keys()))
+        self.execute_transaction(insert, [str(value) for value in attributes.values()])
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Rows inserted: " + str(self.cursor.rowcount))
+        return self.cursor.lastrowid
+
+    def get_insert_statement(self, table_name, columns):
+        key = ("INSERT", table_name, columns)
         try:
-            self.cursor.execute("begin")
-            self.cursor.execute(insert)
-            self.cursor.execute("commit")
-        except Exception as e:
-            print("Errror during transaction --> rolling back!")
-            self.cursor.execute("rollback")
-            raise e
-        self.connection.isolation_level = old_isolation_level
-
-        log.debug("Rows inserted: " + str(self.cursor.rowcount))
-
-    def execute_select(self, query):
-        rows = []
-        for row in self.cursor.execute(query):
-            rows.append(row)
-        return rows
-
-    def execute_update(self, query):
-        log.debug("Transaction update [" + query + "]")
-        old_isolation_level = self.connection.isolation_level
-        self.connection.isolation_level = None
+            return self.statements.get(key)
+        except KeyError:
+            pass
+        insert = "INSERT INTO "+table_name+" ("+",".join(columns)+") VALUES ("+",".join(["?"]*len(columns))+");"
+        self.statements.add(key, insert)
+        return insert
 
+    def get_update_statement(self, table_name, columns, key_columns=("id",)):
+        key = ("UPDATE", table_name, columns, key_columns)
         try:
-            self.cursor.execute("begin")
-            self.cursor.execute(query)
-            self.cursor.execute("commit")
-        except Exception as e:
-            print("Errror during transaction --> rolling back!")
-            self.cursor.execute("rollback")
-            raise e
-
-        self.connection.isolation_level = old_isolation_level
-        log.debug("Rows updated: " + str(self.cursor.rowcount))
-
+            return self.statements.get(key)
+        except KeyError:
+            pass
+        update = "UPDATE "+table_name+" SET "+",".join([column+"=?" for column in columns]) \
+                 + " WHERE "+" AND ".join([column+" = ?" for column in key_columns])
+        self.statements.add(key, update)
+        return update
+
+    def insert_many(self, table_name, rows):
+        """
+        Insert all the rows (list of dictionaries column --> value) in one transaction
+        Rows with the same columns are written with a single executemany
+        :param table_name:
+        :param rows:
+        :return: number of rows inserted
+        """
+        with self.transaction():
+            for columns, params in group_by_columns(rows).items():
+                self.cursor.executemany(self.get_insert_statement(table_name, columns), params)
+
+        log.debug("Rows inserted in [" + table_name + "]: " + str(len(rows)))
+        return len(rows)
+
+    def upsert_many(self, table_name, rows, key_columns):
+        """
+        Write all the rows (list of dictionaries column --> value) in one transaction:
+        a row is updated if a row with the same key_columns is already stored, inserted otherwise
+        :param table_name:
+        :param rows:
+        :param key_columns: tuple of columns identifying a row, they must be set in every row
+        :return: the pair <rows inserted, rows updated>
+        """
+        key_columns = tuple(key_columns)
+        exists, _ = self.get_select_statement(table_name, "1", {column: None for column in key_columns}, "AND")
+
+        n_inserted = 0
+        n_updated = 0
+        with self.transaction():
+            for columns, params in group_by_columns(rows).items():
+                key_indexes = [columns.index(column) for column in key_columns]
+                update_columns = tuple([column for column in columns if column not in key_columns])
+
+                to_insert = []
+                to_update = []
+                inserted_keys = set()
+                for values in params:
+                    key_values = [values[i] for i in key_indexes]
+                    if tuple(key_values) not in inserted_keys \
+                            and self.cursor.execute(exists, key_values).fetchone() is None:
+                        inserted_keys.add(tuple(key_values))
+                        to_insert.append(values)
+                    elif len(update_columns) > 0:
+                        to_update.append([value for i, value in enumerate(values) if i not in key_indexes]
+                                         + key_values)
+
+                if len(to_insert) > 0:
+                    self.cursor.executemany(self.get_insert_statement(table_name, columns), to_insert)
+                if len(to_update) > 0:
+                    self.cursor.executemany(self.get_update_statement(table_name, update_columns, key_columns),
+                                            to_update)
+                n_inserted += len(to_insert)
+                n_updated += len(to_update)
+
+        log.debug("Rows upserted in [" + table_name + "]: " + str(n_inserted) + " inserted, "
+                  + str(n_updated) + " updated")
+        return n_inserted, n_updated
+
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: every statement executed inside the with block is committed once, at the end of the block
+        or rolled back if an exception is raised. Nested units of work join the outermost one.
+            EX: with SQLLite.get_connection().transaction():
+                    Match.write_new_match(...)
+                    Match.write_new_match(...)
+        :return:
+        """
+        if self.transaction_depth > 0:
+            self.transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self.transaction_depth -= 1
+            return
 
-    def execute_create(self, query):
-        log.debug("Transaction create [" + query + "]")
         old_isolation_level = self.connection.isolation_level
         self.connection.isolation_level = None
-
+        self.transaction_depth = 1
+        self.transaction_thread = threading.get_ident()
+        self.commit_callbacks = []
         try:
             self.cursor.execute("begin")
-            self.cursor.execute(query)
+            yield self
             self.cursor.execute("commit")
-        except Exception as e:
+            self.n_commits += 1
+        except BaseException as e:
             print("Errror during transaction --> rolling back!")
             self.cursor.execute("rollback")
             raise e
+        finally:
+            self.transaction_depth = 0
+            self.transaction_thread = None
+            self.connection.isolation_level = old_isolation_level
+            commit_callbacks, self.commit_callbacks = self.commit_callbacks, []
+        # the rows are visible to the other connections only now
+        for callback in commit_callbacks:
+            callback()
+
+    def after_commit(self, callback):
+        """
+        Call the function once the rows written by the current unit of work are committed (EX: invalidate the cached
+        elements depending on them), never if it is rolled back; immediately if no unit of work is open
+        :param callback:
+        :return:
+        """
+        if self.transaction_depth > 0:
+            self.commit_callbacks.append(callback)
+        else:
+            callback()
+
+    def execute_select(self, query, params=()):
+        with self.reader() as connection:
+            return connection.cursor.execute(query, params).fetchall()
+
+    def execute_transaction(self, query, params=()):
+        """
+        Execute the query in a unit of work: its own transaction, or the one already opened
+        :param query:
+        :param params:
+        :return:
+        """
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Begin transaction [" + query + "] " + str(params))
+        with self.transaction():
+            self.cursor.execute(query, params)
+
+    def execute_update(self, query, params=()):
+        self.execute_transaction(query, params)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Rows updated: " + str(self.cursor.rowcount))
 
-        self.connection.isolation_level = old_isolation_level
+    def execute_create(self, query):
+        self.execute_transaction(query)
 
     def delete(self, table_name, object):
-        delete = "DELETE FROM " + table_name + " WHERE ID = '" + str(object.id) + "';"
-        log.debug("Transaction delete [" + delete + "]")
-
-        old_isolation_level = self.connection.isolation_level
-        self.connection.isolation_level = None
-        try:
-            self.cursor.execute("begin")
-            self.cursor.execute(delete)
-            self.cursor.execute("commit")
-        except Exception as e:
-            print("Errror during transaction --> rolling back!")
-            self.cursor.execute("rollback")
-            raise e
-
-        self.connection.isolation_level = old_isolation_level
-        log.debug("Rows deleted: " + str(self.cursor.rowcount))
-
+        delete = "DELETE FROM " + table_name + " WHERE ID = ?;"
+        self.execute_transaction(delete, [str(object.id)])
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Rows deleted: " + str(self.cursor.rowcount))
 
     def update(self, table_name, object):
-        column_names = self.getColumnFromTable(table_name)
-        update = "UPDATE "+table_name+" SET "
-
-        for column in column_names:
-            value = str(object.__getattribute__(column)).replace("'", "''")
+        columns = []
+        params = []
+        for column in self.getColumnFromTable(table_name):
+            value = str(getattr(object, column, None))
             if util.is_None(value):
                 continue
-            update += column+"='"+value+"',"
-
-        update = update[:-1]
+            columns.append(column)
+            params.append(value)
+        params.append(str(object.id))
 
-        update += " WHERE id = '"+str(object.id)+"'"
-        self.execute_update(update)
+        update = self.get_update_statement(table_name, tuple(columns))
+        self.execute_update(update, params)
 
     def create_table(self, table_name, create_stmt):
+        """
+        Create the table, if not already in the DB
+        :param table_name:
+        :param create_stmt:
+        :return: True if the table has been created
+        """
         for db_table_name in self.getTableNameDataBase():
             if db_table_name == table_name:
                 # table already in
-                return
+                return False
         self.execute_create(create_stmt)
+        return True
+
+
+def group_by_columns(rows):
+    """
+    Group the rows (dictionaries column --> value) by their columns
+    KEY: tuple of columns
+    VALUE: list of values, in the order of the columns
+    :param rows:
+    :return:
+    """
+    groups = OrderedDict()
+    for row in rows:
+        columns = tuple(row.keys())
+        try:
+            groups[columns].append([str(value) for value in row.values()])
+        except KeyError:
+            groups[columns] = [[str(value) for value in row.values()]]
+    return groups
+
+
+class WriteBuffer(object):
+    """
+    Rows collected while crawling (EX: the bet-odds of a league), written by flush with insert_many/upsert_many in
+    one short transaction: the write lock is not held while the pages are downloaded
+        EX: with SQLLite.buffered_writes():
+                Bet_Event.write_new_bet_event(...)
+    """
+    def __init__(self, connection, max_size=write_buffer_size):
+        self.connection = connection
+        self.max_size = max_size
+        # KEY: <table, key columns> (None for the inserts), VALUE: rows
+        self.rows = OrderedDict()
+        self.size = 0
+        # functions called once the rows are committed
+        self.callbacks = []
+
+    def insert(self, table_name, row, callback=None):
+        self.add(table_name, None, row, callback)
+
+    def upsert(self, table_name, row, key_columns, callback=None):
+        self.add(table_name, tuple(key_columns), row, callback)
+
+    def add(self, table_name, key_columns, row, callback):
+        self.rows.setdefault((table_name, key_columns), []).append(row)
+        self.size += 1
+        if callback is not None:
+            self.callbacks.append(callback)
+        if self.size >= self.max_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows in one transaction
+        :return:
+        """
+        if self.size == 0:
+            return
+        rows, callbacks = self.rows, self.callbacks
+        self.rows = OrderedDict()
+        self.callbacks = []
+        self.size = 0
+        with self.connection.transaction():
+            for (table_name, key_columns), table_rows in rows.items():
+                if key_columns is None:
+                    self.connection.insert_many(table_name, table_rows)
+                else:
+                    self.connection.upsert_many(table_name, table_rows, key_columns)
+            for callback in callbacks:
+                self.connection.after_commit(callback)
+
+
+@contextmanager
+def buffered_writes():
+    """
+    The writes of the domain functions using get_write_buffer are buffered until the end of the with block
+    (nested blocks join the outermost one); the rows collected before an exception are written anyway
+    :return:
+    """
+    pid = os.getpid()
+    if pid in write_buffers:
+        yield write_buffers[pid]
+        return
+    write_buffer = write_buffers[pid] = WriteBuffer(get_connection())
+    try:
+        yield write_buffer
+    finally:
+        del write_buffers[pid]
+        write_buffer.flush()
+
+
+def get_write_buffer():
+    """
+    Return the WriteBuffer of the current process, None if the writes are not buffered
+    :return:
+    """
+    return write_buffers.get(os.getpid())
 
 
 def get_connection():
+    """
+    Return the connection of the current process: the only one writing the DB (its selects run on its read-only
+    connections, see SQLiteConnection.reader)
+    :return:
+    """
     global sqllite_connections
     try:
         return sqllite_connections[os.getpid()]
@@ -248,16 +699,181 @@ def get_connection():
         return sqllite_connections[os.getpid()]
 
 
+class ConnectionPool(object):
+    """
+    Read-only connections to the DB, lent to one thread at a time
+        EX: with SQLLite.read_connection() as connection:
+                connection.select("Match", league_id=1)
+    """
+    def __init__(self, database_path, size=read_pool_size):
+        self.database_path = database_path
+        self.size = size
+        self.n_connections = 0
+        self.connections = queue.LifoQueue()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.n_connections < self.size:
+                self.n_connections += 1
+                return SQLiteConnection(self.database_path, read_only=True)
+        # all the connections are in use: wait for one
+        return self.connections.get()
+
+    def release(self, connection):
+        self.connections.put(connection)
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+
+def read_connection():
+    """
+    Return a read-only connection of the pool of the connection of the current process, to be used in a with block
+    The writes of the writer connection (get_connection) are visible once committed
+    :return:
+    """
+    return get_connection().get_read_pool().connection()
+
+
 def init_database():
     print("> Initialization DB")
     try:
         get_connection().create_table("Match_Event", "CREATE TABLE Match_Event(id INTEGER PRIMARY KEY AUTOINCREMENT, match_id INTEGER)")
         get_connection().create_table("Bet_Event",
                                      "CREATE TABLE Bet_Event(id INTEGER PRIMARY KEY AUTOINCREMENT, match_event_id INTEGER, event_name STRING, bet_value STRING, date STRING)")
+        import src.application.Domain.Match_Lineup as Match_Lineup
+        Match_Lineup.init_table()
+        import src.application.Domain.Match_Incident as Match_Incident
+        Match_Incident.init_table()
+        create_indexes()
+        create_change_counters()
         return True
     except sqlite3.OperationalError:
         return False
 
 
+def create_indexes():
+    """
+    Schema migration: create the secondary indexes not yet in the DB
+    Statistics used by the query planner are refreshed when at least one index is created
+    :return: the names of the indexes created
+    """
+    connection = get_connection()
+    tables = connection.getTableNameDataBase()
+    existing_indexes = [row[0] for row in connection.execute_select("SELECT name FROM sqlite_master "
+                                                                    "WHERE type='index';")]
+    created_indexes = []
+    for index_name, (table_name, columns) in indexes.items():
+        if table_name not in tables:
+            continue
+        if index_name in existing_indexes:
+            if get_index_columns(connection, index_name) == tuple(columns):
+                continue
+            # created by a previous version with other columns
+            log.debug("Dropping index [" + index_name + "] on [" + table_name + "]: columns changed")
+            connection.execute_create("DROP INDEX IF EXISTS " + index_name + ";")
+        if not set(columns).issubset(connection.getColumnFromTable(table_name)):
+            log.warning("Index [" + index_name + "] skipped: columns not in [" + table_name + "]")
+            continue
+        log.debug("Creating index [" + index_name + "] on [" + table_name + "]")
+        connection.execute_create("CREATE INDEX IF NOT EXISTS " + index_name + " ON " + table_name
+                                  + "(" + ",".join(columns) + ");")
+        created_indexes.append(index_name)
+
+    if len(created_indexes) > 0:
+        print("\t- indexes created:", ", ".join(created_indexes))
+        connection.execute_create("ANALYZE;")
+    return created_indexes
+
+
+def get_index_columns(connection, index_name):
+    """
+    Return the columns of the index, in order
+    :param connection:
+    :param index_name:
+    :return: tuple of the column names
+    """
+    rows = connection.execute_select("PRAGMA index_info(" + index_name + ");")
+    return tuple(row[2] for row in sorted(rows))
+
+
+def create_change_counters():
+    """
+    Schema migration: create the Change_Counter table and the triggers counting the changes of the tables of
+    change_counters (see get_changes); the rows already in the tables are not counted
+    :return: the names of the triggers created
+    """
+    connection = get_connection()
+    connection.create_table("Change_Counter", "CREATE TABLE Change_Counter(table_name TEXT NOT NULL, key TEXT NOT NULL, "
+                                              "changes INTEGER NOT NULL, PRIMARY KEY (table_name, key))")
+    tables = connection.getTableNameDataBase()
+    existing_triggers = [row[0] for row in connection.execute_select("SELECT name FROM sqlite_master "
+                                                                     "WHERE type='trigger';")]
+    created_triggers = []
+    for table_name, column in change_counters.items():
+        if table_name not in tables:
+            continue
+        if column is not None and column not in connection.getColumnFromTable(table_name):
+            log.warning("Change counter of [" + table_name + "] skipped: column " + column + " not in the table")
+            continue
+        for event, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            trigger_name = "trg_changes_" + table_name.lower() + "_" + event.lower()
+            if trigger_name in existing_triggers:
+                continue
+            if column is None:
+                # one change for each row
+                rows = rows[:1]
+            counts = "".join(["INSERT INTO Change_Counter(table_name, key, changes) VALUES ('" + table_name + "', "
+                              + ("''" if column is None else "coalesce(" + row + "." + column + ", '')") + ", 1) "
+                              "ON CONFLICT(table_name, key) DO UPDATE SET changes = changes + 1; " for row in rows])
+            connection.execute_create("CREATE TRIGGER IF NOT EXISTS " + trigger_name + " AFTER " + event + " ON "
+                                      + table_name + " BEGIN " + counts + "END;")
+            created_triggers.append(trigger_name)
+
+    if len(created_triggers) > 0:
+        log.debug("Change counters created: " + ", ".join(created_triggers))
+    return created_triggers
+
+
+def get_changes(table_name, before_key=None):
+    """
+    Return the number of changes (rows inserted, updated or deleted) of the table counted so far
+    :param table_name: a table of change_counters
+    :param before_key: only the changes of the rows whose column of the counter is below it (EX: season < 2016/2017),
+                       None for all the rows
+    :return:
+    """
+    if before_key is None:
+        rows = get_connection().execute_select("SELECT total(changes) FROM Change_Counter WHERE table_name = ?;",
+                                               [table_name])
+    else:
+        rows = get_connection().execute_select("SELECT total(changes) FROM Change_Counter WHERE table_name = ? "
+                                               "AND key != '' AND key < ?;", [table_name, str(before_key)])
+    return int(rows[0][0])
+
+
 def read_all(table_name, column_filter='*'):
     return get_connection().select(table_name, column_filter=column_filter)
+
+
+def stream_all(table_name, column_filter='*', row_factory=None, batch_size=None):
+    """
+    Return the generator of all the rows of the table, read batch_size at a time (see select_iter)
+    :param table_name:
+    :param column_filter:
+    :param row_factory:
+    :param batch_size:
+    :return:
+    """
+    return get_connection().select_iter(table_name, column_filter=column_filter, row_factory=row_factory,
+                                        batch_size=batch_size)
@@ -4,12 +4,16 @@ import time
 import datetime
 import dateutil.parser
 from datetime import timedelta
+from contextlib import contextmanager
 
 from logging import Logger
 import logging
 
 
 project_directory = os.path.dirname(os.path.abspath(__file__))[0:-8]
+# the current time of the run, pinned (--now, set_now) or during a computation that must see the same matches finished
+# from beginning to end (pinned_now, EX: a backtest); None: the clock
+now = None
 
 log = logging.getLogger(__name__)
 
@@ -48,10 +52,61 @@ def get_default(dictionary, key, default):
         return default
 
 
+def get_now():
+    """
+    Return the current time of the run (datetime): the pinned one, the one of the clock otherwise
+    :return:
+    """
+    if now is None:
+        return datetime.datetime.now()
+    return now
+
+
+def set_now(date=None):
+    """
+    Pin the current time of the run (datetime or ISO string); None to follow the clock again
+    :param date:
+    :return:
+    """
+    global now
+    if type(date) == str:
+        date = parse_date(date)
+    now = date
+
+
+@contextmanager
+def pinned_now():
+    """
+    Pin the current time of the run for the block, if it is not pinned yet
+    :return: the current time
+    """
+    global now
+    if now is not None:
+        yield now
+        return
+    now = datetime.datetime.now()
+    try:
+        yield now
+    finally:
+        now = None
+
+
+def parse_date(iso_time_string):
+    """
+    Return the datetime of the ISO string; other formats are left to dateutil
+    :param iso_time_string:
+    :return:
+    """
+    try:
+        return datetime.datetime.fromisoformat(iso_time_string.strip())
+    except ValueError:
+        return dateutil.parser.parse(iso_time_string)
+
+
 def get_current_season():
-    year = datetime.datetime.now().year
-    month = datetime.datetime.now().month
-    day = datetime.datetime.now().day
+    year = get_now().year
+    month = get_now().month
+    day = get_now().day
 
     if month > 6 and day > 15:
         return str(year)+"/"+str(year+1)
@@ -61,7 +116,7 @@ def get_current_season():
 
 def get_date(days_to_subtract=0, with_hours=False, starting_date_str=None):
     if not starting_date_str:
-        date = datetime.datetime.now()-timedelta(days=days_to_subtract)
+        date = get_now()-timedelta(days=days_to_subtract)
     else:
         date = datetime.datetime.strptime(starting_date_str, '%Y-%m-%d')-timedelta(days=days_to_subtract)
 
@@ -110,7 +165,7 @@ def compare_time_to_now(iso_time_string, days_to_subtract=0):
     :return:
     """
 
-    return dateutil.parser.parse(iso_time_string) < (datetime.datetime.now() - timedelta(days=days_to_subtract))
+    return parse_date(iso_time_string) < (get_now() - timedelta(days=days_to_subtract))
 
 
 def is_None(input):